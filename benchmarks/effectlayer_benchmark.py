@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+"""Compare frame times of the EffectLayer blit paths
+
+A full-window EffectLayer with only ``mosaic`` set can be put on screen
+either by copying its texture (glBlitFramebufferEXT) or by drawing a
+textured quad. This draws the same scene both ways and prints the average
+frame time of each.
+
+Run it with gillcup_graphics importable, for example from the top of the
+source tree::
+
+    PYTHONPATH=. python benchmarks/effectlayer_benchmark.py [width height]
+"""
+
+from __future__ import division, print_function
+
+import sys
+import time
+
+from pyglet import gl
+
+from gillcup_graphics import Window, EffectLayer, Rectangle
+
+FRAMES = 200
+
+
+def make_scene():
+    """Return a mosaicked root layer with some rectangles in it"""
+    root_layer = EffectLayer(mosaic=(4, 4))
+    for i in range(20):
+        Rectangle(root_layer, position=(i / 20, i / 20), size=(0.3, 0.3),
+            color=(i / 20, 1 - i / 20, 0.5), rotation=i * 9)
+    return root_layer
+
+
+def frame_time(window, frames=FRAMES):
+    """Return the average time to draw a frame, in seconds"""
+    window.manual_draw()
+    gl.glFinish()
+    start = time.time()
+    for _ in range(frames):
+        window.manual_draw()
+    gl.glFinish()
+    return (time.time() - start) / frames
+
+
+def benchmark(width=1024, height=768):
+    """Run the benchmark and print results"""
+    root_layer = make_scene()
+    window = Window(root_layer, width=width, height=height)
+    try:
+        results = {}
+        for direct_blit in True, False:
+            root_layer.direct_blit = direct_blit
+            assert root_layer.can_blit_directly(window) == direct_blit
+            results[direct_blit] = frame_time(window)
+    finally:
+        window.close()
+    direct, quad = results[True], results[False]
+    print('{0}x{1} window, {2} frames'.format(width, height, FRAMES))
+    print('glBlitFramebufferEXT: {0:.3f} ms/frame'.format(direct * 1000))
+    print('textured quad:        {0:.3f} ms/frame'.format(quad * 1000))
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:3]])
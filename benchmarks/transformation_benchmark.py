@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+"""Compare the ways of transforming a point by an inverse matrix
+
+Hit testing transforms the pointer position into each object's local
+coordinates, which means multiplying it by the inverse of the object's
+transformation matrix. This times:
+
+* the closed-form formula PointTransformation.premultiply used to have,
+* computing the inverse with invert_matrix for every point (what
+  premultiply does for plain tuples, and for a MatrixTransformation
+  whose inverse is not cached yet), and
+* reusing the cached inverse of a MatrixTransformation.
+
+Run it with gillcup_graphics importable, for example from the top of the
+source tree::
+
+    PYTHONPATH=. python benchmarks/transformation_benchmark.py [count]
+"""
+
+from __future__ import division, print_function
+
+import sys
+import time
+
+from gillcup_graphics.transformation import (MatrixTransformation,
+    PointTransformation)
+
+COUNT = 20000
+
+
+def closed_form_premultiply(point, values):
+    """Return point transformed by the inverse of values, in closed form
+
+    This is how PointTransformation.premultiply worked before it used
+    invert_matrix.
+    """
+    (xx, yx, zx, dummy,
+     xy, yy, zy, dummy,
+     xz, yz, zz, dummy,
+     x1, y1, z1, dummy) = values
+    x, y, z = point
+
+    # calculate the dot product, [x y z 1] * invert(matrix)
+    # Don't we all love matrices?
+    return (
+            (-xy * (yz * z1 - y1 * zz) + yy * (xz * z1 - x1 * zz) -
+            (xz * y1 - x1 * yz) * zy) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            (x * (yy * zz - yz * zy)) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            (y * (xz * zy - xy * zz)) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            ((xy * yz - xz * yy) * z) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx),
+
+            (xx * (yz * z1 - y1 * zz) - yx * (xz * z1 - x1 * zz) +
+            (xz * y1 - x1 * yz) * zx) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            (x * (yz * zx - yx * zz)) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            (y * (xx * zz - xz * zx)) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            ((xz * yx - xx * yz) * z) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx),
+
+            (-xx * (yy * z1 - y1 * zy) + yx * (xy * z1 - x1 * zy) -
+            (xy * y1 - x1 * yy) * zx) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            (x * (yx * zy - yy * zx)) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            (y * (xy * zx - xx * zy)) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
+            ((xx * yy - xy * yx) * z) / (xx * (yy * zz - yz * zy) +
+            yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx),
+    )
+
+
+def make_matrix():
+    """Return a MatrixTransformation that is not trivial to invert"""
+    matrix = MatrixTransformation()
+    matrix.translate(5, 6, 7)
+    matrix.rotate(5, 1, 2, 3)
+    matrix.scale(2, 3, 4)
+    return matrix
+
+
+def time_per_point(function, count):
+    """Return the average time of function(), in microseconds"""
+    start = time.time()
+    for _ in range(count):
+        function()
+    return (time.time() - start) / count * 1e6
+
+
+def benchmark(count=COUNT):
+    """Run the benchmark and print results"""
+    matrix = make_matrix()
+    values = tuple(matrix.matrix)
+
+    def _closed_form():
+        """Use the old closed-form formula"""
+        closed_form_premultiply((1, 2, 3), values)
+
+    def _uncached():
+        """Invert the matrix for this point only"""
+        PointTransformation(1, 2, 3).premultiply(values)
+
+    def _cached():
+        """Use the cached inverse"""
+        PointTransformation(1, 2, 3).premultiply(matrix)
+
+    print('{0} points'.format(count))
+    for name, function in (('closed form', _closed_form),
+            ('invert_matrix per point', _uncached),
+            ('cached inverse', _cached)):
+        print('{0:24} {1:.2f} us/point'.format(
+            name + ':', time_per_point(function, count)))
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:2]])
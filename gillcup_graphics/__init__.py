@@ -9,6 +9,16 @@ Gillcup Graphics provides a number of modules:
     mainwindow
     transformation
     effectlayer
+    rectanglefield
+    spatialindex
+    childlist
+    framecache
+    render
+    framewriter
+    glstate
+    instrumentation
+    profiler
+    tracing
 
 The most interesting classes of each module are exported directly
 from the gillcup_graphics package:
@@ -19,12 +29,16 @@ from the gillcup_graphics package:
     (from :mod:`gillcup_graphics.objects`)
 * :class:`~gillcup_graphics.DecorationLayer` \
     (from :mod:`gillcup_graphics.objects`)
+* :class:`~gillcup_graphics.TintLayer` \
+    (from :mod:`gillcup_graphics.objects`)
 * :class:`~gillcup_graphics.Rectangle` \
     (from :mod:`gillcup_graphics.objects`)
 * :class:`~gillcup_graphics.Sprite` \
     (from :mod:`gillcup_graphics.objects`)
 * :class:`~gillcup_graphics.Text` \
     (from :mod:`gillcup_graphics.objects`)
+* :class:`~gillcup_graphics.RectangleField` \
+    (from :mod:`gillcup_graphics.rectanglefield`)
 * :class:`~gillcup_graphics.Window` \
     (from :mod:`gillcup_graphics.mainwindow`)
 * :class:`~gillcup_graphics.RealtimeClock` \
@@ -33,10 +47,12 @@ from the gillcup_graphics package:
     (from :mod:`gillcup_graphics.mainwindow`)
 """
 
-__version__ = '0.2.0-alpha.1'
-__version_info__ = (0, 2, 0, 'alpha', 1)
-
 from gillcup_graphics.objects import (
-    GraphicsObject, Layer, DecorationLayer, Rectangle, Sprite, Text)
+    GraphicsObject, Layer, DecorationLayer, TintLayer, Rectangle, Sprite,
+    Text)
+from gillcup_graphics.rectanglefield import RectangleField
 from gillcup_graphics.effectlayer import EffectLayer
 from gillcup_graphics.mainwindow import Window, RealtimeClock, run
+
+__version__ = '0.2.0-alpha.1'
+__version_info__ = (0, 2, 0, 'alpha', 1)
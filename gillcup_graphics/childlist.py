@@ -0,0 +1,145 @@
+# Encoding: UTF-8
+"""The container for children of a Layer
+
+:class:`ChildList` keeps objects in drawing order, and supports adding,
+removing and reordering items in constant time.
+"""
+
+
+class ChildList(object):
+    """An ordered collection of distinct objects, used for Layer children
+
+    Items are compared by identity.
+    Appending, prepending, removing, moving to either end, and membership
+    tests take constant time.
+
+    The most common read-only list operations (iteration, ``len``, indexing,
+    slicing, ``index``) are supported as well; they work on an internal list
+    snapshot that is rebuilt after the ChildList changes.
+    Iteration always goes over the snapshot, so it's safe to modify the
+    ChildList while iterating over it – changes just don't affect iterations
+    that are already in progress.
+
+    :param iterable: The initial contents
+    """
+    def __init__(self, iterable=()):
+        # Circular doubly linked list of [prev, item, next] nodes
+        self._root = root = []
+        root[:] = [root, None, root]
+        self._nodes = {}
+        self._snapshot = []
+        for item in iterable:
+            self.append(item)
+
+    def _link(self, item, prev_node, next_node):
+        """Link a new node for item between the given nodes"""
+        if id(item) in self._nodes:
+            raise ValueError('%r is already in the ChildList' % (item, ))
+        node = [prev_node, item, next_node]
+        prev_node[2] = next_node[0] = node
+        self._nodes[id(item)] = node
+        self._snapshot = None
+
+    def _unlink(self, item):
+        """Remove item's node, return it"""
+        try:
+            node = self._nodes.pop(id(item))
+        except KeyError:
+            raise ValueError('%r is not in the ChildList' % (item, ))
+        prev_node, _item, next_node = node
+        prev_node[2] = next_node
+        next_node[0] = prev_node
+        self._snapshot = None
+        return node
+
+    def _get_snapshot(self):
+        """Return a list of all items, in order"""
+        if self._snapshot is None:
+            snapshot = []
+            root = self._root
+            node = root[2]
+            while node is not root:
+                snapshot.append(node[1])
+                node = node[2]
+            self._snapshot = snapshot
+        return self._snapshot
+
+    def append(self, item):
+        """Add an item to the end (front of the drawing order)"""
+        root = self._root
+        self._link(item, root[0], root)
+
+    def prepend(self, item):
+        """Add an item to the beginning (back of the drawing order)"""
+        root = self._root
+        self._link(item, root, root[2])
+
+    def insert(self, index, item):
+        """Insert item before the given index, like list.insert
+
+        Inserting anywhere except the beginning or end takes linear time.
+        """
+        length = len(self)
+        if index < 0:
+            index = max(0, index + length)
+        if index == 0:
+            self.prepend(item)
+        elif index >= length:
+            self.append(item)
+        else:
+            next_node = self._nodes[id(self._get_snapshot()[index])]
+            self._link(item, next_node[0], next_node)
+
+    def remove(self, item):
+        """Remove the given item; raise ValueError if it is not present"""
+        self._unlink(item)
+
+    def move_to_front(self, item):
+        """Move item to the end, so it is drawn in front of its siblings"""
+        self._unlink(item)
+        self.append(item)
+
+    def move_to_back(self, item):
+        """Move item to the beginning, so it is drawn behind its siblings"""
+        self._unlink(item)
+        self.prepend(item)
+
+    def index(self, item):
+        """Return the position of the given item"""
+        for i, other in enumerate(self._get_snapshot()):
+            if other is item:
+                return i
+        raise ValueError('%r is not in the ChildList' % (item, ))
+
+    def __contains__(self, item):
+        node = self._nodes.get(id(item))
+        return node is not None and node[1] is item
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        return iter(self._get_snapshot())
+
+    def __reversed__(self):
+        return reversed(self._get_snapshot())
+
+    def __getitem__(self, index):
+        return self._get_snapshot()[index]
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'ChildList(%r)' % (list(self), )
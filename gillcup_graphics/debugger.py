@@ -17,11 +17,11 @@ import pyglet
 import fractions
 import weakref
 import collections
-import time
 import itertools
 import math
 
 import gillcup_graphics
+import gillcup_graphics.profiler
 import gillcup
 import gillcup.effect
 import gillcup.properties
@@ -78,23 +78,42 @@ select_mapping = dict((i[0], make_select_mapping(i[0]))
     for i in default_palette)
 
 
-original_do_draw = gillcup_graphics.GraphicsObject.do_draw
+class RecentRenderTimes(object):
+    """Median render times of objects, over the last period of time
 
+    The profiler is reset every ``period`` seconds, so objects that were
+    slow a while ago but are fast now don't look slow.
+    Times from the last complete period are shown; before the first period
+    ends, the times collected so far are used.
+    """
+    def __init__(self, profiler, period=1):
+        self.profiler = profiler
+        self.period = period
+        self.last_node_stats = {}
+        self.period_start = None
+
+    def tick(self, now):
+        """Start a new period if the current one is over"""
+        if self.period_start is None:
+            self.period_start = now
+        elif now - self.period_start >= self.period:
+            self.last_node_stats = self.profiler.node_stats
+            self.profiler.reset()
+            self.period_start = now
+
+    def render_time(self, obj):
+        """Return the median render time of an object, or None"""
+        stats = self.last_node_stats.get(obj)
+        if stats is None:
+            stats = self.profiler.stats_for(obj)
+        if stats is None:
+            return None
+        return stats.inclusive.percentile(50)
 
-def monkeypatched_do_draw(self, *args, **kwargs):
-    """Wrap GraphicsObject.do_draw method with a timer"""
-    start = time.time()
-    retval = original_do_draw(self, *args, **kwargs)
-    elapsed = time.time() - start
-    try:
-        original = self.debugger__render_time
-    except AttributeError:
-        self.debugger__render_time = elapsed
-    else:
-        # Smooth the value over several frames
-        self.debugger__render_time = (original * 9 + elapsed) / 10
-    return retval
-gillcup_graphics.GraphicsObject.do_draw = monkeypatched_do_draw
+
+# Records the render times shown in the scene tree, while the debugger runs
+render_profiler = gillcup_graphics.profiler.Profiler()
+render_times = RecentRenderTimes(render_profiler)
 
 
 class Main(urwid.Frame):
@@ -116,6 +135,7 @@ class Main(urwid.Frame):
         """Manual tick for the Pyglet main loop"""
         loop.set_alarm_in(1 / 20, self.tick, None)
         pyglet.clock.tick()
+        render_times.tick(gillcup_graphics.profiler.monotonic_clock())
 
         for window in pyglet.app.windows:
             window.switch_to()
@@ -590,7 +610,7 @@ class GraphicsObjectWidget(NonCachedText):
         """
         obj = self.obj
         name_part = obj.name or ''
-        render_time = getattr(obj, 'debugger__render_time', None)
+        render_time = render_times.render_time(obj)
         type_part = '({0})'.format(type(obj).__name__)
         time_attr = None
         if render_time is None:
@@ -871,7 +891,11 @@ def run(clock, layer, *args, **kwargs):
     loop.screen.set_terminal_properties(colors=256)
     loop.set_alarm_in(1 / 30, main.tick, None)
     gillcup_graphics.Window(layer, *args, **kwargs)
-    loop.run()
+    render_profiler.enable()
+    try:
+        loop.run()
+    finally:
+        render_profiler.disable()
 
 
 def demo():
@@ -14,45 +14,143 @@ Currently, it needs the Framebuffer Object (FBO) OpenGL extension to work.
 
 """
 
+from __future__ import division
+
+import warnings
+
 from pyglet import gl
 
-from gillcup import properties
+try:
+    import numpy  # pylint: disable=F0401
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from gillcup_graphics import framecache
+from gillcup_graphics import tracing
+from gillcup_graphics.glstate import default_tracker
 from gillcup_graphics import Layer
-from gillcup_graphics.offscreen import fbo
+from gillcup_graphics.offscreen import pool, shaders
 
 from gillcup_graphics.mainwindow import Window
 from gillcup_graphics import objects
 
+_effect_vertex_shader = """
+#version 110
+uniform vec2 texture_scale;
+varying vec2 texcoord;
+
+void main() {
+    // The quad covers the whole viewport, whatever the current matrices are
+    gl_Position = vec4(gl_Vertex.xy * 2.0 - 1.0, 0.0, 1.0);
+    texcoord = gl_Vertex.xy * texture_scale;
+}
+"""
+
+_effect_fragment_shader = """
+#version 110
+uniform sampler2D image;
+uniform vec2 texture_size;
+uniform vec4 color;
+varying vec2 texcoord;
+
+void main() {
+    // Sample texel centers, so each texel becomes a sharp mosaic block
+    vec2 texel = (floor(texcoord * texture_size) + 0.5) / texture_size;
+    vec4 texel_color = texture2D(image, texel);
+    // The texture has premultiplied alpha
+    gl_FragColor = texel_color * vec4(color.rgb * color.a, color.a);
+}
+"""
+
+
+def _get_effect_program():
+    """Return the effect shader program, or None if it is not available"""
+    try:
+        return shaders.get_program(
+            _effect_vertex_shader, _effect_fragment_shader)
+    except shaders.ShaderError as e:
+        warnings.warn('EffectLayer shaders not available, using the '
+            'fixed-function pipeline instead: %s' % e)
+        return None
+
 
 class EffectLayer(Layer):
     """A Layer that can colorize, fade, or pixelate its contents as a whole
+
+    The offscreen render targets are taken from the ``fbo_pool`` attribute,
+    a :class:`gillcup_graphics.offscreen.pool.FBOPool` shared by all
+    EffectLayers by default, and returned to it after each frame.
+
+    Unless the ``use_shaders`` attribute is false, the offscreen texture is
+    drawn to the parent scene with a GLSL shader that applies ``color``,
+    ``opacity`` and ``mosaic`` in a single pass. If shaders are not
+    available, the fixed-function pipeline is used.
+
+    When ``color`` and ``opacity`` have their default values and the layer is
+    the root layer of its window (so nothing is drawn under it), the texture
+    is copied to the window with ``glBlitFramebufferEXT`` instead, which is
+    faster than drawing a textured quad.
+    Set the ``direct_blit`` attribute to false to disable this.
+
+    Nested EffectLayers that only colorize or fade their contents are merged
+    into the enclosing EffectLayer's offscreen pass when possible (see
+    :meth:`flatten_nested`). A layer whose ``flatten`` attribute is false is
+    neither merged into its parent, nor are its children merged into it.
+    The number of passes saved this way in the last frame is available in
+    the window's ``effect_passes_saved`` attribute.
+
+    If the ``cache_as_bitmap`` attribute is set to true, the layer's contents
+    are rendered offscreen once, and the resulting texture is reused in later
+    frames.
+    The contents are only rendered again when the
+    :meth:`~gillcup_graphics.GraphicsObject.draw_parameters` of any of the
+    children change, when children are added, removed or reordered, when
+    the tint of an enclosing :class:`~gillcup_graphics.TintLayer` changes, or
+    when the layer moves or the window is resized.
+    This speeds up drawing of complex subtrees that rarely change, such as
+    backgrounds.
+    The cached texture is kept (outside of the pool's idle targets) until the
+    cache is turned off, the layer dies, or a different size is needed.
+    Checking for changes still visits the entire subtree each frame.
     """
     color = red, green, blue = objects.color_property
     opacity = objects.opacity_property
-    mosaic = mosaic_x, mosaic_y = properties.ScaleProperty(2,
+    mosaic = mosaic_x, mosaic_y = framecache.ScaleProperty(2,
         docstring=u"""Pixelation of this layer
 
         For example, if mosaic=(2, 4), the layer will be drawn using 2×4 blocks
         """)
 
-    _opacity_data = None
+    fbo_pool = pool.default_pool
+    cache_as_bitmap = False
+    use_shaders = True
+    direct_blit = True
+    flatten = True
+
+    _bitmap_cache = None
 
     def need_offscreen(self):
         """Return true if off-screen rendering is needed
 
         Off-screen rendering is only done if needed, i.e. if ``color``,
-        ``opacity`` or ``mosaic`` don't have their default values.
+        ``opacity`` or ``mosaic`` don't have their default values, or if
+        ``cache_as_bitmap`` is set.
 
         Subclasses should extend this method if they need off-screen
         rendering in more circumstances.
         """
-        return (not all(0.99 < n < 1.01 for n in self.mosaic) or
+        return (self.cache_as_bitmap or
+                not all(0.99 < n < 1.01 for n in self.mosaic) or
                 self.opacity < 0.99 or
                 not all(0.99 < c < 1.01 for c in self.color)
             )
 
     def draw(self, window, transformation, **kwargs):
-        if window and self.need_offscreen():
+        if self in kwargs.get('flattened_layers', ()):
+            # Our effects are applied by an enclosing EffectLayer
+            super(EffectLayer, self).draw(window=window,
+                transformation=transformation, **kwargs)
+        elif window and self.need_offscreen():
             parent_texture_size = kwargs.get('parent_texture_size')
             if parent_texture_size:
                 parent_width, parent_height = parent_texture_size
@@ -62,87 +160,282 @@ class EffectLayer(Layer):
             width = max(1, int(parent_width / max(1, self.mosaic_x)))
             height = max(1, int(parent_height / max(1, self.mosaic_y)))
 
-            if self._opacity_data:
-                framebuffer, w, h = self._opacity_data
-            else:
-                framebuffer = w = h = None
-            if (w, h) != (width, height):
-                if framebuffer:
-                    framebuffer.destroy()
-                framebuffer = fbo.FBO(width, height)
-                self._opacity_data = framebuffer, width, height
             kwargs['parent_texture_size'] = width, height
 
-            with framebuffer.bind_draw() as parent_framebuffer:
-                gl.glClearColor(0, 0, 0, 0)
-                gl.glClear(gl.GL_COLOR_BUFFER_BIT)
-
-                with transformation.state:
-                    super(EffectLayer, self).draw(window=window,
-                        transformation=transformation, **kwargs)
-
-            self.blit_buffer(
-                    framebuffer=framebuffer,
-                    parent_framebuffer=parent_framebuffer,
-                    width=width,
-                    height=height,
-                    parent_width=parent_width,
-                    parent_height=parent_height,
-                    window=window,
-                    transformation=transformation,
-                    **kwargs)
+            flattened, effect_color, effect_opacity = self.flatten_nested()
+            if flattened:
+                kwargs['flattened_layers'] = (
+                    kwargs.get('flattened_layers', ()) + flattened)
+                window.effect_passes_saved += sum(
+                    1 for layer in flattened if layer.need_offscreen())
+
+            cached = self.cache_as_bitmap
+            if cached:
+                framebuffer, render = self._get_cached_framebuffer(
+                    width, height, parent_width, parent_height,
+                    tint=kwargs.get('tint'))
+            else:
+                self.drop_bitmap_cache()
+                framebuffer = self.fbo_pool.acquire(width, height)
+                render = True
+            try:
+                with framebuffer.bind_draw() as parent_framebuffer:
+                    if render:
+                        with tracing.span('EffectLayer offscreen pass',
+                                'effect', width=width, height=height):
+                            gl.glClearColor(0, 0, 0, 0)
+                            gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+
+                            with transformation.state:
+                                super(EffectLayer, self).draw(window=window,
+                                    transformation=transformation, **kwargs)
+
+                with tracing.span('EffectLayer.blit_buffer', 'effect'):
+                    self.blit_buffer(
+                            framebuffer=framebuffer,
+                            parent_framebuffer=parent_framebuffer,
+                            width=width,
+                            height=height,
+                            parent_width=parent_width,
+                            parent_height=parent_height,
+                            window=window,
+                            transformation=transformation,
+                            effect_color=effect_color,
+                            effect_opacity=effect_opacity,
+                            **kwargs)
+            finally:
+                if not cached:
+                    self.fbo_pool.release(framebuffer)
 
         else:
-            if self._opacity_data:
-                framebuffer, w, h = self._opacity_data
-                framebuffer.destroy()
-                self._opacity_data = None
+            self.drop_bitmap_cache()
             super(EffectLayer, self).draw(window=window,
                 transformation=transformation, **kwargs)
 
-    def blit_buffer(self, framebuffer, parent_width, parent_height, **kwargs):
+    def draw_parameters(self):
+        return super(EffectLayer, self).draw_parameters() + (
+            self.color, self.opacity, self.mosaic)
+
+    def _overrides_effects(self):
+        """Return true if a subclass changes how the offscreen pass works"""
+        cls = type(self)
+        return any(
+            getattr(cls, n).__func__ is not getattr(EffectLayer, n).__func__
+            for n in ('draw', 'blit_buffer', 'need_offscreen'))
+
+    def _can_be_flattened(self):
+        """Return true if this layer's effects can be merged into its parent's
+        """
+        return (self.flatten and
+                not self._overrides_effects() and
+                not self.cache_as_bitmap and
+                all(0.99 < n < 1.01 for n in self.mosaic))
+
+    def flatten_nested(self):
+        """Find nested EffectLayers whose effects can be merged with this one's
+
+        If this layer has a single visible child, which is an EffectLayer
+        that only changes color or opacity, the child's contents can be
+        rendered directly into this layer's texture, and the child's effects
+        applied together with this layer's in a single pass.
+        This repeats as long as the innermost such layer has a single
+        visible child that qualifies.
+
+        Returns a tuple of the merged layers, and the combined color and
+        opacity.
+        """
+        flattened = ()
+        color = self.color
+        opacity = self.opacity
+        if self._overrides_effects():
+            return flattened, color, opacity
+        # Each layer after the first one passed _can_be_flattened
+        layer = self
+        while layer.flatten:
+            children = [c for c in layer.children if not c.is_hidden()]
+            if len(children) != 1:
+                break
+            [child] = children
+            if not (isinstance(child, EffectLayer) and
+                    child._can_be_flattened()):  # pylint: disable=W0212
+                break
+            flattened += (child, )
+            color = tuple(a * b for a, b in zip(color, child.color))
+            opacity *= child.opacity
+            layer = child
+        return flattened, color, opacity
+
+    def bitmap_cache_key(self, width, height, parent_width, parent_height,
+            tint=None):
+        """Return the values that the cached bitmap depends on
+
+        ``tint`` is the tint passed down by an enclosing
+        :class:`~gillcup_graphics.TintLayer`, which the children multiply
+        into their colors.
+
+        See ``cache_as_bitmap``.
+        """
+        return (width, height, parent_width, parent_height, tint,
+            self.world_transformation.matrix,
+            self.children_draw_parameters())
+
+    def _get_cached_framebuffer(self, width, height, parent_width,
+            parent_height, tint=None):
+        """Return the bitmap cache FBO, and whether it needs to be redrawn"""
+        key = self.bitmap_cache_key(width, height, parent_width, parent_height,
+            tint)
+        if self._bitmap_cache:
+            cached_key, framebuffer = self._bitmap_cache
+            if cached_key == key:
+                return framebuffer, False
+            if (framebuffer.width, framebuffer.height) != (width, height):
+                self.drop_bitmap_cache()
+                framebuffer = self.fbo_pool.acquire(width, height)
+        else:
+            framebuffer = self.fbo_pool.acquire(width, height)
+        self._bitmap_cache = key, framebuffer
+        return framebuffer, True
+
+    def drop_bitmap_cache(self):
+        """Forget the cached rendering, if any (see ``cache_as_bitmap``)"""
+        if self._bitmap_cache:
+            _key, framebuffer = self._bitmap_cache
+            self._bitmap_cache = None
+            self.fbo_pool.release(framebuffer)
+
+    def die(self):
+        super(EffectLayer, self).die()
+        self.drop_bitmap_cache()
+
+    def can_blit_directly(self, window, effect_color=None,
+            effect_opacity=None, **_kwargs):
+        """Return true if the texture can be copied instead of drawn
+
+        A copy replaces the pixels underneath instead of blending with them,
+        so this is only done for the window's root layer, and when no
+        colorizing or fading is needed.
+
+        The effect color and opacity default to the layer's own ``color``
+        and ``opacity``.
+        """
+        if effect_color is None:
+            effect_color = self.color
+        if effect_opacity is None:
+            effect_opacity = self.opacity
+        return (self.direct_blit and
+                window is not None and
+                getattr(window, 'layer', None) is self and
+                effect_opacity >= 0.99 and
+                all(0.99 < c < 1.01 for c in effect_color) and
+                gl.gl_info.have_extension('GL_EXT_framebuffer_blit'))
+
+    def blit_buffer(self, framebuffer, parent_width, parent_height,
+            effect_color=None, effect_opacity=None, **kwargs):
         """Draw the texture into the parent scene
 
+        The texture is colorized with ``effect_color`` and faded with
+        ``effect_opacity``, which default to the layer's ``color`` and
+        ``opacity``.
+
+        If :meth:`can_blit_directly` allows it, the texture is copied to the
+        parent framebuffer.
+        Otherwise, if ``use_shaders`` is true and GLSL is available, it is
+        drawn in a single fragment shader pass, or using the fixed-function
+        pipeline as a last resort.
+
         .. warning:
 
             This method's arguments are not part of the API yet and may change
             at any time.
         """
-        gl.glViewport(0, 0, parent_width, parent_height)
-
-        gl.glTexParameteri(gl.GL_TEXTURE_2D,
+        if effect_color is None:
+            effect_color = self.color
+        if effect_opacity is None:
+            effect_opacity = self.opacity
+        color = tuple(effect_color) + (effect_opacity, )
+        if self.can_blit_directly(effect_color=effect_color,
+                effect_opacity=effect_opacity, **kwargs):
+            self._blit_buffer_direct(framebuffer=framebuffer,
+                parent_width=parent_width, parent_height=parent_height,
+                **kwargs)
+            return
+        program = self.use_shaders and _get_effect_program()
+        if program:
+            self._blit_buffer_shader(program, framebuffer,
+                parent_width, parent_height, color)
+        else:
+            transformation = kwargs.get('transformation')
+            if transformation:
+                transformation.load()
+            self._blit_buffer_fixed(framebuffer, parent_width, parent_height,
+                color)
+
+    @staticmethod
+    def _blit_buffer_shader(program, framebuffer, parent_width,
+            parent_height, color):
+        """Draw the texture using the effect shader program"""
+        tracker = default_tracker
+        tracker.viewport(0, 0, parent_width, parent_height)
+        tracker.bind_texture(gl.GL_TEXTURE_2D, framebuffer.texture_id)
+        tracker.enable(gl.GL_TEXTURE_2D)
+        tracker.blend_func(gl.GL_ONE, gl.GL_ONE_MINUS_SRC_ALPHA)  # premult.
+        program.use()
+        try:
+            program.set_uniform_int('image', 0)
+            program.set_uniform('texture_size',
+                framebuffer.texture_width, framebuffer.texture_height)
+            program.set_uniform('texture_scale',
+                framebuffer.width / framebuffer.texture_width,
+                framebuffer.height / framebuffer.texture_height)
+            program.set_uniform('color', *color)
+            tracker.enable_client_state(gl.GL_VERTEX_ARRAY)
+            tracker.vertex_pointer(2, gl.GL_FLOAT,
+                objects.Rectangle.vertices)
+            gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
+        finally:
+            program.stop_using()
+        tracker.disable(gl.GL_TEXTURE_2D)
+        tracker.blend_func(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    @staticmethod
+    def _blit_buffer_fixed(framebuffer, parent_width, parent_height, color):
+        """Draw the texture using the fixed-function pipeline"""
+        tracker = default_tracker
+        tracker.viewport(0, 0, parent_width, parent_height)
+
+        tracker.tex_parameter(gl.GL_TEXTURE_2D,
             gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, framebuffer.texture_id)
-        gl.glEnable(gl.GL_TEXTURE_2D)
-
-        gl.glColor4fv((gl.GLfloat * 4)(*self.color + (self.opacity, )))
-        gl.glBlendFunc(gl.GL_ONE, gl.GL_ONE_MINUS_SRC_ALPHA)  # premultipl.
+        tracker.bind_texture(gl.GL_TEXTURE_2D, framebuffer.texture_id)
+        tracker.enable(gl.GL_TEXTURE_2D)
+
+        tracker.color(*color)
+        tracker.blend_func(gl.GL_ONE, gl.GL_ONE_MINUS_SRC_ALPHA)  # premult.
+        # Pooled textures may be larger than the area that was drawn to
+        tex_width = (parent_width * framebuffer.width /
+            framebuffer.texture_width)
+        tex_height = (parent_height * framebuffer.height /
+            framebuffer.texture_height)
         gl.glBegin(gl.GL_TRIANGLE_STRIP)
         gl.glTexCoord2f(0, 0)
         gl.glVertex2i(0, 0)
-        gl.glTexCoord2f(0, parent_height)
+        gl.glTexCoord2f(0, tex_height)
         gl.glVertex2i(0, parent_height)
-        gl.glTexCoord2f(parent_width, 0)
+        gl.glTexCoord2f(tex_width, 0)
         gl.glVertex2i(parent_width, 0)
-        gl.glTexCoord2f(parent_width, parent_height)
+        gl.glTexCoord2f(tex_width, tex_height)
         gl.glVertex2i(parent_width, parent_height)
         gl.glEnd()
-        gl.glTexParameteri(gl.GL_TEXTURE_2D,
-            gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
-        gl.glDisable(gl.GL_TEXTURE_2D)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D,
+        tracker.disable(gl.GL_TEXTURE_2D)
+        tracker.tex_parameter(gl.GL_TEXTURE_2D,
             gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
-        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        tracker.blend_func(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
 
-        gl.glViewport(0, 0, parent_width, parent_height)
+        tracker.viewport(0, 0, parent_width, parent_height)
 
-    def _blit_buffer_direct(self, framebuffer, parent_framebuffer,
-            width, height, parent_width, parent_height,
-            transformation, **kwargs):
-        # XXX: Use this instead of blit_buffer when we don't need
-        # colorizing/opacity
-        transformation.reset()
-        gl.glViewport(0, 0, width, height)
+    @staticmethod
+    def _blit_buffer_direct(framebuffer, parent_framebuffer,
+            width, height, parent_width, parent_height, **_kwargs):
+        """Copy the texture to the parent framebuffer, scaling it up"""
         gl.glBindFramebufferEXT(gl.GL_READ_FRAMEBUFFER_EXT,
             framebuffer.framebuffer_id)
         gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0_EXT)
@@ -152,7 +445,12 @@ class EffectLayer(Layer):
         gl.glBlitFramebufferEXT(0, 0, width, height, 0, 0,
             parent_width, parent_height,
             gl.GL_COLOR_BUFFER_BIT, gl.GL_NEAREST)
-        gl.glDisable(gl.GL_TEXTURE_2D)
+
+        # Bind the parent framebuffer for both reading and drawing again
+        gl.glBindFramebufferEXT(gl.GL_FRAMEBUFFER_EXT,
+            parent_framebuffer.framebuffer_id)
+        if not parent_framebuffer.framebuffer_id:
+            gl.glReadBuffer(gl.GL_BACK)
 
 
 class RecordingLayer(EffectLayer):
@@ -160,14 +458,60 @@ class RecordingLayer(EffectLayer):
 
     After this layer is drawn, the picture is available in the ``last_image``
     attribute as a pyglet ImageData object.
+
+    If the ``readback`` attribute is set to an
+    :class:`~gillcup_graphics.offscreen.readback.AsyncReadback`, the
+    picture is read back asynchronously instead: ``last_image`` is not set,
+    and each frame is delivered by the readback object a few frames later,
+    tagged with its number (counting from 0).
+    Call the readback's ``flush`` method after the last frame.
+
+    If ``record_array`` is true, the picture is instead read into the
+    ``last_array`` attribute as a NumPy array of RGBA bytes (see
+    :meth:`~gillcup_graphics.offscreen.fbo.FBO.get_array`).
+    The array is reused from frame to frame as long as its shape stays the
+    same, so copy it if it needs to be kept.
+    Set ``array_region`` to read back only a part of the picture, and
+    ``array_flip`` to get the top row first.
+
+    If ``frame_sink`` is set (for example, to a
+    :class:`~gillcup_graphics.framewriter.FrameWriter`), ``last_array`` is
+    recorded as above, and passed to the sink's ``write`` method after each
+    frame.
     """
     last_image = None
+    readback = None
+    frame_number = 0
+    record_array = False
+    array_region = None
+    array_flip = False
+    last_array = None
+    frame_sink = None
 
     def need_offscreen(self):
         return True
 
+    def bounds(self):
+        # The recording must be made even if the contents are off-screen
+        return None
+
     def blit_buffer(self, framebuffer, **kwargs):
-        self.last_image = framebuffer.get_image_data()
+        if self.readback:
+            self.readback.start(framebuffer, self.frame_number)
+        elif self.record_array or self.frame_sink:
+            if numpy is None:
+                raise RuntimeError('RecordingLayer.record_array needs NumPy')
+            shape = framebuffer.array_shape(self.array_region)
+            out = self.last_array
+            if out is None or out.shape != shape:
+                out = numpy.empty(shape, numpy.uint8)
+            self.last_array = framebuffer.get_array(out=out,
+                region=self.array_region, flip=self.array_flip)
+            if self.frame_sink:
+                self.frame_sink.write(self.last_array)
+        else:
+            self.last_image = framebuffer.get_image_data()
+        self.frame_number += 1
         super(RecordingLayer, self).blit_buffer(framebuffer=framebuffer,
             **kwargs)
 
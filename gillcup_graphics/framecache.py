@@ -0,0 +1,151 @@
+# Encoding: UTF-8
+"""Per-frame caching of animated property values
+
+Reading a gillcup animated property evaluates its whole chain of effects.
+While a frame is being drawn (or a pointer event is being handled), time
+does not advance, yet the same properties are read many times: by the
+transformation code, by :meth:`~gillcup_graphics.GraphicsObject.is_hidden`,
+by ``draw`` methods, by hit tests, and by effects such as the relative
+anchor that depend on other properties.
+
+The properties in this module are drop-in replacements for the gillcup ones
+that remember their values for the duration of a frame.
+A frame is delimited by a :func:`frame` block::
+
+    with framecache.frame():
+        layer.do_draw(transformation=transformation)
+
+:class:`~gillcup_graphics.Window` does this for each frame it draws and for
+each pointer event it handles.
+Outside of a frame block, properties are evaluated on every read, exactly
+like plain gillcup properties.
+
+The cache is cleared whenever a new frame starts and whenever any cached
+property is assigned or animated, so code that changes properties in the
+middle of a frame (for example, in an event handler) sees the new values.
+Clocks should not be advanced while a frame is in progress, and effects
+whose value changes for other reasons than the passage of time or an
+assignment will only be re-evaluated in the next frame.
+"""
+
+from __future__ import division
+
+import contextlib
+
+import gillcup
+from gillcup import properties
+from gillcup.properties import _TupleElementProperty
+
+
+class _FrameState(object):
+    """Global bookkeeping: the current cache stamp and frame nesting depth"""
+    stamp = 0
+    depth = 0
+
+_state = _FrameState()
+
+
+@contextlib.contextmanager
+def frame():
+    """Context manager that enables caching for the duration of a frame
+
+    Frames may be nested; the cache is only cleared when the outermost
+    frame starts.
+    """
+    if not _state.depth:
+        _state.stamp += 1
+    _state.depth += 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+
+def in_frame():
+    """Return true if property values are currently being cached"""
+    return _state.depth > 0
+
+
+def invalidate():
+    """Forget all cached property values"""
+    _state.stamp += 1
+
+
+def frame_stamp():
+    """Return a value that changes whenever cached values are forgotten
+
+    Other per-frame caches can store it along with the cached value, and
+    reuse the value while it stays the same.
+    Returns None outside of a frame block, where nothing should be cached.
+    """
+    if not _state.depth:
+        return None
+    return _state.stamp
+
+
+class _CachedPropertyMixin(object):
+    """Mixin adding per-frame caching to a gillcup AnimatedProperty class"""
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if not _state.depth:
+            return self.get_effect(instance).value
+        stamp = _state.stamp
+        try:
+            cache = instance._frame_cache  # pylint: disable=W0212
+        except AttributeError:
+            cache = instance._frame_cache = {}  # pylint: disable=W0212
+        else:
+            try:
+                cached_stamp, value = cache[self]
+            except KeyError:
+                pass
+            else:
+                if cached_stamp == stamp:
+                    return value
+        value = self.get_effect(instance).value
+        cache[self] = stamp, value
+        return value
+
+    def animate(self, instance, animation):
+        """Set a new effect on this property; return the old one"""
+        invalidate()
+        return super(_CachedPropertyMixin, self).animate(instance, animation)
+
+
+class _CachedTupleElementProperty(_TupleElementProperty):
+    """Element of a cached tuple property; reads go through the parent"""
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return self.parent.__get__(instance, owner)[self.index]
+
+
+class _CachedTupleMixin(_CachedPropertyMixin):
+    """Mixin adding per-frame caching to a gillcup TupleProperty class"""
+    def __init__(self, *args, **kwargs):
+        super(_CachedTupleMixin, self).__init__(*args, **kwargs)
+        self.subproperties = [
+            _CachedTupleElementProperty(self, i) for i in range(self.size)]
+
+
+class AnimatedProperty(_CachedPropertyMixin, gillcup.AnimatedProperty):
+    """A :class:`gillcup.AnimatedProperty` cached for the duration of a frame
+    """
+
+
+class TupleProperty(_CachedTupleMixin, gillcup.TupleProperty):
+    """A :class:`gillcup.TupleProperty` cached for the duration of a frame
+    """
+
+
+class ScaleProperty(_CachedTupleMixin, properties.ScaleProperty):
+    """A :class:`gillcup.properties.ScaleProperty` cached for the duration
+    of a frame
+    """
+
+
+class VectorProperty(_CachedTupleMixin, properties.VectorProperty):
+    """A :class:`gillcup.properties.VectorProperty` cached for the duration
+    of a frame
+    """
@@ -0,0 +1,176 @@
+"""Streaming output of rendered frames as raw video
+
+Saving each frame as a PNG file is slow, mostly because of the compression.
+A :class:`FrameWriter` instead writes uncompressed frames to a single file
+or pipe, either as raw RGBA bytes or in the YUV4MPEG2 (Y4M) format, which
+video encoders read directly. For example, with ffmpeg::
+
+    python -m gillcup_graphics.render myscene:make_scene --frames 250 \\
+        --output - | ffmpeg -i - out.mp4
+
+The colorspace conversion and the writing happen on a background thread,
+so rendering does not wait for the disk or the encoder (unless the queue
+of pending frames fills up).
+
+This module needs NumPy.
+"""
+
+from __future__ import division
+
+import fractions
+import sys
+import threading
+import Queue
+
+try:
+    import numpy  # pylint: disable=F0401
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# BT.601 "studio swing" RGB to YCbCr conversion, for 0-255 RGB values
+_yuv_matrix = [
+    [65.481 / 255, 128.553 / 255, 24.966 / 255],
+    [-37.797 / 255, -74.203 / 255, 112.0 / 255],
+    [112.0 / 255, -93.786 / 255, -18.214 / 255]]
+_yuv_offset = [16, 128, 128]
+
+
+def rgb_to_yuv(rgb, chroma='420'):
+    """Convert an array of RGB(A) bytes to Y, Cb and Cr planes
+
+    :param rgb: An array of shape (height, width, 3 or 4); alpha is ignored
+    :param chroma: '444' for full-resolution color planes, or '420' for
+        color planes with half the width and height (the width and height
+        must then be even)
+
+    Returns a list of three ``uint8`` arrays.
+    """
+    rgb = numpy.asarray(rgb)[:, :, :3].astype(numpy.float32)
+    yuv = numpy.dot(rgb, numpy.array(_yuv_matrix, numpy.float32).T)
+    yuv += numpy.array(_yuv_offset, numpy.float32)
+    planes = [yuv[:, :, i] for i in range(3)]
+    if chroma == '420':
+        height, width = planes[0].shape
+        if height % 2 or width % 2:
+            raise ValueError('4:2:0 chroma needs an even width and height')
+        planes[1:] = [
+            plane.reshape(height // 2, 2, width // 2, 2).mean(3).mean(1)
+            for plane in planes[1:]]
+    elif chroma != '444':
+        raise ValueError('Unknown chroma subsampling: {0}'.format(chroma))
+    return [numpy.clip(plane + 0.5, 0, 255).astype(numpy.uint8)
+        for plane in planes]
+
+
+class FrameWriter(object):
+    """Writes frames to a stream on a background thread
+
+    :param stream: A file-like object opened for binary writing, such as
+        a file, ``sys.stdout``, or the ``stdin`` of an encoder subprocess
+    :param width: Width of the frames, in pixels
+    :param height: Height of the frames, in pixels
+    :param fps: Frame rate, for the Y4M header
+    :param format: ``'y4m'`` for YUV4MPEG2, or ``'rgba'`` for raw RGBA bytes
+        with no header
+    :param chroma: Chroma subsampling for Y4M output (see
+        :func:`rgb_to_yuv`)
+    :param bottom_up: If true (the default), frames passed to :meth:`write`
+        have the bottom row first, as read from OpenGL; they are flipped so
+        the output has the top row first.
+    :param queue_size: The number of frames that can wait to be written.
+        When the queue is full, :meth:`write` blocks.
+    :param close_stream: If true, the stream is closed by :meth:`close`
+
+    Errors from writing (for example, a pipe closed by the encoder) are
+    raised from the next call to :meth:`write` or :meth:`close`.
+    """
+    def __init__(self, stream, width, height, fps=30,
+            format='y4m',  # pylint: disable=W0622
+            chroma='420', bottom_up=True, queue_size=16, close_stream=False):
+        if numpy is None:
+            raise RuntimeError('FrameWriter needs NumPy')
+        if format not in ('y4m', 'rgba'):
+            raise ValueError('Unknown format: {0}'.format(format))
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.format = format
+        self.chroma = chroma
+        self.bottom_up = bottom_up
+        self.close_stream = close_stream
+        self.frame_count = 0
+        self.error = None
+        self.queue = Queue.Queue(queue_size)
+        if format == 'y4m':
+            rate = fractions.Fraction(repr(float(fps))).limit_denominator(
+                1001)
+            self.stream.write('YUV4MPEG2 W{0} H{1} F{2}:{3} Ip A1:1 '
+                'C{4}\n'.format(width, height, rate.numerator,
+                    rate.denominator, chroma))
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, frame):
+        """Queue a frame for writing
+
+        :param frame: A ``uint8`` array of shape (height, width, 4), such as
+            :attr:`RecordingLayer.last_array
+            <gillcup_graphics.effectlayer.RecordingLayer>`.
+            It is copied, so it can be reused right away.
+        """
+        self._check_error()
+        if self.thread is None:
+            raise ValueError('Writing to a closed FrameWriter')
+        frame = numpy.array(frame, dtype=numpy.uint8, copy=True)
+        if frame.shape != (self.height, self.width, 4):
+            raise ValueError('Expected a frame of shape {0}, got {1}'.format(
+                (self.height, self.width, 4), frame.shape))
+        self.queue.put(frame)
+        self.frame_count += 1
+
+    def close(self):
+        """Write out all queued frames and stop the background thread"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            if self.close_stream:
+                self.stream.close()
+            else:
+                self.stream.flush()
+        self._check_error()
+
+    def _check_error(self):
+        """Re-raise an error from the background thread, with its traceback
+        """
+        if self.error is not None:
+            error_type, error, traceback = self.error
+            raise error_type, error, traceback
+
+    def _run(self):
+        """Write frames from the queue until None is received"""
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+            if self.error is not None:
+                # Keep draining the queue so a blocked write() can return
+                continue
+            try:
+                self._write_frame(frame)
+            except Exception:  # pylint: disable=W0703
+                self.error = sys.exc_info()
+
+    def _write_frame(self, frame):
+        """Convert and write one frame"""
+        if self.bottom_up:
+            frame = frame[::-1]
+        stream = self.stream
+        if self.format == 'rgba':
+            stream.write(numpy.ascontiguousarray(frame).tobytes())
+        else:
+            stream.write('FRAME\n')
+            for plane in rgb_to_yuv(frame, self.chroma):
+                stream.write(plane.tobytes())
@@ -0,0 +1,185 @@
+"""Tracking of OpenGL state, to skip redundant state changes
+
+Drawing code sets the same OpenGL state over and over: every Rectangle sets
+the current color and vertex pointer, every EffectLayer blit sets the blend
+function and texture parameters. Each of these calls goes through ctypes,
+so they are not free even when the driver notices that nothing changed.
+
+A :class:`StateTracker` remembers the state it has set, and skips calls
+that would set it to the value it already has. The built-in drawing code
+makes its state changes through :data:`default_tracker`.
+
+Tracking is off by default, so existing code that changes OpenGL state
+behind the library's back keeps working; the trackers just pass all calls
+through. To turn it on::
+
+    gillcup_graphics.glstate.default_tracker.enabled = True
+
+The tracker can only know about state that is changed through it. Code that
+changes tracked state directly (for example, Pyglet's sprite and text
+drawing) must be followed by a call to :meth:`StateTracker.invalidate`.
+:class:`~gillcup_graphics.Window` invalidates everything at the start of
+each frame, and records the number of calls saved in the frame in its
+``gl_calls_saved`` attribute.
+"""
+
+import numbers
+
+from pyglet import gl
+
+
+class StateTracker(object):
+    """Remembers OpenGL state set through it, and skips redundant changes
+
+    :param enabled: Initial value of the ``enabled`` attribute
+
+    If the ``enabled`` attribute is false, every call is made and nothing
+    is remembered. Call :meth:`invalidate` after turning it on in the middle
+    of a frame.
+
+    The ``calls_made`` and ``calls_saved`` attributes count the calls that
+    were made and skipped.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.cache = {}
+        self.calls_made = 0
+        self.calls_saved = 0
+
+    def invalidate(self, *keys):
+        """Forget the state with the given keys, or all state if none given
+
+        Keys are ``'color'``, ``'blend_func'``, ``'viewport'``,
+        ``'vertex_pointer'``, ``('enable', cap)``, ``('client_state', cap)``,
+        ``('texture', target)``, and
+        ``('tex_parameter', target, texture, name)``.
+        """
+        if keys:
+            for key in keys:
+                self.cache.pop(key, None)
+        else:
+            self.cache.clear()
+
+    def reset_counts(self):
+        """Set ``calls_made`` and ``calls_saved`` to zero"""
+        self.calls_made = 0
+        self.calls_saved = 0
+
+    def _set(self, key, value, function, *args):
+        """Call function(*args) unless state `key` already has `value`"""
+        if not self.enabled:
+            function(*args)
+            self.calls_made += 1
+        elif key in self.cache and self.cache[key] == value:
+            self.calls_saved += 1
+        else:
+            function(*args)
+            self.cache[key] = value
+            self.calls_made += 1
+
+    def color(self, red, green, blue, alpha=1):
+        """Set the current color (glColor4f)"""
+        value = red, green, blue, alpha
+        self._set('color', value, gl.glColor4f, *value)
+
+    def blend_func(self, source, destination):
+        """Set the blend function (glBlendFunc)"""
+        self._set('blend_func', (source, destination), gl.glBlendFunc,
+            source, destination)
+
+    def viewport(self, x, y, width, height):
+        """Set the viewport (glViewport)"""
+        value = x, y, width, height
+        self._set('viewport', value, gl.glViewport, *value)
+
+    def enable(self, capability):
+        """Enable a server-side capability (glEnable)"""
+        self._set(('enable', capability), True, gl.glEnable, capability)
+
+    def disable(self, capability):
+        """Disable a server-side capability (glDisable)"""
+        self._set(('enable', capability), False, gl.glDisable, capability)
+
+    def enable_client_state(self, array):
+        """Enable a client-side array (glEnableClientState)"""
+        self._set(('client_state', array), True, gl.glEnableClientState,
+            array)
+
+    def disable_client_state(self, array):
+        """Disable a client-side array (glDisableClientState)"""
+        self._set(('client_state', array), False, gl.glDisableClientState,
+            array)
+
+    def vertex_pointer(self, size, data_type, pointer):
+        """Set the vertex array pointer (glVertexPointer, tightly packed)
+
+        :param pointer: A ctypes array, or the address of the data as an
+            int (as given by NumPy's ``array.ctypes.data``)
+
+        For a ctypes array, the call is only skipped if ``pointer`` is the
+        very same object as last time. The tracker keeps a reference to it,
+        so its memory can't be reused for a different array meanwhile.
+
+        An address is compared by value, and the tracker does not keep the
+        memory alive; the caller must do that while the pointer is in use.
+        OpenGL reads the data when drawing, so reusing the same address
+        for new data is fine.
+        """
+        if not self.enabled:
+            gl.glVertexPointer(size, data_type, 0, pointer)
+            self.calls_made += 1
+            return
+        value = pointer, size, data_type
+        cached = self.cache.get('vertex_pointer')
+        if isinstance(pointer, numbers.Integral):
+            same = cached == value
+        else:
+            same = (cached is not None and cached[0] is pointer and
+                cached[1:] == value[1:])
+        if same:
+            self.calls_saved += 1
+        else:
+            gl.glVertexPointer(size, data_type, 0, pointer)
+            self.cache['vertex_pointer'] = value
+            self.calls_made += 1
+
+    def bind_texture(self, target, texture):
+        """Bind a texture (glBindTexture)
+
+        :param texture: A texture name, as an int or a ctypes integer
+        """
+        texture = getattr(texture, 'value', texture)
+        self._set(('texture', target), texture, gl.glBindTexture,
+            target, texture)
+
+    def tex_parameter(self, target, name, value):
+        """Set an integer parameter of the bound texture (glTexParameteri)
+
+        If the bound texture is not known to the tracker, the call is always
+        made.
+        """
+        texture = self.cache.get(('texture', target))
+        if texture is None or not self.enabled:
+            gl.glTexParameteri(target, name, value)
+            self.calls_made += 1
+        else:
+            self._set(('tex_parameter', target, texture, name), value,
+                gl.glTexParameteri, target, name, value)
+
+    def forget_texture(self, texture):
+        """Forget everything about a texture that is being deleted
+
+        Texture names can be reused by OpenGL, so parameters remembered for
+        a deleted texture must not be applied to a new one.
+        """
+        texture = getattr(texture, 'value', texture)
+        for key, value in list(self.cache.items()):
+            if not isinstance(key, tuple):
+                continue
+            elif key[0] == 'tex_parameter' and key[2] == texture:
+                del self.cache[key]
+            elif key[0] == 'texture' and value == texture:
+                del self.cache[key]
+
+
+default_tracker = StateTracker()
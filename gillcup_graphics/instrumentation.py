@@ -0,0 +1,288 @@
+"""Per-frame counts of OpenGL calls and drawn objects
+
+A :class:`FrameInstrumentation` attached to a :class:`~gillcup_graphics.Window`
+counts what each frame costs: OpenGL calls by category, draw calls, state
+changes, framebuffer binds, matrix pushes, and the number of objects that
+were drawn or skipped. The counts for each frame are kept in a
+:class:`FrameStats` object, and the most recent ones in a rolling history::
+
+    instrumentation = FrameInstrumentation(history_size=60)
+    instrumentation.attach(window)
+    ...
+    print instrumentation.last.draw_calls
+    print instrumentation.average('gl_call_count')
+    instrumentation.detach()
+
+While attached, OpenGL functions in the :mod:`pyglet.gl` module are
+replaced by counting wrappers, and objects are counted by a
+:class:`~gillcup_graphics.objects.DrawHook`. Only OpenGL calls made through
+the module's attributes (as ``gl.glDrawArrays(...)``) are counted; this
+covers the drawing code of gillcup_graphics, but not Pyglet's own sprite
+and text drawing, which use names imported from the module.
+When no instrumentation is attached, nothing is wrapped, and drawing has
+no extra overhead.
+"""
+
+from __future__ import division
+
+import collections
+import re
+
+from pyglet import gl
+
+from gillcup_graphics.objects import DrawHook, GraphicsObject
+
+# Categories of OpenGL functions, as (category, regex) pairs.
+# The first matching regex wins; functions that match none are 'state'.
+gl_call_categories = [
+    ('draw', re.compile(r'gl(Multi)?Draw|glBegin$')),
+    ('vertex', re.compile(r'gl(Vertex|TexCoord|Normal)\d|glEnd$')),
+    ('matrix', re.compile(
+        r'gl(Push|Pop)Matrix|gl(Load|Mult)\w*Matrix|glLoadIdentity|'
+        r'gl(Translate|Rotate|Scale)[fd]|glMatrixMode|glOrtho|glFrustum')),
+    ('framebuffer', re.compile(
+        r'gl\w*Framebuffer|gl\w*Renderbuffer|glClear$')),
+    ('readback', re.compile(
+        r'glReadPixels|glGetTexImage|gl(Map|Unmap)Buffer|glReadBuffer')),
+    ('resource', re.compile(
+        r'gl(Gen|Delete|Create)|glTexImage|glBufferData|glShaderSource|'
+        r'glCompileShader|glLinkProgram|glAttachShader')),
+    ('query', re.compile(r'gl(Get|Is)[A-Z]')),
+]
+
+_gl_function_name = re.compile(r'gl[A-Z]')
+
+
+def gl_call_category(name):
+    """Return the category of the OpenGL function with the given name
+
+    The categories are ``'draw'``, ``'vertex'`` (immediate-mode vertex
+    data), ``'matrix'``, ``'framebuffer'``, ``'readback'``, ``'resource'``
+    (creating and deleting objects), ``'query'``, and ``'state'``.
+    """
+    for category, regex in gl_call_categories:
+        if regex.match(name):
+            return category
+    return 'state'
+
+
+class FrameStats(object):
+    """Counts for one frame
+
+    .. attribute:: gl_calls
+
+        Dict of OpenGL call counts by function name
+
+    .. attribute:: gl_calls_by_category
+
+        Dict of OpenGL call counts by category (see :func:`gl_call_category`)
+
+    .. attribute:: gl_call_count
+
+        Total number of OpenGL calls
+
+    .. attribute:: draw_calls
+
+        Number of calls that draw primitives (``glDrawArrays``,
+        ``glBegin``, ...)
+
+    .. attribute:: state_changes
+
+        Number of OpenGL state changes
+
+    .. attribute:: state_changes_saved
+
+        Number of redundant state changes that were skipped (see
+        :mod:`gillcup_graphics.glstate`)
+
+    .. attribute:: fbo_binds
+
+        Number of framebuffer binds
+
+    .. attribute:: matrix_pushes
+
+        Number of ``glPushMatrix`` calls
+
+    .. attribute:: objects_drawn
+
+        Number of objects (including layers, and objects drawn in batches)
+        that were drawn
+
+    .. attribute:: objects_hidden
+
+        Number of hidden objects that were skipped
+
+    .. attribute:: objects_culled
+
+        Number of objects that were skipped because they were outside the
+        window
+
+    .. attribute:: effect_passes_saved
+
+        Number of offscreen passes saved by merging
+        :class:`~gillcup_graphics.EffectLayer` effects
+    """
+    def __init__(self, gl_calls, objects_drawn=0, objects_hidden=0,
+            window=None):
+        self.gl_calls = gl_calls
+        by_category = collections.defaultdict(int)
+        for name, count in gl_calls.items():
+            by_category[gl_call_category(name)] += count
+        self.gl_calls_by_category = dict(by_category)
+        self.gl_call_count = sum(gl_calls.values())
+        self.draw_calls = by_category['draw']
+        self.state_changes = by_category['state']
+        self.fbo_binds = sum(count for name, count in gl_calls.items()
+            if name.startswith('glBindFramebuffer'))
+        self.matrix_pushes = gl_calls.get('glPushMatrix', 0)
+        self.objects_drawn = objects_drawn
+        self.objects_hidden = objects_hidden
+        self.objects_culled = getattr(window, 'culled_count', 0)
+        self.effect_passes_saved = getattr(window, 'effect_passes_saved', 0)
+        self.state_changes_saved = getattr(window, 'gl_calls_saved', 0)
+
+    def __repr__(self):
+        return ('<FrameStats: {0.gl_call_count} GL calls, {0.draw_calls} '
+            'draw calls, {0.objects_drawn} objects drawn>'.format(self))
+
+
+class _Counters(DrawHook):
+    """Installs the counting wrappers, and holds the counts of this frame
+
+    The wrappers (and the draw hook) are shared by all attached
+    instrumentations; they are installed for the first one and removed after
+    the last one detaches.
+    """
+    def __init__(self):
+        self.users = 0
+        self.originals = {}
+        self.gl_calls = None
+        self.objects_drawn = 0
+        self.objects_hidden = 0
+
+    def install(self):
+        """Replace OpenGL functions by counting wrappers, add the draw hook"""
+        self.users += 1
+        if self.users > 1:
+            return
+        for name in dir(gl):
+            function = getattr(gl, name)
+            if _gl_function_name.match(name) and callable(function):
+                self.originals[name] = function
+                setattr(gl, name, self._wrap_gl(name, function))
+        GraphicsObject.add_draw_hook(self)
+
+    def uninstall(self):
+        """Restore the original functions, remove the draw hook"""
+        self.users -= 1
+        if self.users > 0:
+            return
+        GraphicsObject.remove_draw_hook(self)
+        for name, function in self.originals.items():
+            setattr(gl, name, function)
+        self.originals.clear()
+
+    def _wrap_gl(self, name, function):
+        """Return a wrapper that counts calls of an OpenGL function"""
+        def counting_gl_function(*args):
+            """Count the call, and call the OpenGL function"""
+            gl_calls = self.gl_calls
+            if gl_calls is not None:
+                gl_calls[name] = gl_calls.get(name, 0) + 1
+            return function(*args)
+        counting_gl_function.__name__ = name
+        return counting_gl_function
+
+    def enter(self, obj):
+        """Count a drawn object"""
+        if self.gl_calls is not None:
+            self.objects_drawn += 1
+
+    def batched(self, obj):
+        """Count an object drawn in a batch"""
+        if self.gl_calls is not None:
+            self.objects_drawn += 1
+
+    def hidden(self, obj):
+        """Count a hidden object"""
+        if self.gl_calls is not None:
+            self.objects_hidden += 1
+
+    def begin_frame(self):
+        """Start counting"""
+        self.gl_calls = {}
+        self.objects_drawn = 0
+        self.objects_hidden = 0
+
+    def end_frame(self, window):
+        """Stop counting and return the FrameStats"""
+        stats = FrameStats(self.gl_calls, objects_drawn=self.objects_drawn,
+            objects_hidden=self.objects_hidden, window=window)
+        self.gl_calls = None
+        return stats
+
+_counters = _Counters()
+
+
+class FrameInstrumentation(object):
+    """Collects :class:`FrameStats` for the frames drawn by a window
+
+    :param history_size: The number of frames to keep in the history
+
+    .. attribute:: history
+
+        A deque of :class:`FrameStats` for the most recent frames, oldest
+        first
+
+    .. attribute:: frame_count
+
+        The number of frames counted so far
+    """
+    def __init__(self, history_size=120):
+        self.history = collections.deque(maxlen=history_size)
+        self.frame_count = 0
+        self.window = None
+
+    def attach(self, window):
+        """Start counting frames drawn by the given window"""
+        if self.window is not None:
+            raise ValueError('Instrumentation is already attached')
+        if window.instrumentation is not None:
+            raise ValueError('Window already has an instrumentation')
+        _counters.install()
+        self.window = window
+        window.instrumentation = self
+
+    def detach(self):
+        """Stop counting, and remove the counting wrappers if unused"""
+        if self.window is not None:
+            self.window.instrumentation = None
+            self.window = None
+            _counters.uninstall()
+
+    def begin_frame(self):
+        """Start counting a frame (called by the window)"""
+        _counters.begin_frame()
+
+    def end_frame(self, window):
+        """Finish counting a frame (called by the window)"""
+        self.history.append(_counters.end_frame(window))
+        self.frame_count += 1
+
+    @property
+    def last(self):
+        """The :class:`FrameStats` of the last frame, or None"""
+        if self.history:
+            return self.history[-1]
+        else:
+            return None
+
+    def average(self, attribute):
+        """Return the average of a FrameStats attribute over the history
+
+        Returns None if the history is empty.
+        """
+        if not self.history:
+            return None
+        return sum(getattr(stats, attribute) for stats in self.history) / (
+            len(self.history))
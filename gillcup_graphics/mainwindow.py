@@ -8,6 +8,9 @@ import pyglet
 from pyglet import gl
 
 import gillcup
+from gillcup_graphics import framecache
+from gillcup_graphics import tracing
+from gillcup_graphics.glstate import default_tracker
 from gillcup_graphics.transformation import (
     GlTransformation, PointTransformation)
 
@@ -37,7 +40,31 @@ class Window(pyglet.window.Window):  # pylint: disable=W0223
 
     Other arguments are explained in the `Pyglet documentation
     <http://www.pyglet.org/doc/api/pyglet.window.Window-class.html#__init__>`_.
+
+    After each frame, the ``culled_count`` attribute holds the number of
+    objects (along with their children) that were skipped in the frame
+    because they were entirely outside the window, and the
+    ``effect_passes_saved`` attribute holds the number of offscreen passes
+    saved by merging nested :class:`~gillcup_graphics.EffectLayer` effects.
+    The ``gl_calls_saved`` attribute holds the number of redundant OpenGL
+    state changes that were skipped, if state tracking is enabled (see
+    :mod:`gillcup_graphics.glstate`).
+
+    The ``transformation_class`` attribute gives the transformation used for
+    drawing; set it to
+    :class:`~gillcup_graphics.transformation.CpuGlTransformation` to keep
+    the matrix stack on the CPU.
+
+    The ``instrumentation`` attribute holds the
+    :class:`~gillcup_graphics.instrumentation.FrameInstrumentation` attached
+    to the window, if any.
     """
+    culled_count = 0
+    effect_passes_saved = 0
+    gl_calls_saved = 0
+    transformation_class = GlTransformation
+    instrumentation = None
+
     def __init__(self, layer, *args, **kwargs):
         self.layer = layer
         kwargs.setdefault('caption', 'Gillcup Window')
@@ -52,17 +79,39 @@ class Window(pyglet.window.Window):  # pylint: disable=W0223
 
     # pylint: disable=W0221
     def on_draw(self):
+        with tracing.span('Window.on_draw', 'frame'):
+            instrumentation = self.instrumentation
+            if instrumentation:
+                instrumentation.begin_frame()
+                try:
+                    self._draw_frame()
+                finally:
+                    instrumentation.end_frame(self)
+            else:
+                self._draw_frame()
+
+    def _draw_frame(self):
+        """Clear the window and draw the layer"""
         gl.glClearColor(0, 0, 0, 0)
         gl.glClearDepth(1)
         self.clear()
-        gl.glEnable(gl.GL_LINE_SMOOTH)
-        gl.glEnable(gl.GL_BLEND)
-        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        # Other code may have changed the OpenGL state since the last frame
+        tracker = default_tracker
+        tracker.invalidate()
+        tracker.reset_counts()
+        tracker.enable(gl.GL_LINE_SMOOTH)
+        tracker.enable(gl.GL_BLEND)
+        tracker.blend_func(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
         gl.glClear(gl.GL_COLOR_BUFFER_BIT)
-        gl.glViewport(0, 0, self.width, self.height)
-        transformation = GlTransformation()
+        tracker.viewport(0, 0, self.width, self.height)
+        transformation = self.transformation_class()
         transformation.reset()
-        self.layer.do_draw(window=self, transformation=transformation)
+        self.culled_count = 0
+        self.effect_passes_saved = 0
+        with framecache.frame():
+            self.layer.do_draw(window=self, transformation=transformation)
+        transformation.load()
+        self.gl_calls_saved = tracker.calls_saved
 
     # pylint: disable=W0221
     def on_resize(self, width, height):
@@ -102,10 +151,13 @@ class Window(pyglet.window.Window):  # pylint: disable=W0223
         """Fire a pointer event on the client layer"""
         transformation = PointTransformation(x, y, 0)
         layer = self.layer
-        with transformation.state:
-            layer.transform(transformation)
-            layer.pointer_event(kind, pointer, x, y, 0,
-                transformation=transformation, **kwargs)
+        with tracing.span('Window.pointer_event', 'input', kind=kind,
+                pointer=pointer):
+            with framecache.frame():
+                with transformation.state:
+                    layer.apply_transform(transformation)
+                    layer.pointer_event(kind, pointer, x, y, 0,
+                        transformation=transformation, **kwargs)
 
     # pylint: disable=W0221
     def on_key_press(self, key, modifiers):
@@ -139,3 +191,7 @@ class RealtimeClock(gillcup.Clock):
     def __init__(self):
         super(RealtimeClock, self).__init__()
         pyglet.clock.schedule(self.advance)
+
+    def advance(self, dt):
+        with tracing.span('RealtimeClock.advance', 'clock'):
+            super(RealtimeClock, self).advance(dt)
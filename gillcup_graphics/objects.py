@@ -32,19 +32,85 @@ import pyglet
 from pyglet import gl
 
 import gillcup
-from gillcup import properties
 from gillcup.effect import Effect
 
-color_property = gillcup.TupleProperty(1, 1, 1,
+from gillcup_graphics import framecache
+from gillcup_graphics.glstate import default_tracker
+from gillcup_graphics.transformation import MatrixTransformation
+from gillcup_graphics.spatialindex import GridIndex
+from gillcup_graphics.childlist import ChildList
+
+color_property = framecache.TupleProperty(1, 1, 1,
     docstring="""Color or tint of the object
 
     The individual components are in the ``red``, ``green``, ``blue``
     attributes.""")
 
-opacity_property = gillcup.AnimatedProperty(1,
+opacity_property = framecache.AnimatedProperty(1,
         docstring="""Opacity of the object""")
 
 
+class _GeometryPropertyMixin(object):
+    """Mixin for properties that an object's transformation depends on
+
+    Setting or animating them discards the parent's spatial index.
+    """
+    def animate(self, instance, animation):
+        """Set a new effect on this property; return the old one"""
+        parent = getattr(instance, 'parent', None)
+        if parent is not None:
+            parent._spatial_index = None  # pylint: disable=W0212
+        return super(_GeometryPropertyMixin, self).animate(instance,
+            animation)
+
+
+class _GeometryProperty(_GeometryPropertyMixin, framecache.AnimatedProperty):
+    """A scalar geometry property"""
+
+
+class _GeometryVectorProperty(_GeometryPropertyMixin,
+        framecache.VectorProperty):
+    """A vector geometry property"""
+
+
+class _GeometryScaleProperty(_GeometryPropertyMixin,
+        framecache.ScaleProperty):
+    """A scale or size geometry property"""
+
+
+class DrawHook(object):
+    """Receives notifications about drawn objects
+
+    Hooks are registered with :meth:`GraphicsObject.add_draw_hook`.
+    This base class does nothing; subclasses override the methods they need.
+    Profiling tools, such as :class:`~gillcup_graphics.profiler.Profiler`,
+    are implemented as hooks.
+    """
+    def enter(self, obj):
+        """Called by :meth:`GraphicsObject.do_draw` before drawing an object
+        """
+        pass
+
+    def exit(self, obj):
+        """Called by :meth:`GraphicsObject.do_draw` after drawing an object
+
+        It is called even if drawing raised an exception.
+        """
+        pass
+
+    def hidden(self, obj):
+        """Called for a hidden object that is skipped"""
+        pass
+
+    def batched(self, obj):
+        """Called for an object drawn as part of a batched :class:`Layer`
+
+        Batched objects are drawn together, so they do not get
+        :meth:`enter` and :meth:`exit` calls.
+        """
+        pass
+
+
 class GraphicsObject(object):
     """Base class for gillcup_graphics scene objects
 
@@ -58,7 +124,13 @@ class GraphicsObject(object):
     :param kwargs: Any animated property (including those from subclasses)
         can be initialized by passing a value as a keyword argument to
         ``__init__``.
+
+    The ``draw_hooks`` class attribute holds a tuple of :class:`DrawHook`
+    objects that are told about every object drawn. Use :meth:`add_draw_hook`
+    and :meth:`remove_draw_hook` to change it.
     """
+    draw_hooks = ()
+
     def __init__(self,
             parent=None,
             to_back=False,
@@ -73,7 +145,7 @@ class GraphicsObject(object):
             RelativeAnchor(self).apply_to(self, 'anchor')
         self.set_animated_properties(kwargs)
 
-    x, y, z = position = properties.VectorProperty(3,
+    x, y, z = position = _GeometryVectorProperty(3,
         docstring="""The object's position in space
 
         This is an offset between the parent's anchor and this object's own
@@ -81,24 +153,24 @@ class GraphicsObject(object):
 
         The individual components are in the ``x``, ``y``, ``z``
         attributes.""")
-    anchor_x, anchor_y, anchor_z = anchor = properties.VectorProperty(3,
+    anchor_x, anchor_y, anchor_z = anchor = _GeometryVectorProperty(3,
         docstring="""A point that represents this object for positioning.
 
         The individual components are in the ``anchor_x``, ``anchor_y``,
         ``anchor_z`` attributes.""")
-    scale_x, scale_y, scale_z = scale = properties.ScaleProperty(3,
+    scale_x, scale_y, scale_z = scale = _GeometryScaleProperty(3,
         docstring="""The object's scale.
 
         The individual components are in the ``scale_x``, ``scale_y``,
         ``scale_z`` attributes.""")
-    width, height = size = properties.ScaleProperty(2,
+    width, height = size = _GeometryScaleProperty(2,
         docstring="""The object's natural size
 
         The individual components are in the ``width`` and ``height``
         attributes.""")
-    rotation = gillcup.AnimatedProperty(0,
+    rotation = _GeometryProperty(0,
         docstring="""Rotation about the object's anchor""")
-    relative_anchor = properties.VectorProperty(3,
+    relative_anchor = _GeometryVectorProperty(3,
         docstring="""Anchor of the object relative to the object's size
 
         When ``relative_anchor`` is (1, 1), the ``anchor`` is in the
@@ -113,6 +185,12 @@ class GraphicsObject(object):
     relative_anchor_x, relative_anchor_y, relative_anchor_z = relative_anchor
 
     hidden = False
+    geometry_tracked = True
+
+    _local_transformation = None
+    _transform_parameters = None
+    _world_transformation = None
+    _world_bounds = None
 
     interesting_attribute_names = ['hidden']
 
@@ -158,13 +236,42 @@ class GraphicsObject(object):
 
         Subclasses will usually want to override draw(), not this method.
         """
-        # XXX: Make sure tree is never deeper than 32
+        # XXX: With GlTransformation, the tree must not be deeper than the
+        # OpenGL matrix stack (at least 32)
+        # pylint: disable=E1101
+        # (pylint infers draw_hooks as the empty tuple it starts as)
+        hooks = GraphicsObject.draw_hooks
         if self.is_hidden():
+            for hook in hooks:
+                hook.hidden(self)
             return
-        with transformation.state:
-            self.transform(transformation)
-            self.draw(transformation=transformation, **kwargs)
-        return
+        for hook in hooks:
+            hook.enter(self)
+        try:
+            with transformation.state:
+                self.apply_transform(transformation)
+                self.draw(transformation=transformation, **kwargs)
+        finally:
+            for hook in hooks:
+                hook.exit(self)
+
+    @staticmethod
+    def add_draw_hook(hook):
+        """Start telling the given :class:`DrawHook` about drawn objects
+
+        Adding a hook that is already there has no effect.
+        """
+        if hook not in GraphicsObject.draw_hooks:
+            GraphicsObject.draw_hooks += (hook, )
+
+    @staticmethod
+    def remove_draw_hook(hook):
+        """Stop telling the given :class:`DrawHook` about drawn objects
+
+        Removing a hook that is not there has no effect.
+        """
+        GraphicsObject.draw_hooks = tuple(
+            h for h in GraphicsObject.draw_hooks if h is not hook)
 
     def draw(self, **kwargs):
         """Draw this object. Overridden in subclasses.
@@ -172,6 +279,7 @@ class GraphicsObject(object):
         :param transformation: A
             :class:`~gillcup_graphics.transformation.GlTransformation` object
             controlling the current OpenGL matrix.
+            Call its ``load`` method before making OpenGL drawing calls.
         :param window: A :class:`~gillcup_graphics.Window` for which the
             drawing is done.
 
@@ -190,12 +298,93 @@ class GraphicsObject(object):
         No :meth:`~gillcup_graphics.transformation.BaseTransformation.push`
         or :meth:`~gillcup_graphics.transformation.BaseTransformation.pop`
         calls should be made, only transformations.
+
+        The result of this method is cached (see
+        :attr:`local_transformation`). Subclasses that override it to use
+        other values should extend :meth:`transform_parameters` accordingly.
         """
         transformation.translate(*self.position)
         transformation.rotate(self.rotation, 0, 0, 1)
         transformation.scale(*self.scale)
         transformation.translate(*(-x for x in self.anchor))
 
+    def transform_parameters(self):
+        """Return the values that the result of :meth:`transform` depends on
+
+        When these don't change, the cached :attr:`local_transformation`
+        is reused.
+        """
+        return self.position, self.rotation, self.scale, self.anchor
+
+    def draw_parameters(self):
+        """Return the values that the appearance of this object depends on
+
+        If these don't change, a cached rendering of the object (see
+        :attr:`~gillcup_graphics.EffectLayer.cache_as_bitmap`) is reused.
+        Subclasses whose ``draw`` uses other values should extend this method.
+        """
+        return type(self), self.is_hidden(), self.transform_parameters()
+
+    def apply_transform(self, transformation):
+        """Apply this object's transformation to the given Transformation
+
+        This has the same effect as :meth:`transform`, but uses the cached
+        :attr:`local_transformation` matrix.
+        """
+        transformation.premultiply(self.local_transformation)
+
+    @property
+    def local_transformation(self):
+        """A :class:`~gillcup_graphics.transformation.MatrixTransformation`
+        from this object's coordinates to its parent's
+
+        The matrix is only recomputed when :meth:`transform_parameters`
+        change. The same object is returned while they stay the same, so
+        it is possible to check for changes by identity.
+        """
+        parameters = self.transform_parameters()
+        if (self._local_transformation is None or
+                parameters != self._transform_parameters):
+            matrix = MatrixTransformation()
+            self.transform(matrix)
+            self._local_transformation = matrix
+            self._transform_parameters = parameters
+        return self._local_transformation
+
+    @property
+    def world_transformation(self):
+        """A :class:`~gillcup_graphics.transformation.MatrixTransformation`
+        from this object's coordinates to the coordinates of the scene root's
+        parent (usually, the window)
+
+        The matrix is only recomputed when the transformation of this object
+        or any of its parents changes, or when the object is reparented.
+        """
+        local = self.local_transformation
+        if self.parent:
+            parent_space = self.parent.content_transformation
+        else:
+            parent_space = None
+        cached = self._world_transformation
+        if cached and cached[0] is local and cached[1] is parent_space:
+            return cached[2]
+        matrix = MatrixTransformation()
+        if parent_space:
+            matrix.matrix = parent_space.matrix
+        matrix.premultiply(local)
+        self._world_transformation = local, parent_space, matrix
+        return matrix
+
+    @property
+    def content_transformation(self):
+        """A MatrixTransformation from the space of this object's contents
+        to the scene root's parent
+
+        Usually the same as :attr:`world_transformation`; Layers shift their
+        children by their anchor.
+        """
+        return self.world_transformation
+
     def die(self):
         """Destroy this object
 
@@ -211,21 +400,26 @@ class GraphicsObject(object):
         Remove this object from the current parent (if there is one) and
         attech to a new one (if new_parent is not ``None``.
         The `to_back` argument is the same as for :meth:`__init__`.
+        Reparenting takes constant time, regardless of the number of
+        siblings.
 
         Beware that reparenting may throw off the pointer tracking mechanism.
         Specifically, 'leave' and 'release' events might not fire properly.
         """
         assert new_parent is not self
+        self._world_transformation = None
         if self.parent:
-            self.parent.children = [
-                    c for c in self.parent.children if c is not self
-                ]
+            self.parent._spatial_index = None  # pylint: disable=W0212
+            self.parent._forget_bounds()  # pylint: disable=W0212
+            self.parent.children.remove(self)
             self.parent = None
         if new_parent:
             if to_back:
-                new_parent.children.insert(0, self)
+                new_parent.children.prepend(self)
             else:
                 new_parent.children.append(self)
+            new_parent._spatial_index = None  # pylint: disable=W0212
+            new_parent._forget_bounds()  # pylint: disable=W0212
             self.parent = new_parent
 
     def hit_test(self, _x, _y, _z):
@@ -236,6 +430,48 @@ class GraphicsObject(object):
         """
         return True
 
+    def bounds(self):
+        """Return the bounding box of what this object draws, or None
+
+        The box is a (min_x, min_y, max_x, max_y) tuple in the object's local
+        coordinates.
+        None means the bounds are not known; such objects are never culled.
+        Subclasses that draw something should override this.
+        """
+        return None
+
+    def hit_bounds(self):
+        """Return a box outside of which :meth:`hit_test` is always false
+
+        The box is a (min_x, min_y, max_x, max_y) tuple in the object's local
+        coordinates, or None if it is not known. Layers with a spatial index
+        use this to skip hit tests.
+        Subclasses that override :meth:`hit_test` should override this too.
+
+        Layers only look at the result again when the object's position,
+        anchor, scale, size, rotation or relative anchor are set or
+        animated. Subclasses whose hit bounds or :meth:`transform` depend
+        on other values should set the ``geometry_tracked`` class attribute
+        to false, so they are checked on every pointer event.
+        """
+        return None
+
+    def world_bounds(self):
+        """Return the bounding box of this object in world coordinates
+
+        Returns None if the :meth:`bounds` are not known.
+        The result is only recomputed when the :meth:`bounds` or the
+        :attr:`world_transformation` change.
+        """
+        bounds = self.bounds()
+        world = self.world_transformation
+        cached = self._world_bounds
+        if cached and cached[0] is world and cached[1] == bounds:
+            return cached[2]
+        result = transform_bounds(bounds, world)
+        self._world_bounds = world, bounds, result
+        return result
+
     def pointer_event(self, event_type, pointer, x, y, z, **kwargs):
         """Handle a pointer (mouse) event
 
@@ -378,6 +614,55 @@ class GraphicsObject(object):
         pass
 
 
+def transform_bounds(bounds, matrix):
+    """Return the bounding box of a box transformed by the given matrix
+
+    :param bounds: A (min_x, min_y, max_x, max_y) box, or None
+    :param matrix: A
+        :class:`~gillcup_graphics.transformation.MatrixTransformation`
+
+    The box is assumed to lie in the z=0 plane.
+    If bounds is None, returns None.
+    """
+    if bounds is None:
+        return None
+    (m0, m1, _m2, _m3,
+     m4, m5, _m6, _m7,
+     _m8, _m9, _m10, _m11,
+     m12, m13, _m14, _m15,
+    ) = matrix.matrix
+    min_x, min_y, max_x, max_y = bounds
+    xs = []
+    ys = []
+    for x, y in ((min_x, min_y), (max_x, min_y), (min_x, max_y),
+            (max_x, max_y)):
+        xs.append(x * m0 + y * m4 + m12)
+        ys.append(x * m1 + y * m5 + m13)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+_font_ascents = {}
+
+
+def _font_ascent(font_name, font_size):
+    """Return the ascent of the given font
+
+    Loading a font is slow, so the results are cached.
+    """
+    key = font_name, font_size
+    try:
+        return _font_ascents[key]
+    except KeyError:
+        ascent = _font_ascents[key] = pyglet.font.load(*key).ascent
+        return ascent
+
+
+def bounds_intersect(first, second):
+    """Return true if the two (min_x, min_y, max_x, max_y) boxes intersect"""
+    return (first[0] <= second[2] and second[0] <= first[2] and
+        first[1] <= second[3] and second[1] <= first[3])
+
+
 class RelativeAnchor(Effect):
     """Put on an ``anchor`` property to make it respect relative_anchor"""
     is_constant = True
@@ -394,6 +679,28 @@ class RelativeAnchor(Effect):
             obj.height * obj.relative_anchor_y)
 
 
+_geometry_property_names = (
+    'position', 'anchor', 'scale', 'size', 'rotation', 'relative_anchor')
+
+
+def _has_running_geometry(obj):
+    """Return true if a geometry property of obj can change by itself
+
+    That is, if it is animated by something else than a constant, or if
+    a subclass replaced it by something that is not an animated property.
+    Finished animations are replaced by constants first.
+    """
+    cls = type(obj)
+    for name in _geometry_property_names:
+        prop = getattr(cls, name)
+        if not isinstance(prop, gillcup.AnimatedProperty):
+            return True
+        prop.do_replacements(obj)
+        if not prop.get_effect(obj).is_constant:
+            return True
+    return False
+
+
 class Layer(GraphicsObject):
     """A container for GraphicsObjects
 
@@ -401,14 +708,87 @@ class Layer(GraphicsObject):
 
     Init arguments are the same as for
     :class:`~gillcup_graphics.GraphicsObject`.
+
+    If the ``batched`` attribute is set to true, the layer draws
+    :class:`~gillcup_graphics.Rectangle` descendants in batches: their
+    vertices and colors are computed on the CPU and sent to OpenGL in as few
+    draw calls as possible, instead of a handful of calls per rectangle.
+    Plain Layers inside a batched layer are batched as well.
+    Other objects (and subclasses that override ``draw``) are drawn normally,
+    so the painter's order is kept.
+    Batched rectangles and layers are not drawn with
+    :meth:`~gillcup_graphics.GraphicsObject.do_draw`: draw hooks are only
+    told about them through :meth:`~gillcup_graphics.objects.DrawHook.batched`,
+    so profilers and tracers count their time in the batched layer's time.
+
+    If the ``culling`` attribute is true (the default), children whose
+    :meth:`~gillcup_graphics.GraphicsObject.world_bounds` are entirely
+    outside the window are not drawn.
+    The number of children skipped this way in the last frame is available in
+    the window's ``culled_count`` attribute.
+    Within a frame, the :meth:`bounds` of a layer are computed once, so
+    culling nested layers does not walk their subtrees over and over.
+    Batched layers do not cull their descendants.
+
+    If the ``use_spatial_index`` attribute is set to true, pointer events
+    only hit-test children whose
+    :meth:`~gillcup_graphics.GraphicsObject.hit_bounds` contain the pointer,
+    using a :class:`~gillcup_graphics.spatialindex.GridIndex`.
+    This helps layers with many interactive children.
+    The index is rebuilt when the children list changes, or when a child's
+    position, anchor, scale, size, rotation or relative anchor is set or
+    animated.
+    While such an animation runs (and for children whose ``geometry_tracked``
+    attribute is false), the child is checked for changes on each pointer
+    event; other children are not looked at until the index is rebuilt.
     """
+    batched = False
+    culling = True
+    use_spatial_index = False
+
+    _content_transformation = None
+    _spatial_index = None
+    _bounds = None
 
     def __init__(self, parent=None, **kwargs):
         super(Layer, self).__init__(parent, **kwargs)
-        self.children = []
+        self._children = ChildList()
         self.hovered_children = dict()
         self.dragging_children = collections.defaultdict(dict)
 
+    @property
+    def children(self):
+        """The layer's children, in drawing order
+
+        This is a :class:`~gillcup_graphics.childlist.ChildList`, which acts
+        like a read-only list, but allows fast addition and removal.
+        Use :meth:`~gillcup_graphics.GraphicsObject.reparent` rather than
+        modifying it directly.
+
+        For compatibility, a list may be assigned to this attribute.
+        """
+        return self._children
+
+    @children.setter
+    def children(self, new_children):
+        """Replace the children"""
+        self._children = ChildList(new_children)
+        self._spatial_index = None
+        self._forget_bounds()
+
+    @property
+    def content_transformation(self):
+        world = self.world_transformation
+        anchor = self.anchor
+        cached = self._content_transformation
+        if cached and cached[0] is world and cached[1] == anchor:
+            return cached[2]
+        matrix = MatrixTransformation()
+        matrix.matrix = world.matrix
+        matrix.translate(*anchor)
+        self._content_transformation = world, anchor, matrix
+        return matrix
+
     def die(self):
         """Destroy this object
 
@@ -420,11 +800,163 @@ class Layer(GraphicsObject):
             if child.parent is self:
                 child.die()
 
+    def draw_parameters(self):
+        """Return the values the appearance of this layer depends on
+
+        These include the draw parameters of all children.
+        """
+        return super(Layer, self).draw_parameters() + (
+            self.children_draw_parameters(), )
+
+    def children_draw_parameters(self):
+        """Return the identities and draw parameters of all children"""
+        return tuple((id(child), child.draw_parameters())
+            for child in self.children)
+
     def draw(self, transformation, **kwargs):
         """Draw all of the layer's children"""
         transformation.translate(*self.anchor)
-        for c in self.children:
-            c.do_draw(transformation=transformation, **kwargs)
+        if self.batched:
+            batch = _RectangleBatch()
+            self._draw_batched(batch, MatrixTransformation(), transformation,
+                kwargs)
+            batch.flush(transformation)
+        else:
+            window = kwargs.get('window')
+            if window and self.culling:
+                viewport = 0, 0, window.width, window.height
+            else:
+                viewport = None
+            for c in self.children:
+                if viewport and not c.is_hidden():
+                    bounds = c.world_bounds()
+                    if bounds and not bounds_intersect(bounds, viewport):
+                        window.culled_count += 1
+                        continue
+                c.do_draw(transformation=transformation, **kwargs)
+
+    def bounds(self):
+        """Return the bounding box of all the children, in local coordinates
+
+        Returns None if the bounds of any visible child are unknown, or if
+        there are no visible children.
+
+        Inside a :func:`gillcup_graphics.framecache.frame` block, the result
+        is cached until the frame cache is invalidated or the children
+        change.
+        """
+        stamp = framecache.frame_stamp()
+        cached = self._bounds
+        if stamp is not None and cached and cached[0] == stamp:
+            return cached[1]
+        result = self._compute_bounds()
+        self._bounds = stamp, result
+        return result
+
+    def _compute_bounds(self):
+        """Compute the result of bounds()"""
+        result = None
+        for child in self.children:
+            if child.is_hidden():
+                continue
+            child_bounds = transform_bounds(child.bounds(),
+                child.local_transformation)
+            if child_bounds is None:
+                return None
+            elif result is None:
+                result = child_bounds
+            else:
+                result = (
+                    min(result[0], child_bounds[0]),
+                    min(result[1], child_bounds[1]),
+                    max(result[2], child_bounds[2]),
+                    max(result[3], child_bounds[3]),
+                )
+        if result is None:
+            return None
+        anchor_x, anchor_y = self.anchor[:2]
+        return (result[0] + anchor_x, result[1] + anchor_y,
+            result[2] + anchor_x, result[3] + anchor_y)
+
+    def _forget_bounds(self):
+        """Discard the cached bounds of this layer and all its parents"""
+        layer = self
+        while layer is not None:
+            layer._bounds = None  # pylint: disable=W0212
+            layer = layer.parent
+
+    def _draw_batched(self, batch, matrix, transformation, kwargs):
+        """Add children to a batch, drawing non-batchable ones directly
+
+        ``matrix`` is the transformation from the children's parent space
+        to the space of the topmost batched Layer.
+        """
+        # pylint: disable=E1101
+        # (pylint infers draw_hooks as the empty tuple it starts as)
+        hooks = GraphicsObject.draw_hooks
+        for child in self.children:
+            is_rectangle = _draws_like(child, Rectangle)
+            if not is_rectangle and not _draws_like(child, Layer):
+                batch.flush(transformation)
+                with transformation.state:
+                    transformation.premultiply(matrix)
+                    child.do_draw(transformation=transformation, **kwargs)
+            elif child.is_hidden():
+                for hook in hooks:
+                    hook.hidden(child)
+            else:
+                for hook in hooks:
+                    hook.batched(child)
+                with matrix.state:
+                    child.apply_transform(matrix)
+                    if is_rectangle:
+                        batch.add(child, matrix, kwargs.get('tint'))
+                    else:
+                        matrix.translate(*child.anchor)
+                        child._draw_batched(  # pylint: disable=W0212
+                            batch, matrix, transformation, kwargs)
+
+    def _build_spatial_index(self):
+        """Build the spatial index of the children
+
+        Returns a (children, index, watched) tuple, where ``watched`` is a
+        list of (child, local transformation, hit bounds) for the children
+        that can change without discarding the index.
+        """
+        children = list(self.children)
+        boxes = []
+        watched = []
+        for child in children:
+            matrix = child.local_transformation
+            hit_bounds = child.hit_bounds()
+            boxes.append(transform_bounds(hit_bounds, matrix))
+            if not child.geometry_tracked or _has_running_geometry(child):
+                watched.append((child, matrix, hit_bounds))
+        return children, GridIndex(boxes), watched
+
+    def _check_spatial_index(self):
+        """Discard the spatial index if a watched child moved or changed
+
+        Other children discard the index themselves when they change (see
+        :class:`_GeometryPropertyMixin`).
+        """
+        for child, matrix, hit_bounds in self._spatial_index[2]:
+            if (child.local_transformation is not matrix or
+                    child.hit_bounds() != hit_bounds):
+                self._spatial_index = None
+                return
+
+    def _hit_test_candidates(self, transformation):
+        """Return children that the pointer might hit, in drawing order"""
+        if not self.use_spatial_index:
+            return self.children
+        if self._spatial_index is not None:
+            self._check_spatial_index()
+        if self._spatial_index is None:
+            self._spatial_index = self._build_spatial_index()
+        children, index, _watched = self._spatial_index
+        x, y, _z = transformation.point
+        return [children[i] for i in reversed(index.query(x, y))]
 
     @staticmethod
     def _hit_test_generator(children, transformation):
@@ -435,7 +967,7 @@ class Layer(GraphicsObject):
         for child in reversed(children):
             with transformation.state:
                 try:
-                    child.transform(transformation)
+                    child.apply_transform(transformation)
                 except ZeroDivisionError:
                     yield child, (False, False, False), None
                 else:
@@ -454,7 +986,7 @@ class Layer(GraphicsObject):
             if child in self.children:
                 with transformation.state:
                     try:
-                        child.transform(transformation)
+                        child.apply_transform(transformation)
                     except ZeroDivisionError:
                         point = False, False, False
                     else:
@@ -463,7 +995,8 @@ class Layer(GraphicsObject):
                         **kwargs)
         new_hovered_children = set()
         retval = None
-        generator = self._hit_test_generator(self.children, transformation)
+        generator = self._hit_test_generator(
+            self._hit_test_candidates(transformation), transformation)
         for child, point, hit in generator:
             if hit:
                 retval = child.pointer_event('motion', pointer, *point,
@@ -475,7 +1008,7 @@ class Layer(GraphicsObject):
         for child in hovered - new_hovered_children:
             with transformation.state:
                 try:
-                    child.transform(transformation)
+                    child.apply_transform(transformation)
                 except ZeroDivisionError:
                     point = False, False, False
                 else:
@@ -495,7 +1028,8 @@ class Layer(GraphicsObject):
     def on_pointer_press(self, pointer, *point, **kwargs):
         transformation = kwargs['transformation']
         button = kwargs['button']
-        generator = self._hit_test_generator(self.children, transformation)
+        generator = self._hit_test_generator(
+            self._hit_test_candidates(transformation), transformation)
         for child, point, hit in generator:
             if hit:
                 ret = child.pointer_event('press', pointer, *point, **kwargs)
@@ -513,7 +1047,7 @@ class Layer(GraphicsObject):
         else:
             if child in self.children:
                 with transformation.state:
-                    child.transform(transformation)
+                    child.apply_transform(transformation)
                     point = transformation.point
                     child.pointer_event('release', pointer, *point, **kwargs)
             del self.dragging_children[pointer][button]
@@ -527,7 +1061,8 @@ class Layer(GraphicsObject):
     def on_pointer_scroll(self, *args, **kwargs):
         # handled from motion
         transformation = kwargs['transformation']
-        generator = self._hit_test_generator(self.children, transformation)
+        generator = self._hit_test_generator(
+            self._hit_test_candidates(transformation), transformation)
         for child, point, hit in generator:
             if hit:
                 ret = child.pointer_event('scroll', *args, **kwargs)
@@ -559,6 +1094,49 @@ class DecorationLayer(Layer):
         pass
 
 
+class TintLayer(Layer):
+    """A Layer that colorizes and fades its children without offscreen passes
+
+    Instead of rendering the children to a texture, like
+    :class:`~gillcup_graphics.EffectLayer` does, the layer's ``color`` and
+    ``opacity`` are passed down the tree in the ``tint`` draw argument, and
+    multiplied into the color and opacity of each
+    :class:`~gillcup_graphics.Rectangle`, :class:`~gillcup_graphics.Sprite`
+    and :class:`~gillcup_graphics.Text` (and into any enclosing TintLayer's
+    tint).
+
+    This is much cheaper than an EffectLayer, and gives the same result as
+    long as the translucent children don't overlap each other. Where they
+    do, the children underneath show through.
+
+    Init arguments are the same as for :class:`~gillcup_graphics.Layer`.
+    """
+    color = red, green, blue = color_property
+    opacity = opacity_property
+
+    def draw(self, transformation, **kwargs):
+        kwargs['tint'] = tinted_color(
+            self.color, self.opacity, kwargs.get('tint'))
+        super(TintLayer, self).draw(transformation=transformation, **kwargs)
+
+    def draw_parameters(self):
+        return super(TintLayer, self).draw_parameters() + (
+            self.color, self.opacity)
+
+
+def tinted_color(color, opacity, tint=None):
+    """Return an RGBA tuple for the given color and opacity, with tint applied
+
+    :param tint: An RGBA multiplier, as passed down by
+        :class:`~gillcup_graphics.TintLayer` in the ``tint`` draw argument,
+        or None.
+    """
+    rgba = tuple(color) + (opacity, )
+    if tint is None:
+        return rgba
+    return tuple(a * b for a, b in zip(rgba, tint))
+
+
 class Rectangle(GraphicsObject):
     """A box of color"""
 
@@ -567,18 +1145,87 @@ class Rectangle(GraphicsObject):
 
     vertices = (gl.GLfloat * 8)(0, 0, 1, 0, 0, 1, 1, 1)
 
-    def draw(self, transformation, **kwargs):
+    def draw(self, transformation, tint=None, **kwargs):
         transformation.scale(self.width, self.height, 1)
-        color = self.color + (self.opacity, )
-        gl.glColor4fv((gl.GLfloat * 4)(*color))
-        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
-        gl.glVertexPointer(2, gl.GL_FLOAT, 0, self.vertices)
+        transformation.load()
+        color = tinted_color(self.color, self.opacity, tint)
+        default_tracker.color(*color)
+        default_tracker.enable_client_state(gl.GL_VERTEX_ARRAY)
+        default_tracker.vertex_pointer(2, gl.GL_FLOAT, self.vertices)
         gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
 
+    def draw_parameters(self):
+        """Return the values the appearance of this rectangle depends on"""
+        return super(Rectangle, self).draw_parameters() + (
+            self.size, self.color, self.opacity)
+
     def hit_test(self, x, y, _z):
         """Perform a hit test on the rectangle"""
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def bounds(self):
+        """Return the rectangle's bounding box: (0, 0, width, height)"""
+        return (0, 0) + self.size
+
+    def hit_bounds(self):
+        """Return the area where hit_test can succeed: same as bounds"""
+        return (0, 0) + self.size
+
+
+def _draws_like(obj, cls):
+    """Return true if obj uses the draw method of cls (not an override)"""
+    return type(obj).draw.__func__ is cls.draw.__func__
+
+
+class _RectangleBatch(object):
+    """Accumulates Rectangles to be drawn by a single glDrawArrays call
+
+    Vertices are stored already transformed (in the space of the batched
+    Layer), as two triangles per rectangle, with per-vertex colors.
+    """
+    def __init__(self):
+        self.vertices = []
+        self.colors = []
+
+    def add(self, rectangle, matrix, tint=None):
+        """Add a rectangle transformed by the given matrix to the batch"""
+        (m0, m1, m2, _m3,
+         m4, m5, m6, _m7,
+         _m8, _m9, _m10, _m11,
+         m12, m13, m14, _m15,
+        ) = matrix.matrix
+        width, height = rectangle.size
+        corners = [(x * m0 + y * m4 + m12, x * m1 + y * m5 + m13,
+                x * m2 + y * m6 + m14)
+            for x, y in ((0, 0), (width, 0), (0, height), (width, height))]
+        bottom_left, bottom_right, top_left, top_right = corners
+        for vertex in (bottom_left, bottom_right, top_left,
+                top_left, bottom_right, top_right):
+            self.vertices.extend(vertex)
+        self.colors.extend(
+            tinted_color(rectangle.color, rectangle.opacity, tint) * 6)
+
+    def flush(self, transformation):
+        """Draw everything accumulated so far, and empty the batch
+
+        :param transformation: The transformation of the batched layer
+        """
+        if not self.vertices:
+            return
+        transformation.load()
+        vertices = (gl.GLfloat * len(self.vertices))(*self.vertices)
+        colors = (gl.GLfloat * len(self.colors))(*self.colors)
+        default_tracker.enable_client_state(gl.GL_VERTEX_ARRAY)
+        default_tracker.enable_client_state(gl.GL_COLOR_ARRAY)
+        default_tracker.vertex_pointer(3, gl.GL_FLOAT, vertices)
+        gl.glColorPointer(4, gl.GL_FLOAT, 0, colors)
+        gl.glDrawArrays(gl.GL_TRIANGLES, 0, len(self.vertices) // 3)
+        default_tracker.disable_client_state(gl.GL_COLOR_ARRAY)
+        # Drawing with a color array leaves the current color undefined
+        default_tracker.invalidate('color')
+        self.vertices = []
+        self.colors = []
+
 
 class Sprite(GraphicsObject):
     """An image
@@ -598,15 +1245,23 @@ class Sprite(GraphicsObject):
         kwargs.setdefault('size', (self.sprite.width, self.sprite.height))
         super(Sprite, self).__init__(parent, **kwargs)
 
-    def draw(self, **kwargs):
-        self.sprite.opacity = self.opacity * 255
-        self.sprite.color = tuple(int(c * 255) for c in self.color)
-        gl.glScalef(
+    def draw(self, transformation, tint=None, **kwargs):
+        color = tinted_color(self.color, self.opacity, tint)
+        self.sprite.opacity = color[3] * 255
+        self.sprite.color = tuple(int(c * 255) for c in color[:3])
+        transformation.scale(
                 self.width / self.sprite.width,
                 self.height / self.sprite.height,
                 1,
             )
+        transformation.load()
         self.sprite.draw()
+        default_tracker.invalidate()
+
+    def draw_parameters(self):
+        """Return the values the appearance of this sprite depends on"""
+        return super(Sprite, self).draw_parameters() + (
+            self.size, self.color, self.opacity)
 
     def hit_test(self, x, y, _z):
         """Perform a hit test on this object. Uses the sprite size.
@@ -614,6 +1269,14 @@ class Sprite(GraphicsObject):
         Does not take e.g. alpha into account"""
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def bounds(self):
+        """Return the sprite's bounding box: (0, 0, width, height)"""
+        return (0, 0) + self.size
+
+    def hit_bounds(self):
+        """Return the area where hit_test can succeed: same as bounds"""
+        return (0, 0) + self.size
+
 
 def sanitize_text(string):
     """Sanitize a string for use in a name"""
@@ -643,6 +1306,7 @@ class Text(GraphicsObject):
         The API regarding font size is experimental.
     """
     interesting_attribute_names = ['size']
+    geometry_tracked = False
 
     def __init__(self, parent, text, font_name=None, **kwargs):
         super(Text, self).__init__(parent, **kwargs)
@@ -656,9 +1320,9 @@ class Text(GraphicsObject):
 
     color = red, green, blue = color_property
     opacity = opacity_property
-    font_size = gillcup.AnimatedProperty(72,
+    font_size = framecache.AnimatedProperty(72,
         docstring="The size of the font")
-    characters_displayed = gillcup.AnimatedProperty(sys.maxint,
+    characters_displayed = framecache.AnimatedProperty(sys.maxint,
         docstring="The maximum number of characters displayed")
 
     @property
@@ -679,16 +1343,25 @@ class Text(GraphicsObject):
         if self.label.font_size != self.font_size:
             self.label.font_size = self.font_size
 
-    def draw(self, **kwargs):
+    def draw(self, transformation, tint=None, **kwargs):
         self.setup()
+        transformation.load()
         label = self.label
-        color = [int(a * 255) for a in self.color + (self.opacity, )]
+        color = [int(a * 255)
+            for a in tinted_color(self.color, self.opacity, tint)]
         if label.color != color:
             label.color = color
         displayed_text = self.text[:int(self.characters_displayed)]
         if label.text != displayed_text:
             label.text = displayed_text
         label.draw()
+        default_tracker.invalidate()
+
+    def draw_parameters(self):
+        """Return the values the appearance of this label depends on"""
+        return super(Text, self).draw_parameters() + (
+            self.text, self.font_name, self.font_size,
+            int(self.characters_displayed), self.color, self.opacity)
 
     @property
     def name(self):
@@ -738,3 +1411,17 @@ class Text(GraphicsObject):
     def hit_test(self, x, y, _z):
         """Perform a hit test on this object. Uses the bounding rectangle."""
         return 0 <= x < self.width and 0 <= y < self.height
+
+    def hit_bounds(self):
+        """Return the area where hit_test can succeed: (0, 0, width, height)
+        """
+        return (0, 0) + self.size
+
+    def bounds(self):
+        """Return the extents of the label
+
+        The text is drawn from its baseline, so descenders reach below y=0.
+        """
+        width, height = self.size
+        top = _font_ascent(self.font_name, self.font_size)
+        return 0, top - height, width, top
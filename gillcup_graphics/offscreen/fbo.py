@@ -7,16 +7,31 @@ import contextlib
 import pyglet
 from pyglet import gl
 
+from gillcup_graphics.glstate import default_tracker
+from gillcup_graphics.offscreen import rendertargets
+
+try:
+    import numpy  # pylint: disable=F0401
+except ImportError:  # pragma: no cover
+    numpy = None
+
 
 class _FakeTopFBO(object):
     framebuffer_id = depthbuffer_id = texture_id = ctypes.c_uint(0)
 
 
 class FBO(object):
-    """Stackable helper for using Frame Buffer Objects (FBOs)"""
+    """Stackable helper for using Frame Buffer Objects (FBOs)
+
+    Each FBO is tracked by the
+    :class:`~gillcup_graphics.offscreen.rendertargets.RenderTargetManager`
+    given by the ``manager`` class attribute, unless it is None.
+    """
 
     _bind_stack = [_FakeTopFBO()]
     data = None
+    array_buffer = None
+    manager = rendertargets.default_manager
 
     @staticmethod
     def supported():
@@ -25,14 +40,22 @@ class FBO(object):
                 gl.gl_info.have_extension("GL_EXT_framebuffer_object") and
                 gl.gl_info.have_extension("GL_ARB_draw_buffers"))
 
-    def __init__(self, width, height):
-        """Creates a FBO"""
+    def __init__(self, width, height, texture_width=None,
+            texture_height=None):
+        """Creates a FBO
+
+        The texture is allocated with the given texture size (by default,
+        the same as ``width`` and ``height``). Only the lower left
+        ``width`` by ``height`` area of it is drawn to and read.
+        """
         self.initialized = False
 
         assert self.supported()
 
         self.width = width
         self.height = height
+        self.texture_width = texture_width or width
+        self.texture_height = texture_height or height
 
         self.framebuffer_id = ctypes.c_uint(0)
         self.depthbuffer_id = ctypes.c_uint(0)
@@ -59,7 +82,7 @@ class FBO(object):
             gl.glRenderbufferStorageEXT(
                     gl.GL_RENDERBUFFER_EXT,  # target
                     gl.GL_DEPTH_COMPONENT,  # internal format
-                    self.width, self.height,  # size
+                    self.texture_width, self.texture_height,  # size
                 )
             gl.glFramebufferRenderbufferEXT(
                     gl.GL_FRAMEBUFFER_EXT,  # target
@@ -73,19 +96,19 @@ class FBO(object):
                     1,  # no. of textures
                     ctypes.byref(self.texture_id),  # dest. id
                 )
-            gl.glBindTexture(
+            default_tracker.bind_texture(
                     gl.GL_TEXTURE_2D,  # target
                     self.texture_id,  # texture id
                 )
 
             # Black magic (props to pyprocessing!)
             # (nearest works, as well as linear)
-            gl.glTexParameteri(
+            default_tracker.tex_parameter(
                     gl.GL_TEXTURE_2D,  # target
                     gl.GL_TEXTURE_MAG_FILTER,  # property name
                     gl.GL_LINEAR,  # value
                 )
-            gl.glTexParameteri(
+            default_tracker.tex_parameter(
                     gl.GL_TEXTURE_2D,  # target
                     gl.GL_TEXTURE_MIN_FILTER,  # property name
                     gl.GL_LINEAR,  # value
@@ -96,7 +119,7 @@ class FBO(object):
                     gl.GL_TEXTURE_2D,  # target
                     0,  # mipmap level (0=default)
                     gl.GL_RGBA8,  # internal format
-                    self.width, self.height,  # size
+                    self.texture_width, self.texture_height,  # size
                     0,  # border
                     gl.GL_RGBA,  # format
                     gl.GL_UNSIGNED_BYTE,  # type
@@ -114,6 +137,9 @@ class FBO(object):
             status = gl.glCheckFramebufferStatusEXT(gl.GL_FRAMEBUFFER_EXT)
             assert status == gl.GL_FRAMEBUFFER_COMPLETE_EXT
 
+        if self.manager:
+            self.manager.register(self)
+
     @contextlib.contextmanager
     def _bound_context(self, target):
         """Nestable context for glBindFramebufferEXT with given target
@@ -134,22 +160,32 @@ class FBO(object):
     @contextlib.contextmanager
     def bind_draw(self):
         """Context for drawing into the FBO"""
+        if self.manager:
+            self.manager.touch(self)
         with self._bound_context(gl.GL_FRAMEBUFFER_EXT) as parent_fb:
             # Set viewport to the size of the texture
             gl.glPushAttrib(gl.GL_VIEWPORT_BIT)
             try:
-                gl.glViewport(0, 0, self.width, self.height)
+                default_tracker.viewport(0, 0, self.width, self.height)
                 yield parent_fb
             finally:
                 # Restore old viewport!
                 gl.glPopAttrib()
+                default_tracker.invalidate('viewport')
+
+    @property
+    def nbytes(self):
+        """Approximate GPU memory used by the texture and depth buffer"""
+        return self.texture_width * self.texture_height * 8
 
     def get_image_data(self):
         """Return a pyglet image with the contents of the FBO."""
         # props to pyprocessing!
-        self.data = (ctypes.c_ubyte * (self.width * self.height * 4))()
+        texture_width = self.texture_width
+        texture_height = self.texture_height
+        self.data = (ctypes.c_ubyte * (texture_width * texture_height * 4))()
 
-        gl.glBindTexture(
+        default_tracker.bind_texture(
                 gl.GL_TEXTURE_2D,  # target
                 self.texture_id,  # texture id
             )
@@ -161,8 +197,63 @@ class FBO(object):
                 self.data,  # image data
             )
 
-        return pyglet.image.ImageData(self.width, self.height,
+        image = pyglet.image.ImageData(texture_width, texture_height,
                 'RGBA', self.data)
+        if (texture_width, texture_height) != (self.width, self.height):
+            image = image.get_region(0, 0, self.width, self.height)
+        return image
+
+    def array_shape(self, region=None):
+        """Return the shape of the array :meth:`get_array` fills
+
+        :param region: The region of interest, as for :meth:`get_array`
+        """
+        if region is None:
+            return self.height, self.width, 4
+        _x, _y, width, height = region
+        return height, width, 4
+
+    def get_array(self, out=None, region=None, flip=False):
+        """Read the FBO's contents into a NumPy array of RGBA bytes
+
+        Pixels are read straight into the array's memory, without
+        intermediate copies. Requires NumPy.
+
+        :param out: A C-contiguous ``uint8`` array of the shape given by
+            :meth:`array_shape`, to read into and return.
+            If None, an array owned by the FBO is reused between calls, so
+            its contents are overwritten by the next call.
+        :param region: The region of interest, as ``(x, y, width, height)``
+            in pixels from the lower left corner. Only this region is
+            read back. By default, the whole FBO is read.
+        :param flip: If true, rows are reordered in place so that the top
+            row comes first (as in most image formats). By default, the
+            bottom row comes first, as in OpenGL.
+        """
+        if numpy is None:
+            raise RuntimeError('FBO.get_array needs NumPy')
+        shape = self.array_shape(region)
+        if out is None:
+            out = self.array_buffer
+            if out is None or out.shape != shape:
+                out = self.array_buffer = numpy.empty(shape, numpy.uint8)
+        elif (out.shape != shape or out.dtype != numpy.uint8 or
+                not out.flags.c_contiguous):
+            raise ValueError('out must be a contiguous uint8 array of '
+                'shape {0}'.format(shape))
+        x, y = region[:2] if region else (0, 0)
+        height, width = shape[:2]
+        with self._bound_context(gl.GL_FRAMEBUFFER_EXT):
+            gl.glReadPixels(x, y, width, height, gl.GL_RGBA,
+                gl.GL_UNSIGNED_BYTE, out.ctypes.data)
+        if flip:
+            scratch = out[0].copy()
+            for top in range(height // 2):
+                bottom = height - 1 - top
+                scratch[...] = out[top]
+                out[top] = out[bottom]
+                out[bottom] = scratch
+        return out
 
     def destroy(self):
         """Free memory"""
@@ -173,7 +264,11 @@ class FBO(object):
             if self.depthbuffer_id:
                 gl.glDeleteRenderbuffersEXT(1, byref(self.depthbuffer_id))
             if self.texture_id:
+                default_tracker.forget_texture(self.texture_id)
                 gl.glDeleteTextures(1, byref(self.texture_id))
+            if self.manager:
+                self.manager.unregister(self)
+        self.array_buffer = None
         self.initialized = False
 
     def __del__(self):
@@ -0,0 +1,105 @@
+"""A shared pool of offscreen render targets
+
+Allocating a framebuffer object means allocating a texture and a depth
+buffer, which is expensive. Objects that render offscreen every frame, like
+:class:`~gillcup_graphics.EffectLayer`, should take render targets from a
+:class:`FBOPool` and give them back after use instead of creating their own.
+
+Idle render targets in a pool can also be evicted by the render target
+manager (see :mod:`gillcup_graphics.offscreen.rendertargets`) when the
+global memory limit is reached.
+
+Render targets are handed out by size bucket: the requested size is rounded
+up, so a slightly different size (for example, during an animation of
+``mosaic``, or after the window is resized by a few pixels) reuses an
+existing target.
+"""
+
+from __future__ import division
+
+from gillcup_graphics.offscreen import fbo
+
+
+class FBOPool(object):
+    """Hands out :class:`~gillcup_graphics.offscreen.fbo.FBO` objects
+
+    :param budget: The maximum number of bytes the pool keeps allocated.
+        When it is exceeded, idle render targets are destroyed, least
+        recently used first.
+        Targets that are in use are never destroyed, so the budget may be
+        exceeded temporarily.
+    :param granularity: The texture width and height are rounded up to a
+        multiple of this number.
+    :param factory: Callable used to create new render targets; it is
+        called with the requested width and height, and the bucket's
+        ``texture_width`` and ``texture_height`` as keyword arguments.
+    """
+    def __init__(self, budget=64 * 2 ** 20, granularity=64,
+            factory=fbo.FBO):
+        self.budget = budget
+        self.granularity = granularity
+        self.factory = factory
+        self.idle = []
+        self.in_use = {}
+        self.allocated_bytes = 0
+
+    def bucket(self, width, height):
+        """Return the texture size used for the given requested size"""
+        granularity = self.granularity
+        return (-(-width // granularity) * granularity,
+            -(-height // granularity) * granularity)
+
+    def acquire(self, width, height):
+        """Get a render target of (at least) the given size
+
+        The returned FBO's ``width`` and ``height`` are set to the requested
+        size; its texture may be larger.
+        Give it back with :meth:`release` when done.
+        """
+        texture_size = self.bucket(width, height)
+        for i, framebuffer in enumerate(reversed(self.idle)):
+            if (framebuffer.texture_width,
+                    framebuffer.texture_height) == texture_size:
+                del self.idle[-1 - i]
+                if framebuffer.manager:
+                    framebuffer.manager.set_evictable(framebuffer, None)
+                break
+        else:
+            texture_width, texture_height = texture_size
+            framebuffer = self.factory(width, height,
+                texture_width=texture_width, texture_height=texture_height)
+            self.allocated_bytes += framebuffer.nbytes
+        framebuffer.width = width
+        framebuffer.height = height
+        self.in_use[id(framebuffer)] = framebuffer
+        self.evict()
+        return framebuffer
+
+    def release(self, framebuffer):
+        """Return a render target obtained from :meth:`acquire` to the pool
+        """
+        del self.in_use[id(framebuffer)]
+        self.idle.append(framebuffer)
+        self.evict()
+        if framebuffer.manager and framebuffer in self.idle:
+            framebuffer.manager.set_evictable(framebuffer, self._evict_idle)
+
+    def _evict_idle(self, framebuffer):
+        """Destroy the given idle render target"""
+        self.idle.remove(framebuffer)
+        self.allocated_bytes -= framebuffer.nbytes
+        framebuffer.destroy()
+
+    def evict(self, budget=None):
+        """Destroy idle render targets until the pool fits in the budget
+
+        :param budget: Use this budget instead of the pool's ``budget``.
+            For example, ``evict(0)`` frees all idle targets.
+        """
+        if budget is None:
+            budget = self.budget
+        while self.idle and self.allocated_bytes > budget:
+            self._evict_idle(self.idle[0])
+
+
+default_pool = FBOPool()
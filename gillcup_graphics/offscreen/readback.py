@@ -0,0 +1,140 @@
+"""Asynchronous readback of offscreen render targets
+
+Reading pixels back from the GPU with ``glGetTexImage`` (as
+:meth:`~gillcup_graphics.offscreen.fbo.FBO.get_image_data` does) makes the
+CPU wait until all drawing is finished and the pixels are copied.
+When recording every frame, that stall limits the frame rate.
+
+:class:`AsyncReadback` instead starts the copy into one of several rotating
+pixel buffer objects (PBOs), and maps the buffer a few frames later, when the
+copy is (most likely) done. Frames are delivered in order, with a latency of
+``buffer_count - 1`` frames.
+
+Pixel buffer objects need the ``GL_ARB_pixel_buffer_object`` extension.
+Without it, frames are read back synchronously and delivered immediately.
+"""
+
+import collections
+import ctypes
+
+import pyglet
+from pyglet import gl
+
+
+def supported():
+    """Check that pixel buffer objects are supported"""
+    return gl.gl_info.have_extension("GL_ARB_pixel_buffer_object")
+
+
+class AsyncReadback(object):
+    """Reads back frames through rotating pixel buffer objects
+
+    :param buffer_count: The number of pixel buffers to use. A frame is
+        delivered when ``buffer_count - 1`` newer frames have been started,
+        so 2 or 3 buffers usually hide the transfer completely.
+    :param callback: Called as ``callback(image, tag)`` with each frame,
+        where ``image`` is a pyglet ImageData and ``tag`` is the value given
+        to :meth:`start`.
+        If it is None, ``(image, tag)`` pairs are appended to the ``frames``
+        deque instead; pop them from the left.
+
+    Call :meth:`flush` after the last frame to get the remaining frames,
+    and :meth:`destroy` to free the buffers.
+
+    If a pixel buffer can't be mapped, the frame is dropped and
+    RuntimeError is raised from the method that was delivering it; the
+    other pending frames are kept.
+    """
+    def __init__(self, buffer_count=3, callback=None):
+        if buffer_count < 1:
+            raise ValueError('buffer_count must be at least 1')
+        self.buffer_count = buffer_count
+        self.callback = callback
+        self.frames = collections.deque()
+        self.buffer_ids = None
+        self.buffer_sizes = [0] * buffer_count
+        self.next_buffer = 0
+        self.pending = collections.deque()
+
+    def _init_buffers(self):
+        """Create the pixel buffer objects"""
+        self.buffer_ids = (gl.GLuint * self.buffer_count)()
+        gl.glGenBuffers(self.buffer_count, self.buffer_ids)
+
+    def start(self, framebuffer, tag=None):
+        """Start reading back the contents of the given FBO
+
+        Afterwards, if all buffers are pending, the oldest frame is
+        delivered.
+        """
+        if not supported():
+            self._deliver(framebuffer.get_image_data(), tag)
+            return
+        if self.buffer_ids is None:
+            self._init_buffers()
+        index = self.next_buffer
+        self.next_buffer = (index + 1) % self.buffer_count
+        width, height = framebuffer.width, framebuffer.height
+        size = width * height * 4
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER_ARB, self.buffer_ids[index])
+        try:
+            if self.buffer_sizes[index] != size:
+                gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER_ARB, size, None,
+                    gl.GL_STREAM_READ)
+                self.buffer_sizes[index] = size
+            with framebuffer.bind_draw():
+                gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+                # With a pack buffer bound, the last argument is an offset
+                # into the buffer, and the call returns without waiting
+                gl.glReadPixels(0, 0, width, height, gl.GL_RGBA,
+                    gl.GL_UNSIGNED_BYTE, None)
+        finally:
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER_ARB, 0)
+        self.pending.append((index, width, height, tag))
+        self.poll()
+
+    def poll(self):
+        """Deliver frames that have had time to finish reading back"""
+        while len(self.pending) >= self.buffer_count:
+            self._collect_oldest()
+
+    def flush(self):
+        """Deliver all pending frames, waiting for the GPU if necessary"""
+        while self.pending:
+            self._collect_oldest()
+
+    def _collect_oldest(self):
+        """Map the oldest pending buffer and deliver its contents"""
+        index, width, height, tag = self.pending.popleft()
+        size = width * height * 4
+        data = (ctypes.c_ubyte * size)()
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER_ARB, self.buffer_ids[index])
+        try:
+            pointer = gl.glMapBuffer(gl.GL_PIXEL_PACK_BUFFER_ARB,
+                gl.GL_READ_ONLY)
+            if not pointer:
+                raise RuntimeError('Could not map pixel buffer for frame '
+                    '{0!r}; the frame is dropped'.format(tag))
+            try:
+                ctypes.memmove(data, pointer, size)
+            finally:
+                gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER_ARB)
+        finally:
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER_ARB, 0)
+        self._deliver(pyglet.image.ImageData(width, height, 'RGBA', data),
+            tag)
+
+    def _deliver(self, image, tag):
+        """Pass a finished frame to the callback or the queue"""
+        if self.callback:
+            self.callback(image, tag)
+        else:
+            self.frames.append((image, tag))
+
+    def destroy(self):
+        """Free the pixel buffers; pending frames are dropped"""
+        if self.buffer_ids is not None:
+            gl.glDeleteBuffers(self.buffer_count, self.buffer_ids)
+            self.buffer_ids = None
+            self.buffer_sizes = [0] * self.buffer_count
+        self.pending.clear()
@@ -0,0 +1,109 @@
+"""Accounting for the memory used by offscreen render targets
+
+Every :class:`~gillcup_graphics.offscreen.fbo.FBO` registers itself with a
+:class:`RenderTargetManager` (by default, :data:`default_manager`), which
+keeps track of the memory they use and can enforce a limit on it.
+
+To monitor render target memory, look at the manager's
+``allocated_bytes`` and ``peak_bytes`` attributes. To cap it, set
+``limit``::
+
+    from gillcup_graphics.offscreen import rendertargets
+    rendertargets.default_manager.limit = 128 * 2 ** 20
+
+Only targets that are marked as evictable (for example, idle targets in an
+:class:`~gillcup_graphics.offscreen.pool.FBOPool`) are freed to meet the
+limit; the least recently used ones go first.
+Targets that are in use are never evicted, so the limit can be exceeded if
+they alone don't fit in it.
+"""
+
+from __future__ import division
+
+import itertools
+import weakref
+
+
+class RenderTargetManager(object):
+    """Tracks memory used by render targets, and enforces a limit on it
+
+    :param limit: The maximum number of bytes to keep allocated, or None
+        for no limit.
+
+    Render targets need to have an ``nbytes`` attribute that stays the same
+    while they're registered.
+    """
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.allocated_bytes = 0
+        self.peak_bytes = 0
+        self._targets = {}
+        self._clock = itertools.count()
+
+    def register(self, target):
+        """Start tracking a newly allocated render target
+
+        May evict other targets to make room for it.
+        """
+        self._targets[id(target)] = [
+            weakref.ref(target), target.nbytes, next(self._clock), None]
+        self.allocated_bytes += target.nbytes
+        self.peak_bytes = max(self.peak_bytes, self.allocated_bytes)
+        self.enforce_limit()
+
+    def unregister(self, target):
+        """Stop tracking a render target that was freed"""
+        try:
+            _ref, nbytes, _last_use, _evict = self._targets.pop(id(target))
+        except KeyError:
+            return
+        self.allocated_bytes -= nbytes
+
+    def touch(self, target):
+        """Mark a render target as just used"""
+        entry = self._targets.get(id(target))
+        if entry:
+            entry[2] = next(self._clock)
+
+    def set_evictable(self, target, evict):
+        """Mark a render target as evictable, or not
+
+        :param evict: A function that frees the target when called with it as
+            the only argument, or None if the target is in use and may not be
+            evicted.
+            The function must unregister the target, usually by calling its
+            ``destroy`` method.
+        """
+        entry = self._targets.get(id(target))
+        if entry:
+            entry[3] = evict
+            if evict:
+                self.enforce_limit()
+
+    def enforce_limit(self):
+        """Evict least recently used targets until the limit is satisfied"""
+        limit = self.limit
+        if limit is None or self.allocated_bytes <= limit:
+            return
+        candidates = sorted(
+            (last_use, ref, evict)
+            for ref, _nbytes, last_use, evict in self._targets.values()
+            if evict)
+        for _last_use, ref, evict in candidates:
+            if self.allocated_bytes <= limit:
+                break
+            target = ref()
+            if target is not None:
+                evict(target)
+
+    def reset_peak(self):
+        """Start measuring ``peak_bytes`` anew from the current usage"""
+        self.peak_bytes = self.allocated_bytes
+
+    @property
+    def target_count(self):
+        """The number of render targets currently allocated"""
+        return len(self._targets)
+
+
+default_manager = RenderTargetManager()
@@ -0,0 +1,144 @@
+"""GLSL shader programs
+
+Shaders need OpenGL 2.0.
+Programs are compiled on first use and cached (see :func:`get_program`), so
+asking for the same program every frame is cheap.
+"""
+
+import ctypes
+
+from pyglet import gl
+
+
+class ShaderError(Exception):
+    """Raised when a shader fails to compile or link"""
+
+
+def supported():
+    """Check that GLSL shaders are supported"""
+    return gl.gl_info.have_version(2, 0)
+
+
+def _compile_shader(shader_type, source):
+    """Compile a shader of the given type; return its id"""
+    shader = gl.glCreateShader(shader_type)
+    source_buffer = ctypes.create_string_buffer(source.encode('ascii'))
+    source_pointer = ctypes.cast(source_buffer, ctypes.POINTER(ctypes.c_char))
+    gl.glShaderSource(shader, 1, ctypes.byref(source_pointer), None)
+    gl.glCompileShader(shader)
+    status = ctypes.c_int(0)
+    gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS, ctypes.byref(status))
+    if not status.value:
+        log = _get_log(shader, gl.glGetShaderiv, gl.glGetShaderInfoLog)
+        gl.glDeleteShader(shader)
+        raise ShaderError('Shader compilation failed:\n' + log)
+    return shader
+
+
+def _get_log(object_id, get_parameter, get_log):
+    """Retrieve the info log of a shader or program"""
+    length = ctypes.c_int(0)
+    get_parameter(object_id, gl.GL_INFO_LOG_LENGTH, ctypes.byref(length))
+    buf = ctypes.create_string_buffer(max(1, length.value))
+    get_log(object_id, len(buf), None, buf)
+    return buf.value.decode('ascii', 'replace')
+
+
+class ShaderProgram(object):
+    """A linked GLSL program
+
+    :param vertex_source: Source code of the vertex shader
+    :param fragment_source: Source code of the fragment shader
+
+    Raises :class:`ShaderError` if the program can't be built.
+    """
+    def __init__(self, vertex_source, fragment_source):
+        self.program_id = 0
+        self.uniform_locations = {}
+        shaders = [
+            _compile_shader(gl.GL_VERTEX_SHADER, vertex_source),
+            _compile_shader(gl.GL_FRAGMENT_SHADER, fragment_source)]
+        program = gl.glCreateProgram()
+        for shader in shaders:
+            gl.glAttachShader(program, shader)
+        gl.glLinkProgram(program)
+        for shader in shaders:
+            # The shaders are only really deleted with the program
+            gl.glDeleteShader(shader)
+        status = ctypes.c_int(0)
+        gl.glGetProgramiv(program, gl.GL_LINK_STATUS, ctypes.byref(status))
+        if not status.value:
+            log = _get_log(program, gl.glGetProgramiv, gl.glGetProgramInfoLog)
+            gl.glDeleteProgram(program)
+            raise ShaderError('Shader linking failed:\n' + log)
+        self.program_id = program
+
+    def uniform_location(self, name):
+        """Return the location of the named uniform variable"""
+        try:
+            return self.uniform_locations[name]
+        except KeyError:
+            location = gl.glGetUniformLocation(self.program_id,
+                ctypes.create_string_buffer(name.encode('ascii')))
+            self.uniform_locations[name] = location
+            return location
+
+    def set_uniform(self, name, *values):
+        """Set a float uniform (or vector of 1 to 4 floats) to given values
+
+        The program must be in use.
+        """
+        setter = (gl.glUniform1f, gl.glUniform2f, gl.glUniform3f,
+            gl.glUniform4f)[len(values) - 1]
+        setter(self.uniform_location(name), *values)
+
+    def set_uniform_int(self, name, value):
+        """Set an integer (or sampler) uniform
+
+        The program must be in use.
+        """
+        gl.glUniform1i(self.uniform_location(name), value)
+
+    def use(self):
+        """Start using this program for drawing"""
+        gl.glUseProgram(self.program_id)
+
+    @staticmethod
+    def stop_using():
+        """Go back to the fixed-function pipeline"""
+        gl.glUseProgram(0)
+
+    def destroy(self):
+        """Free the program"""
+        if self.program_id:
+            gl.glDeleteProgram(self.program_id)
+            self.program_id = 0
+
+
+_program_cache = {}
+
+
+def get_program(vertex_source, fragment_source):
+    """Return a cached :class:`ShaderProgram` for the given sources
+
+    Returns None if shaders are not supported, or if the program failed to
+    build (the error is only raised the first time).
+    """
+    key = vertex_source, fragment_source
+    try:
+        return _program_cache[key]
+    except KeyError:
+        _program_cache[key] = None
+        if not supported():
+            return None
+        program = ShaderProgram(vertex_source, fragment_source)
+        _program_cache[key] = program
+        return program
+
+
+def clear_cache():
+    """Destroy all cached programs"""
+    for program in _program_cache.values():
+        if program:
+            program.destroy()
+    _program_cache.clear()
@@ -0,0 +1,273 @@
+"""Profiling of the time spent drawing each object
+
+When a :class:`Profiler` is enabled, it is registered as a
+:class:`~gillcup_graphics.objects.DrawHook`, so
+:meth:`GraphicsObject.do_draw <gillcup_graphics.GraphicsObject.do_draw>`
+reports to it when drawing of each object starts and ends. The profiler
+records the time spent on each draw, both inclusive (with the object's
+children) and exclusive (without them), per object and per class::
+
+    profiler = Profiler()
+    profiler.enable()
+    ...  # let some frames be drawn
+    profiler.disable()
+    print profiler.report()
+    print profiler.stats_for(rectangle).exclusive.percentile(95)
+
+The times go into :class:`Histogram` objects, which give percentiles, so
+occasional slow frames show up instead of being averaged away.
+Several profilers (and other draw hooks, such as a
+:class:`~gillcup_graphics.tracing.Tracer`) can be enabled at once. When no
+hooks are registered, drawing only pays for looping over an empty tuple per
+object.
+
+Objects drawn as part of a batched :class:`~gillcup_graphics.Layer` are not
+drawn with ``do_draw``, so their time is counted in the layer's exclusive
+time.
+"""
+
+from __future__ import division
+
+import ctypes
+import ctypes.util
+import math
+import sys
+import time
+import weakref
+
+from gillcup_graphics.objects import DrawHook, GraphicsObject
+
+# The value of CLOCK_MONOTONIC for clock_gettime, by sys.platform prefix
+_clock_monotonic_ids = [('linux', 1), ('freebsd', 4)]
+
+
+def _make_monotonic_clock():
+    """Return a high-resolution monotonic clock function for this platform
+
+    Falls back to time.time if nothing better is available.
+    """
+    if hasattr(time, 'perf_counter'):
+        return time.perf_counter  # pylint: disable=E1101
+    if sys.platform.startswith('win'):
+        # On Windows, time.clock uses QueryPerformanceCounter
+        return time.clock
+    clock_monotonic = None
+    for prefix, clock_id in _clock_monotonic_ids:
+        if sys.platform.startswith(prefix):
+            clock_monotonic = clock_id
+    if clock_monotonic is None:
+        return time.time
+    try:
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1',
+            use_errno=True)
+        clock_gettime = librt.clock_gettime
+    except (OSError, AttributeError):
+        return time.time
+
+    class _Timespec(ctypes.Structure):
+        """struct timespec"""
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    timespec = _Timespec()
+    if clock_gettime(clock_monotonic, ctypes.byref(timespec)) != 0:
+        return time.time
+
+    timespec_pointer = ctypes.byref(timespec)
+
+    def _clock_gettime():
+        """Return the value of the monotonic clock, in seconds"""
+        clock_gettime(clock_monotonic, timespec_pointer)
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+    return _clock_gettime
+
+# Function returning the time in seconds, from a monotonic clock (if
+# available). Only differences between its values are meaningful.
+monotonic_clock = _make_monotonic_clock()
+
+
+class Histogram(object):
+    """A histogram of times, with logarithmically sized buckets
+
+    :param resolution: The ratio between the bounds of consecutive buckets.
+        Percentiles are accurate to about half of ``resolution - 1``
+        (the default gives 2.5%).
+    :param minimum: Values below this are put into the lowest bucket
+
+    The ``count``, ``total`` and ``maximum`` attributes hold the number,
+    sum and maximum of the added values.
+    """
+    def __init__(self, resolution=1.05, minimum=1e-7):
+        self.resolution = resolution
+        self.minimum = minimum
+        self._log_resolution = math.log(resolution)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def add(self, value):
+        """Add a value"""
+        if value > self.minimum:
+            index = int(math.log(value / self.minimum) /
+                self._log_resolution)
+        else:
+            index = 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self):
+        """The mean of the values, or None if there are none"""
+        if self.count:
+            return self.total / self.count
+        else:
+            return None
+
+    def percentile(self, percent):
+        """Return the given percentile (0-100) of the values
+
+        The result is the middle of the bucket the percentile falls into
+        (but at most the maximum). Returns None if there are no values.
+        """
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        indices = sorted(self.buckets)
+        found = indices[-1]
+        for index in indices:
+            seen += self.buckets[index]
+            if seen >= rank:
+                found = index
+                break
+        middle = self.minimum * self.resolution ** (found + 0.5)
+        return min(middle, self.maximum)
+
+
+class ProfileStats(object):
+    """Draw times of an object or class
+
+    .. attribute:: inclusive
+
+        :class:`Histogram` of times spent drawing, including children
+
+    .. attribute:: exclusive
+
+        :class:`Histogram` of times spent drawing, excluding children
+    """
+    def __init__(self):
+        self.inclusive = Histogram()
+        self.exclusive = Histogram()
+
+    @property
+    def count(self):
+        """The number of draws recorded"""
+        return self.inclusive.count
+
+    def add(self, inclusive, exclusive):
+        """Record a draw"""
+        self.inclusive.add(inclusive)
+        self.exclusive.add(exclusive)
+
+
+class Profiler(DrawHook):
+    """Records the draw times of graphics objects
+
+    :param clock: A function returning the current time in seconds; by
+        default, :func:`monotonic_clock`
+
+    .. attribute:: class_stats
+
+        Dict of :class:`ProfileStats` by class
+
+    .. attribute:: node_stats
+
+        Weak-key dict of :class:`ProfileStats` by object
+    """
+    def __init__(self, clock=monotonic_clock):
+        self.clock = clock
+        self.class_stats = {}
+        self.node_stats = weakref.WeakKeyDictionary()
+        self._stack = []
+
+    @property
+    def enabled(self):
+        """True if this profiler is receiving draw times"""
+        return self in GraphicsObject.draw_hooks
+
+    def enable(self):
+        """Start profiling"""
+        if not self.enabled:
+            self._stack = []
+            GraphicsObject.add_draw_hook(self)
+
+    def disable(self):
+        """Stop profiling"""
+        GraphicsObject.remove_draw_hook(self)
+
+    def reset(self):
+        """Forget all recorded times"""
+        self.class_stats = {}
+        self.node_stats = weakref.WeakKeyDictionary()
+        self._stack = []
+
+    def enter(self, obj):
+        """Note that drawing of an object starts (called by do_draw)"""
+        # Each stack entry is [start time, time spent in children]
+        self._stack.append([self.clock(), 0])
+
+    def exit(self, obj):
+        """Note that drawing of an object ended (called by do_draw)"""
+        end = self.clock()
+        try:
+            start, child_time = self._stack.pop()
+        except IndexError:
+            # Enabled in the middle of drawing
+            return
+        inclusive = end - start
+        if self._stack:
+            self._stack[-1][1] += inclusive
+        exclusive = inclusive - child_time
+        try:
+            node_stats = self.node_stats[obj]
+        except KeyError:
+            node_stats = self.node_stats[obj] = ProfileStats()
+        node_stats.add(inclusive, exclusive)
+        cls = type(obj)
+        try:
+            class_stats = self.class_stats[cls]
+        except KeyError:
+            class_stats = self.class_stats[cls] = ProfileStats()
+        class_stats.add(inclusive, exclusive)
+
+    def stats_for(self, obj):
+        """Return the :class:`ProfileStats` of an object, or None"""
+        return self.node_stats.get(obj)
+
+    def report(self, percentiles=(50, 95, 99)):
+        """Return a table of draw times per class, as a string
+
+        Classes are sorted by total exclusive time, largest first.
+        Times are in milliseconds.
+        """
+        header = ['class', 'draws', 'excl. total'] + [
+            'p{0} {1}'.format(p, kind)
+            for kind in ('incl.', 'excl.') for p in percentiles]
+        rows = [header]
+        items = sorted(self.class_stats.items(),
+            key=lambda item: -item[1].exclusive.total)
+        for cls, stats in items:
+            row = [cls.__name__, str(stats.count),
+                '{0:.3f}'.format(stats.exclusive.total * 1000)]
+            for histogram in stats.inclusive, stats.exclusive:
+                row.extend('{0:.3f}'.format(histogram.percentile(p) * 1000)
+                    for p in percentiles)
+            rows.append(row)
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return '\n'.join(
+            '  '.join([row[0].ljust(widths[0])] + [
+                cell.rjust(width) for cell, width in zip(row[1:], widths[1:])])
+            for row in rows)
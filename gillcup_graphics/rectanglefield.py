@@ -0,0 +1,230 @@
+# Encoding: UTF-8
+"""Large numbers of rectangles
+
+A :class:`RectangleField` draws many rectangles at once.
+Instead of being separate :class:`~gillcup_graphics.Rectangle` objects (each
+with its own animated properties), the rectangles are rows in NumPy arrays.
+This makes them much cheaper to create, draw and hit-test, at the cost of
+flexibility: the rectangles of a field can't have children, handle events
+individually, or be reordered.
+
+Whole columns can be animated at once::
+
+    field = RectangleField(layer, 1000)
+    clock.schedule(gillcup.Animation(field, 'opacities', numpy.zeros(1000),
+        time=2))
+
+.. note::
+
+    This module requires NumPy.
+"""
+
+from __future__ import division
+
+import math
+
+import gillcup
+from pyglet import gl
+
+from gillcup_graphics import framecache
+from gillcup_graphics.glstate import default_tracker
+from gillcup_graphics.objects import GraphicsObject
+
+try:
+    import numpy  # pylint: disable=F0401
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class ArrayProperty(framecache.AnimatedProperty):
+    """An animated property whose value is a NumPy array
+
+    Values assigned to the property, and animation targets, are converted
+    to arrays of floats.
+    Animations tween all elements of the array at once.
+
+    On objects with a ``count`` attribute, assigned values and animation
+    targets must have the shape given by :meth:`shape`, or be a single
+    number; otherwise ValueError is raised. An assigned number is used for
+    all elements.
+
+    :param fill: The initial value of each element
+    :param columns: The number of columns of the array. If None, the array is
+        one-dimensional.
+    :param docstring: The property's docstring
+    """
+    def __init__(self, fill, columns=None, docstring=None):
+        super(ArrayProperty, self).__init__(None, docstring=docstring)
+        self.fill = fill
+        self.columns = columns
+
+    def shape(self, count):
+        """Return the shape of the array for `count` items"""
+        if self.columns is None:
+            return count,
+        else:
+            return count, self.columns
+
+    def initial_value(self, count):
+        """Return an array suitable for `count` items"""
+        value = numpy.empty(self.shape(count))
+        value.fill(self.fill)
+        return value
+
+    def check_value(self, instance, value):
+        """Raise ValueError if value doesn't fit the instance's count"""
+        count = getattr(instance, 'count', None)
+        if count is None or not value.ndim:
+            return
+        shape = self.shape(count)
+        if value.shape != shape:
+            raise ValueError('Expected an array of shape {0}, got {1}'.format(
+                shape, value.shape))
+
+    def adjust_value(self, values):
+        """Convert an animation's target into an array"""
+        [value] = values
+        return numpy.asarray(value, dtype=float)
+
+    def animate(self, instance, animation):
+        if isinstance(animation, gillcup.Animation):
+            self.check_value(instance, numpy.asarray(animation.target))
+        return super(ArrayProperty, self).animate(instance, animation)
+
+    def __set__(self, instance, value):
+        value = numpy.asarray(value, dtype=float)
+        self.check_value(instance, value)
+        if not value.ndim and getattr(instance, 'count', None) is not None:
+            filled = numpy.empty(self.shape(instance.count))
+            filled.fill(value)
+            value = filled
+        super(ArrayProperty, self).__set__(instance, value)
+
+
+class RectangleField(GraphicsObject):
+    """Many rectangles, drawn and hit-tested together
+
+    :param parent: The parent :class:`~gillcup_graphics.Layer`
+    :param count: The number of rectangles
+
+    Other init arguments are the same as for
+    :class:`~gillcup_graphics.GraphicsObject`; the array properties can be
+    initialized this way as well.
+
+    The rectangles are drawn in the order of their indices.
+    Each rectangle is positioned by its lower left corner, and rotated
+    around it.
+    """
+    positions = ArrayProperty(0, 2,
+        docstring="""Positions of the rectangles, as a (count, 2) array""")
+    sizes = ArrayProperty(1, 2,
+        docstring="""Sizes of the rectangles, as a (count, 2) array""")
+    rotations = ArrayProperty(0,
+        docstring="""Rotations of the rectangles in degrees""")
+    colors = ArrayProperty(1, 3,
+        docstring="""Colors of the rectangles, as a (count, 3) array""")
+    opacities = ArrayProperty(1,
+        docstring="""Opacities of the rectangles""")
+
+    array_property_names = (
+        'positions', 'sizes', 'rotations', 'colors', 'opacities')
+    geometry_tracked = False
+
+    def __init__(self, parent, count, **kwargs):
+        if numpy is None:
+            raise RuntimeError('RectangleField needs NumPy')
+        self._count = count
+        for name in self.array_property_names:
+            prop = getattr(type(self), name)
+            setattr(self, name, prop.initial_value(count))
+        super(RectangleField, self).__init__(parent, **kwargs)
+
+    @property
+    def count(self):
+        """The number of rectangles in the field
+
+        It is fixed when the field is created. All the array properties
+        must have this many rows.
+        """
+        return self._count
+
+    def corners(self):
+        """Return corners of all the rectangles in local coordinates
+
+        The result is a (count, 4, 2) array. The corners of each rectangle
+        are in order: lower left, lower right, upper left, upper right.
+        """
+        positions = self.positions
+        sizes = self.sizes
+        angles = self.rotations * (math.pi / 180)
+        cos = numpy.cos(angles)[:, None]
+        sin = numpy.sin(angles)[:, None]
+        xs = numpy.array([0, 1, 0, 1]) * sizes[:, 0:1]
+        ys = numpy.array([0, 0, 1, 1]) * sizes[:, 1:2]
+        result = numpy.empty((len(positions), 4, 2))
+        result[:, :, 0] = xs * cos - ys * sin + positions[:, 0:1]
+        result[:, :, 1] = xs * sin + ys * cos + positions[:, 1:2]
+        return result
+
+    def draw(self, transformation, tint=None, **kwargs):
+        count = self.count
+        if not count:
+            return
+        transformation.load()
+        triangles = self.corners()[:, [0, 1, 2, 2, 1, 3]]
+        vertices = numpy.ascontiguousarray(triangles, dtype=numpy.float32)
+        colors = numpy.empty((count, 6, 4), dtype=numpy.float32)
+        colors[:, :, :3] = self.colors[:, None, :]
+        colors[:, :, 3] = self.opacities[:, None]
+        if tint is not None:
+            colors *= numpy.array(tint, dtype=numpy.float32)
+        default_tracker.enable_client_state(gl.GL_VERTEX_ARRAY)
+        default_tracker.enable_client_state(gl.GL_COLOR_ARRAY)
+        default_tracker.vertex_pointer(2, gl.GL_FLOAT, vertices.ctypes.data)
+        gl.glColorPointer(4, gl.GL_FLOAT, 0, colors.ctypes.data)
+        gl.glDrawArrays(gl.GL_TRIANGLES, 0, count * 6)
+        default_tracker.disable_client_state(gl.GL_COLOR_ARRAY)
+        # Drawing with a color array leaves the current color undefined
+        default_tracker.invalidate('color')
+
+    def draw_parameters(self):
+        """Return the values the appearance of the field depends on"""
+        return super(RectangleField, self).draw_parameters() + tuple(
+            getattr(self, name).tobytes()
+            for name in self.array_property_names)
+
+    def hit_test_indices(self, x, y):
+        """Return indices of rectangles that contain the given point
+
+        The point is in the field's local coordinates.
+        Returns an array of indices, topmost (last drawn) rectangle first.
+        """
+        positions = self.positions
+        sizes = self.sizes
+        angles = self.rotations * (math.pi / 180)
+        cos = numpy.cos(angles)
+        sin = numpy.sin(angles)
+        dx = x - positions[:, 0]
+        dy = y - positions[:, 1]
+        local_x = dx * cos + dy * sin
+        local_y = dy * cos - dx * sin
+        hits = ((0 <= local_x) & (local_x < sizes[:, 0]) &
+            (0 <= local_y) & (local_y < sizes[:, 1]))
+        return numpy.flatnonzero(hits)[::-1]
+
+    def hit_test(self, x, y, _z):
+        """Return true if any of the rectangles contains the point"""
+        return len(self.hit_test_indices(x, y)) > 0
+
+    def bounds(self):
+        """Return the bounding box of all the rectangles"""
+        if not self.count:
+            return None
+        corners = self.corners()
+        min_x, min_y = corners.min(axis=(0, 1))
+        max_x, max_y = corners.max(axis=(0, 1))
+        return float(min_x), float(min_y), float(max_x), float(max_y)
+
+    def hit_bounds(self):
+        """Return the area where hit_test can succeed: same as bounds"""
+        return self.bounds()
@@ -0,0 +1,233 @@
+"""Offline rendering of animations to image or video files
+
+Instead of running a scene in real time, the renderer steps a plain
+:class:`gillcup.Clock` at a fixed frame rate, draws each frame into a
+hidden window, and saves the pictures to disk. The result does not depend
+on how fast the computer is.
+
+The scene is given by a function that takes a clock, sets up the scene
+(scheduling animations on the clock), and returns the root
+:class:`~gillcup_graphics.Layer`. For example, if ``myscene.py`` contains::
+
+    def make_scene(clock):
+        layer = gillcup_graphics.Layer()
+        rect = gillcup_graphics.Rectangle(layer, size=(0.5, 0.5))
+        clock.schedule(gillcup.Animation(rect, 'x', 0.5, time=2))
+        return layer
+
+then the following renders two seconds of it at 25 frames per second::
+
+    python -m gillcup_graphics.render myscene:make_scene --frames 50 \\
+        --fps 25 --output 'out/frame{0:05d}.png'
+
+Frames can also be streamed as raw video (see
+:mod:`gillcup_graphics.framewriter`): if the output name ends in ``.y4m``
+or ``.rgba``, all frames go to that one file, and an output of ``-`` writes
+Y4M video to standard output, to be piped into an encoder.
+
+The timeline can be split into chunks rendered by several processes at
+once (``--processes``). Each process sets up the scene anew and fast-forwards
+the clock to the start of its chunk, so the scene function must always set
+up the same scene. Run ``python -m gillcup_graphics.render --help`` for all
+options.
+"""
+
+from __future__ import division
+
+import optparse
+import os
+import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+
+import gillcup
+
+
+def resolve(name):
+    """Return the object named by a ``'package.module:attribute'`` string
+    """
+    module_name, sep, attribute = name.partition(':')
+    if not sep or not attribute:
+        raise ValueError(
+            'Expected "module:attribute", got {0!r}'.format(name))
+    __import__(module_name)
+    return getattr(sys.modules[module_name], attribute)
+
+
+def split_frames(start, end, chunks):
+    """Split the frames from start to end into contiguous chunks
+
+    Returns a list of at most ``chunks`` ``(start, end)`` pairs, whose sizes
+    differ by at most one frame.
+    """
+    count = max(0, end - start)
+    chunks = max(1, min(chunks, count))
+    bounds = [start + count * i // chunks for i in range(chunks + 1)]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+def render_frames(scene_function, start, end, fps=30, width=640, height=480,
+        output='frame{0:05d}.png'):
+    """Render frames from start to end (exclusive) in this process
+
+    :param scene_function: A function that takes a :class:`gillcup.Clock`
+        and returns the root layer of the scene
+    :param start: The first frame to render
+    :param end: The frame after the last one to render
+    :param fps: Frames per second; frame ``n`` shows time ``n / fps``
+    :param width: Width of the pictures, in pixels
+    :param height: Height of the pictures, in pixels
+    :param output: File name pattern for the pictures; it is formatted with
+        the frame number. The file type is given by the extension.
+        For video output (see :func:`video_format`), the pattern is formatted
+        with the number of the first frame, and all frames are written to
+        that one file.
+    """
+    from gillcup_graphics import Window
+    from gillcup_graphics.effectlayer import RecordingLayer
+
+    clock = gillcup.Clock()
+    layer = scene_function(clock)
+    recording_layer = RecordingLayer(size=layer.size)
+    layer.reparent(recording_layer)
+    window = Window(recording_layer, width=width, height=height,
+        visible=False)
+    writer = None
+    try:
+        output_format = video_format(output)
+        if output_format:
+            writer = _open_writer(output, output_format, start, width,
+                height, fps)
+            recording_layer.frame_sink = writer
+        for frame in range(start, end):
+            clock.advance(frame / fps - clock.time)
+            window.manual_draw()
+            if not writer:
+                filename = output.format(frame)
+                _make_directory_for(filename)
+                recording_layer.last_image.save(filename)
+    finally:
+        window.close()
+        if writer:
+            writer.close()
+
+
+def video_format(output):
+    """Return the video format for the given output name, or None
+
+    Returns ``'y4m'`` for ``'-'`` (standard output) and names ending in
+    ``.y4m``, ``'rgba'`` for names ending in ``.rgba``, and None for
+    anything else (image files).
+    """
+    if output == '-' or output.endswith('.y4m'):
+        return 'y4m'
+    elif output.endswith('.rgba'):
+        return 'rgba'
+    else:
+        return None
+
+
+def _open_writer(output, output_format, start, width, height, fps):
+    """Return a FrameWriter for the given video output"""
+    from gillcup_graphics.framewriter import FrameWriter
+
+    if output == '-':
+        return FrameWriter(sys.stdout, width, height, fps=fps,
+            format=output_format)
+    filename = output.format(start)
+    _make_directory_for(filename)
+    return FrameWriter(open(filename, 'wb'), width, height, fps=fps,
+        format=output_format, close_stream=True)
+
+
+def _make_directory_for(filename):
+    """Create the directory a file is to be written to, if needed"""
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+
+def render(scene_name, start, end, processes=1, chunks=None, **kwargs):
+    """Render frames from start to end, possibly in several processes
+
+    :param scene_name: The scene function, as a ``'module:function'``
+        string (see :func:`render_frames`). It must be importable in
+        a new Python process.
+    :param processes: The number of worker processes. Each has its own
+        OpenGL context. If 1, frames are rendered in the current process.
+    :param chunks: The number of chunks to split the frames into; by
+        default, one per process.
+
+    Other arguments are passed to :func:`render_frames`.
+    """
+    if processes <= 1:
+        render_frames(resolve(scene_name), start, end, **kwargs)
+        return
+    output = kwargs.get('output', '')
+    if video_format(output) and output.format(0) == output.format(1):
+        raise ValueError('With several processes, video output names must '
+            'include the frame number, so each chunk gets its own file')
+    if chunks is None:
+        chunks = processes
+    commands = [
+        worker_command(scene_name, chunk_start, chunk_end, **kwargs)
+        for chunk_start, chunk_end in split_frames(start, end, chunks)]
+    pool = ThreadPool(processes)
+    try:
+        # Each worker is a new interpreter, so it does not inherit this
+        # process's window system connection or GL context
+        pool.map(subprocess.check_call, commands)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def worker_command(scene_name, start, end, fps=30, width=640, height=480,
+        output='frame{0:05d}.png'):
+    """Return the command line that renders the given frames"""
+    return [sys.executable, '-m', 'gillcup_graphics.render', scene_name,
+        '--start', str(start), '--end', str(end), '--fps', repr(fps),
+        '--size', '{0}x{1}'.format(width, height), '--output', output]
+
+
+def main(argv=None):
+    """Run the renderer with the given command-line arguments"""
+    parser = optparse.OptionParser(
+        usage='%prog [options] module:scene_function')
+    parser.add_option('-s', '--start', type='int', default=0,
+        help='first frame to render (default: %default)')
+    parser.add_option('-e', '--end', type='int',
+        help='frame after the last one to render')
+    parser.add_option('-n', '--frames', type='int',
+        help='number of frames to render (instead of --end)')
+    parser.add_option('-r', '--fps', type='float', default=30,
+        help='frames per second (default: %default)')
+    parser.add_option('-S', '--size', default='640x480',
+        help='picture size as WIDTHxHEIGHT (default: %default)')
+    parser.add_option('-o', '--output', default='frame{0:05d}.png',
+        help='output file pattern, formatted with the frame number; '
+            'use a .y4m or .rgba extension for a video file, '
+            'or - for Y4M on standard output (default: %default)')
+    parser.add_option('-p', '--processes', type='int', default=1,
+        help='number of worker processes (default: %default)')
+    parser.add_option('-c', '--chunks', type='int',
+        help='number of chunks to split the frames into '
+            '(default: one per process)')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('expected one scene function')
+    if options.end is None:
+        if options.frames is None:
+            parser.error('--end or --frames is required')
+        options.end = options.start + options.frames
+    try:
+        width, height = [int(n) for n in options.size.split('x')]
+    except ValueError:
+        parser.error('bad --size: {0}'.format(options.size))
+    render(args[0], options.start, options.end, processes=options.processes,
+        chunks=options.chunks, fps=options.fps, width=width, height=height,
+        output=options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Spatial indexing of 2D bounding boxes
+
+A :class:`GridIndex` answers the question "which of these boxes can contain
+this point?" without looking at all of the boxes.
+It is used by :class:`~gillcup_graphics.Layer` to speed up pointer hit tests
+when there are many children.
+"""
+
+from __future__ import division
+
+import math
+
+
+def _is_finite(box):
+    """Return true if box is not None and all its coordinates are finite"""
+    return box is not None and not any(
+        math.isinf(c) or math.isnan(c) for c in box)
+
+
+class GridIndex(object):
+    """A uniform grid over a sequence of bounding boxes
+
+    :param boxes: A sequence of (min_x, min_y, max_x, max_y) tuples, or
+        None for items whose extent is not known.
+        Items with unknown extent, and items whose box is not finite (for
+        example, because of a zero scale somewhere), are returned from
+        every query.
+
+    The grid has roughly one cell per box, so for boxes of similar size a
+    query only looks at a handful of candidates.
+    """
+    def __init__(self, boxes):
+        self.boxes = [b if _is_finite(b) else None for b in boxes]
+        self.unbounded = []
+        self.cells = {}
+        known = [b for b in self.boxes if b is not None]
+        if known:
+            self.min_x = min(b[0] for b in known)
+            self.min_y = min(b[1] for b in known)
+            max_x = max(b[2] for b in known)
+            max_y = max(b[3] for b in known)
+            cells_per_side = max(1, int(math.sqrt(len(known))))
+            self.cell_width = (max_x - self.min_x) / cells_per_side or 1
+            self.cell_height = (max_y - self.min_y) / cells_per_side or 1
+        for index, box in enumerate(self.boxes):
+            if box is None:
+                self.unbounded.append(index)
+            else:
+                min_col, min_row = self._cell(box[0], box[1])
+                max_col, max_row = self._cell(box[2], box[3])
+                for col in range(min_col, max_col + 1):
+                    for row in range(min_row, max_row + 1):
+                        self.cells.setdefault((col, row), []).append(index)
+
+    def _cell(self, x, y):
+        """Return the (column, row) of the cell containing the given point"""
+        return (int(math.floor((x - self.min_x) / self.cell_width)),
+            int(math.floor((y - self.min_y) / self.cell_height)))
+
+    def query(self, x, y):
+        """Return indices of boxes that contain the given point
+
+        Indices of boxes with unknown extent are always included.
+        The indices are sorted in descending order.
+        """
+        result = list(self.unbounded)
+        if self.cells:
+            boxes = self.boxes
+            for index in self.cells.get(self._cell(x, y), ()):
+                min_x, min_y, max_x, max_y = boxes[index]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    result.append(index)
+        result.sort(reverse=True)
+        return result
@@ -0,0 +1,91 @@
+"""Tests for the childlist module
+"""
+
+from __future__ import division
+
+from pytest import raises
+
+from gillcup_graphics.childlist import ChildList
+from gillcup_graphics import Layer, GraphicsObject
+
+
+class Item(object):
+    """A distinct object with a readable repr"""
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return '<%s>' % self.name
+
+
+def test_list_operations():
+    """ChildList acts like a list"""
+    a, b, c, d = [Item(n) for n in 'abcd']
+    children = ChildList([a, b])
+    children.append(c)
+    children.prepend(d)
+    assert children == [d, a, b, c]
+    assert len(children) == 4
+    assert children[0] is d
+    assert children[-1] is c
+    assert children[1:3] == [a, b]
+    assert list(reversed(children)) == [c, b, a, d]
+    assert children.index(b) == 2
+    assert b in children
+    children.remove(b)
+    assert b not in children
+    assert children == [d, a, c]
+    children.insert(1, b)
+    assert children == [d, b, a, c]
+    children.insert(0, Item('e'))
+    assert len(children) == 5
+    with raises(ValueError):
+        children.remove(Item('a'))
+    with raises(ValueError):
+        children.append(a)
+
+
+def test_moving():
+    """Items can be moved to either end"""
+    a, b, c = [Item(n) for n in 'abc']
+    children = ChildList([a, b, c])
+    children.move_to_front(a)
+    assert children == [b, c, a]
+    children.move_to_back(c)
+    assert children == [c, b, a]
+
+
+def test_modification_during_iteration():
+    """Changes don't affect iterations in progress"""
+    items = [Item(n) for n in 'abcd']
+    children = ChildList(items)
+    seen = []
+    for item in children:
+        seen.append(item)
+        children.remove(item)
+    assert seen == items
+    assert children == []
+
+
+def test_layer_children():
+    """Layer children are kept in a ChildList"""
+    layer = Layer()
+    first = GraphicsObject(layer)
+    second = GraphicsObject(layer)
+    back = GraphicsObject(layer, to_back=True)
+    assert isinstance(layer.children, ChildList)
+    assert layer.children == [back, first, second]
+    first.die()
+    assert layer.children == [back, second]
+    layer.children = [second]
+    assert isinstance(layer.children, ChildList)
+    assert layer.children == [second]
+
+
+def test_die_many():
+    """Killing a layer kills all its children"""
+    layer = Layer()
+    children = [GraphicsObject(layer) for _ in range(1000)]
+    layer.die()
+    assert all(child.dead for child in children)
+    assert len(layer.children) == 0
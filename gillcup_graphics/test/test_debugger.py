@@ -10,7 +10,8 @@ try:
 except ImportError:
     raise skip('no urwid')
 
-from gillcup_graphics import debugger
+from gillcup_graphics import debugger, GraphicsObject
+from gillcup_graphics.profiler import Profiler
 
 
 class DebugTreeWalker(debugger.TreeWalker):
@@ -69,3 +70,23 @@ class TestTreeWalker(object):
         walker = DebugTreeWalker([0, [1, 2, 3], 4])
         walker[1].check_linearization([], [0], [1], [2])
         walker.check_linearization([], [0], [1], [1, 0], [1, 1], [1, 2], [2])
+
+
+def test_recent_render_times():
+    """Only render times from the last period are shown"""
+    profiler = Profiler()
+    render_times = debugger.RecentRenderTimes(profiler, period=1)
+    obj = GraphicsObject()
+    assert render_times.render_time(obj) is None
+    render_times.tick(0)
+    profiler.enter(obj)
+    profiler.exit(obj)
+    first = render_times.render_time(obj)
+    assert first is not None
+    render_times.tick(0.5)
+    assert render_times.render_time(obj) == first
+    render_times.tick(1)
+    assert render_times.render_time(obj) == first
+    assert profiler.stats_for(obj) is None
+    render_times.tick(2)
+    assert render_times.render_time(obj) is None
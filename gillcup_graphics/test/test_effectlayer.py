@@ -0,0 +1,296 @@
+"""Tests for the EffectLayer
+"""
+
+from __future__ import division
+
+import pyglet
+from pytest import raises, importorskip
+
+from gillcup_graphics import (Layer, Rectangle, EffectLayer, TintLayer,
+    Window)
+from gillcup_graphics.effectlayer import RecordingLayer
+from gillcup_graphics.offscreen import shaders
+from gillcup_graphics.offscreen.pool import FBOPool
+from gillcup_graphics.offscreen.readback import AsyncReadback
+
+from gillcup_graphics.test.test_glstate import RecordingGl
+from gillcup_graphics.test.test_pool import FakeFBO
+from gillcup_graphics.test.test_layer import render, assert_similar
+from gillcup_graphics.test.testlayer import get_data
+
+
+def test_draw_parameters():
+    """Draw parameters change when anything in the subtree changes"""
+    layer = Layer()
+    rectangle = Rectangle(layer)
+    sublayer = Layer(layer)
+    other = Rectangle(sublayer)
+    parameters = layer.draw_parameters()
+    assert layer.draw_parameters() == parameters
+
+    def _assert_changed():
+        new_parameters = layer.draw_parameters()
+        assert new_parameters != parameters
+        return new_parameters
+
+    rectangle.opacity = 0.5
+    parameters = _assert_changed()
+    other.x = 3
+    parameters = _assert_changed()
+    other.hidden = True
+    parameters = _assert_changed()
+    sublayer.reparent(layer, to_back=True)
+    parameters = _assert_changed()
+    Rectangle(sublayer)
+    parameters = _assert_changed()
+    rectangle.color = 0, 0, 0
+    parameters = _assert_changed()
+
+
+def test_bitmap_cache():
+    """The cached bitmap is only re-rendered when something changes"""
+    layer = EffectLayer()
+    layer.cache_as_bitmap = True
+    layer.fbo_pool = FBOPool(factory=FakeFBO)
+    rectangle = Rectangle(layer)
+    assert layer.need_offscreen()
+
+    # pylint: disable=W0212
+    framebuffer, needs_render = layer._get_cached_framebuffer(10, 10, 10, 10)
+    assert needs_render
+    assert layer._get_cached_framebuffer(10, 10, 10, 10) == (
+        framebuffer, False)
+
+    layer.opacity = 0.5
+    assert not layer._get_cached_framebuffer(10, 10, 10, 10)[1]
+
+    rectangle.width = 2
+    assert layer._get_cached_framebuffer(10, 10, 10, 10) == (
+        framebuffer, True)
+    layer.x = 1
+    assert layer._get_cached_framebuffer(10, 10, 10, 10) == (
+        framebuffer, True)
+
+    new_framebuffer, needs_render = layer._get_cached_framebuffer(
+        100, 100, 100, 100)
+    assert needs_render
+    assert new_framebuffer is not framebuffer
+    assert layer.fbo_pool.idle == [framebuffer]
+
+    layer.die()
+    assert layer._bitmap_cache is None
+    assert new_framebuffer in layer.fbo_pool.idle
+
+
+def test_bitmap_cache_tint():
+    """The cached bitmap is re-rendered when an enclosing tint changes"""
+    layer = EffectLayer()
+    layer.cache_as_bitmap = True
+    layer.fbo_pool = FBOPool(factory=FakeFBO)
+    Rectangle(layer)
+
+    # pylint: disable=W0212
+    framebuffer, needs_render = layer._get_cached_framebuffer(10, 10, 10, 10,
+        tint=(1, 1, 1, 1))
+    assert needs_render
+    assert layer._get_cached_framebuffer(10, 10, 10, 10,
+        tint=(1, 1, 1, 1)) == (framebuffer, False)
+    assert layer._get_cached_framebuffer(10, 10, 10, 10,
+        tint=(1, 0, 0, 1)) == (framebuffer, True)
+
+
+def test_cached_layer_under_tint_layer():
+    """Changing a TintLayer's color re-renders a cached layer inside it"""
+    recording_layer = RecordingLayer()
+    tint_layer = TintLayer(recording_layer)
+    layer = EffectLayer(tint_layer)
+    layer.cache_as_bitmap = True
+    Rectangle(layer)
+    window = Window(recording_layer, width=100, height=100, visible=False)
+    try:
+        window.manual_draw()
+        assert center_pixel(get_data(recording_layer.last_image)) == (
+            255, 255, 255, 255)
+        tint_layer.color = 0, 1, 0
+        window.manual_draw()
+        assert center_pixel(get_data(recording_layer.last_image)) == (
+            0, 255, 0, 255)
+    finally:
+        layer.drop_bitmap_cache()
+        window.close()
+
+
+def center_pixel(data, width=100):
+    """Return the RGBA values of the middle pixel of rendered data"""
+    return tuple(channel[len(channel) // 2 + width // 2] for channel in data)
+
+
+def test_shader_effects():
+    """Color and opacity are applied in the shader pass"""
+    layer = EffectLayer(color=(1, 0.5, 0), opacity=0.5)
+    Rectangle(layer)
+    expected = 128, 64, 0, 128
+    result = center_pixel(render(layer))
+    assert all(abs(a - b) <= 1 for a, b in zip(result, expected))
+
+
+def test_shader_program_cache():
+    """Shader programs are cached; errors are reported once"""
+    window = pyglet.window.Window(visible=False)
+    try:
+        vertex = 'void main() { gl_Position = ftransform(); }'
+        fragment = 'void main() { gl_FragColor = vec4(1.0); }'
+        program = shaders.get_program(vertex, fragment)
+        assert program
+        assert shaders.get_program(vertex, fragment) is program
+        with raises(shaders.ShaderError):
+            shaders.get_program(vertex, 'syntax error')
+        assert shaders.get_program(vertex, 'syntax error') is None
+    finally:
+        shaders.clear_cache()
+        window.close()
+
+
+def test_can_blit_directly():
+    """Only an untinted root layer may be copied instead of blended"""
+    class _Window(object):
+        """Window stand-in"""
+        layer = None
+
+    window = _Window()
+    layer = EffectLayer(mosaic=(2, 2))
+    assert not layer.can_blit_directly(window)
+    window.layer = layer
+    layer.opacity = 0.5
+    assert not layer.can_blit_directly(window)
+    layer.opacity = 1
+    layer.color = 1, 0, 0
+    assert not layer.can_blit_directly(window)
+    layer.color = 1, 1, 1
+    layer.direct_blit = False
+    assert not layer.can_blit_directly(window)
+
+
+def nested_effect_layers():
+    """Return a mosaicked EffectLayer with tinted EffectLayers nested in it"""
+    outer = EffectLayer(mosaic=(2, 2))
+    middle = EffectLayer(outer, color=(1, 0.5, 0), opacity=0.5)
+    inner = EffectLayer(middle, opacity=0.5, position=(0.1, 0.1))
+    Rectangle(inner, size=(0.5, 0.5))
+    Rectangle(inner, position=(0.25, 0.25), size=(0.5, 0.5))
+    return outer, middle, inner
+
+
+def test_flatten_nested():
+    """Nested layers that only tint or fade are merged into one pass"""
+    outer, middle, inner = nested_effect_layers()
+    assert outer.flatten_nested() == ((middle, inner), (1, 0.5, 0), 0.25)
+    assert middle.flatten_nested() == ((inner, ), (1, 0.5, 0), 0.25)
+    assert inner.flatten_nested() == ((), (1, 1, 1), 0.5)
+
+    inner.mosaic = 3, 3
+    assert outer.flatten_nested() == ((middle, ), (1, 0.5, 0), 0.5)
+    inner.mosaic = 1, 1
+
+    sibling = Rectangle(middle)
+    assert outer.flatten_nested() == ((middle, ), (1, 0.5, 0), 0.5)
+    sibling.hidden = True
+    assert len(outer.flatten_nested()[0]) == 2
+
+    inner.flatten = False
+    assert outer.flatten_nested() == ((middle, ), (1, 0.5, 0), 0.5)
+    middle.flatten = False
+    assert outer.flatten_nested() == ((), (1, 1, 1), 1)
+    outer.flatten = True
+    inner.flatten = True
+    assert middle.flatten_nested() == ((), (1, 0.5, 0), 0.5)
+    middle.flatten = True
+
+    outer.flatten = False
+    assert outer.flatten_nested() == ((), (1, 1, 1), 1)
+
+    recording_layer = RecordingLayer()
+    outer.reparent(recording_layer)
+    assert recording_layer.flatten_nested()[0] == ()
+
+
+def test_flattened_rendering():
+    """Merged passes look the same as separate ones"""
+    def _render(flatten):
+        outer, middle, _inner = nested_effect_layers()
+        outer.flatten = middle.flatten = flatten
+        return render(outer)
+    assert_similar(_render(True), _render(False))
+
+
+def test_async_readback_map_failure(monkeypatch):
+    """A pixel buffer that can't be mapped raises instead of a blank frame"""
+    monkeypatch.setattr('gillcup_graphics.offscreen.readback.gl',
+        RecordingGl())
+    delivered = []
+    async_readback = AsyncReadback(buffer_count=2,
+        callback=lambda image, tag: delivered.append(tag))
+    async_readback.buffer_ids = [1, 2]
+    async_readback.pending.extend([(0, 2, 2, 'a'), (1, 2, 2, 'b')])
+    with raises(RuntimeError):
+        async_readback.flush()
+    assert delivered == []
+    assert list(async_readback.pending) == [(1, 2, 2, 'b')]
+
+
+def test_async_readback():
+    """Frames read back asynchronously match synchronous recordings"""
+    layer = RecordingLayer()
+    rectangle = Rectangle(layer, color=(1, 0.5, 0), size=(0.5, 0.5))
+    window = Window(layer, width=100, height=100, visible=False)
+    expected = []
+    for i in range(5):
+        rectangle.x = i / 10
+        window.manual_draw()
+        expected.append(get_data(layer.last_image))
+
+    delivered = []
+    readback = AsyncReadback(buffer_count=3,
+        callback=lambda image, tag: delivered.append(
+            (tag, get_data(image))))
+    layer.readback = readback
+    layer.frame_number = 0
+    for i in range(5):
+        rectangle.x = i / 10
+        window.manual_draw()
+        assert len(delivered) == max(0, i - 1)
+    readback.flush()
+    readback.destroy()
+    window.close()
+    assert [tag for tag, _data in delivered] == range(5)
+    for (_tag, data), expected_data in zip(delivered, expected):
+        assert_similar(data, expected_data)
+
+
+def test_record_array():
+    """Arrays read from the FBO match the recorded image"""
+    numpy = importorskip('numpy')
+    layer = RecordingLayer()
+    Rectangle(layer, color=(1, 0.5, 0), size=(0.5, 0.25))
+    Rectangle(layer, color=(0, 0, 1), position=(0.5, 0.5), opacity=0.5)
+    window = Window(layer, width=100, height=100, visible=False)
+    try:
+        window.manual_draw()
+        red, green, blue, alpha = get_data(layer.last_image)
+        expected = numpy.array(zip(red, green, blue, alpha), numpy.uint8)
+        expected.shape = 100, 100, 4
+
+        layer.record_array = True
+        window.manual_draw()
+        array = layer.last_array
+        assert (array == expected).all()
+        window.manual_draw()
+        assert layer.last_array is array
+
+        layer.array_region = 40, 10, 30, 20
+        layer.array_flip = True
+        window.manual_draw()
+        assert layer.last_array.shape == (20, 30, 4)
+        assert (layer.last_array == expected[29:9:-1, 40:70]).all()
+    finally:
+        window.close()
@@ -0,0 +1,127 @@
+"""Tests for per-frame caching of animated properties
+"""
+
+from __future__ import division
+
+import gillcup
+from gillcup.effect import ComputedEffect
+
+from gillcup_graphics import Layer, Rectangle, framecache
+from gillcup_graphics.transformation import (
+    MatrixTransformation, PointTransformation)
+
+
+class CountingEffect(ComputedEffect):
+    """Effect with a constant value that counts how often it's evaluated"""
+    def __init__(self, value, counter):
+        def _evaluate():
+            counter[0] += 1
+            return value
+        super(CountingEffect, self).__init__(_evaluate)
+
+
+class NoGlRectangle(Rectangle):
+    """Reads the same properties as Rectangle.draw, but makes no GL calls"""
+    def draw(self, transformation, **kwargs):
+        transformation.scale(self.width, self.height, 1)
+        return self.color + (self.opacity, )
+
+
+def counted_scene(counter, n=10):
+    """Make a Layer with n rectangles whose properties count evaluations
+
+    Return the layer and the number of counted properties
+    """
+    layer = Layer()
+    names = dict(position=(0, 0, 0), scale=(1, 1, 1), size=(0.5, 0.5),
+        color=(1, 0, 0), opacity=0.5, rotation=10)
+    for _ in range(n):
+        rectangle = NoGlRectangle(layer)
+        for name, value in names.items():
+            CountingEffect(value, counter).apply_to(rectangle, name)
+    return layer, n * len(names)
+
+
+def run_frame(layer):
+    """Draw the layer and send it a pointer event, without OpenGL"""
+    layer.do_draw(transformation=MatrixTransformation())
+    transformation = PointTransformation(0.25, 0.25, 0)
+    with transformation.state:
+        layer.apply_transform(transformation)
+        layer.pointer_event('motion', 'main', 0.25, 0.25, 0,
+            transformation=transformation)
+
+
+def test_evaluations_per_frame():
+    """Benchmark: each animated property is evaluated once per frame"""
+    counter = [0]
+    layer, num_properties = counted_scene(counter)
+
+    counter[0] = 0
+    run_frame(layer)
+    uncached = counter[0]
+
+    counter[0] = 0
+    with framecache.frame():
+        run_frame(layer)
+    cached = counter[0]
+
+    assert cached == num_properties
+    assert uncached >= 3 * cached
+
+
+def test_cache_outside_frame():
+    """Outside a frame, every read evaluates the effect"""
+    counter = [0]
+    rectangle = Rectangle()
+    CountingEffect(0.5, counter).apply_to(rectangle, 'opacity')
+    assert not framecache.in_frame()
+    for _ in range(3):
+        assert rectangle.opacity == 0.5
+    assert counter[0] == 3
+
+
+def test_new_frame():
+    """Values are re-read when a new frame starts"""
+    clock = gillcup.Clock()
+    rectangle = Rectangle()
+    clock.schedule(gillcup.Animation(rectangle, 'x', 10, time=10))
+    clock.advance(5)
+    with framecache.frame():
+        assert rectangle.x == 5
+        assert rectangle.position == (5, 0, 0)
+    clock.advance(5)
+    with framecache.frame():
+        assert rectangle.x == 10
+        assert rectangle.position == (10, 0, 0)
+
+
+def test_assignment_in_frame():
+    """Assigning a property or applying an effect invalidates the cache"""
+    rectangle = Rectangle(size=(2, 4), relative_anchor=(0.5, 0.5))
+    with framecache.frame():
+        assert rectangle.anchor == (1, 2)
+        rectangle.width = 4
+        assert rectangle.size == (4, 4)
+        assert rectangle.anchor == (2, 2)
+        rectangle.size = 6, 8
+        assert rectangle.width == 6
+        assert rectangle.anchor_y == 4
+        assert rectangle.opacity == 1
+        CountingEffect(0.5, [0]).apply_to(rectangle, 'opacity')
+        assert rectangle.opacity == 0.5
+
+
+def test_nested_frames():
+    """Nested frames share the cache"""
+    counter = [0]
+    rectangle = Rectangle()
+    CountingEffect(0.5, counter).apply_to(rectangle, 'opacity')
+    with framecache.frame():
+        assert rectangle.opacity == 0.5
+        with framecache.frame():
+            assert rectangle.opacity == 0.5
+        assert framecache.in_frame()
+        assert rectangle.opacity == 0.5
+    assert not framecache.in_frame()
+    assert counter[0] == 1
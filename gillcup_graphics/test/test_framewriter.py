@@ -0,0 +1,99 @@
+"""Tests for the streaming frame writer
+"""
+
+from __future__ import division
+
+from StringIO import StringIO
+
+from pytest import raises, skip
+
+try:
+    import numpy  # pylint: disable=F0401
+except ImportError:
+    raise skip('no numpy')
+
+from gillcup_graphics.framewriter import rgb_to_yuv, FrameWriter
+
+
+def make_frame(width=4, height=2):
+    """Return a frame with a white bottom row and black other rows"""
+    frame = numpy.zeros((height, width, 4), numpy.uint8)
+    frame[0] = 255
+    return frame
+
+
+def test_rgb_to_yuv():
+    """Colors are converted to studio-swing BT.601 YCbCr"""
+    frame = numpy.array([[[0, 0, 0], [255, 255, 255]],
+        [[255, 0, 0], [0, 0, 255]]], numpy.uint8)
+    y, cb, cr = rgb_to_yuv(frame, '444')
+    assert y.tolist() == [[16, 235], [81, 41]]
+    assert cb.tolist() == [[128, 128], [90, 240]]
+    assert cr.tolist() == [[128, 128], [240, 110]]
+    y, cb, cr = rgb_to_yuv(frame, '420')
+    assert y.shape == (2, 2)
+    assert cb.tolist() == [[147]]
+    with raises(ValueError):
+        rgb_to_yuv(frame[:1], '420')
+
+
+def test_y4m_output():
+    """Y4M output has a header, and a marker and three planes per frame"""
+    stream = StringIO()
+    writer = FrameWriter(stream, 4, 2, fps=25)
+    writer.write(make_frame())
+    writer.write(make_frame())
+    writer.close()
+    header, frames = stream.getvalue().split('\n', 1)
+    assert header == 'YUV4MPEG2 W4 H2 F25:1 Ip A1:1 C420'
+    frame_size = len('FRAME\n') + 4 * 2 + 2 * (2 * 1)
+    assert len(frames) == 2 * frame_size
+    assert frames[:len('FRAME\n')] == 'FRAME\n'
+    # The frame is flipped, so the white row comes last
+    luma = frames[len('FRAME\n'):len('FRAME\n') + 8]
+    assert [ord(c) for c in luma] == [16] * 4 + [235] * 4
+
+
+def test_rgba_output():
+    """Raw RGBA output is the frames' bytes, optionally flipped"""
+    frame = make_frame()
+    for bottom_up, expected in ((True, frame[::-1]), (False, frame)):
+        stream = StringIO()
+        writer = FrameWriter(stream, 4, 2, format='rgba',
+            bottom_up=bottom_up)
+        writer.write(frame)
+        writer.close()
+        assert stream.getvalue() == expected.tobytes()
+
+
+def test_frames_are_copied():
+    """Frames can be reused as soon as write() returns"""
+    stream = StringIO()
+    writer = FrameWriter(stream, 4, 2, format='rgba', bottom_up=False)
+    frame = make_frame()
+    writer.write(frame)
+    frame[...] = 7
+    writer.close()
+    assert stream.getvalue() == make_frame().tobytes()
+
+
+def test_write_errors():
+    """Errors on the writing thread are re-raised in the caller's thread"""
+    class BrokenStream(object):
+        """A stream that fails on write"""
+        def write(self, data):
+            """Fail"""
+            raise IOError('broken pipe')
+
+        def flush(self):
+            """Do nothing"""
+            pass
+
+    writer = FrameWriter(BrokenStream(), 4, 2, format='rgba')
+    writer.write(make_frame())
+    with raises(IOError):
+        writer.close()
+    with raises(IOError):
+        writer.write(make_frame())
+    with raises(ValueError):
+        FrameWriter(StringIO(), 4, 2, format='png')
@@ -0,0 +1,123 @@
+"""Tests for the OpenGL state tracker
+"""
+
+from __future__ import division
+
+from gillcup_graphics import Layer, Rectangle, glstate
+from gillcup_graphics.glstate import StateTracker
+
+
+class RecordingGl(object):
+    """Stand-in for pyglet.gl that records the calls made to it"""
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('GL_'):
+            return name
+
+        def _record(*args):
+            self.calls.append((name, ) + args)
+        return _record
+
+
+def test_redundant_calls_skipped(monkeypatch):
+    """Setting state to the value it already has makes no GL call"""
+    gl = RecordingGl()
+    monkeypatch.setattr(glstate, 'gl', gl)
+    tracker = StateTracker(enabled=True)
+    tracker.color(1, 0, 0)
+    tracker.color(1, 0, 0, 1)
+    tracker.enable(gl.GL_BLEND)
+    tracker.enable(gl.GL_BLEND)
+    tracker.disable(gl.GL_BLEND)
+    tracker.viewport(0, 0, 10, 10)
+    tracker.viewport(0, 0, 10, 10)
+    assert gl.calls == [
+        ('glColor4f', 1, 0, 0, 1),
+        ('glEnable', 'GL_BLEND'),
+        ('glDisable', 'GL_BLEND'),
+        ('glViewport', 0, 0, 10, 10)]
+    assert (tracker.calls_made, tracker.calls_saved) == (4, 3)
+
+    tracker.invalidate('viewport')
+    tracker.viewport(0, 0, 10, 10)
+    tracker.invalidate()
+    tracker.color(1, 0, 0)
+    assert len(gl.calls) == 6
+    tracker.reset_counts()
+    assert (tracker.calls_made, tracker.calls_saved) == (0, 0)
+
+
+def test_vertex_pointer(monkeypatch):
+    """The vertex pointer is only skipped for the very same array"""
+    gl = RecordingGl()
+    monkeypatch.setattr(glstate, 'gl', gl)
+    tracker = StateTracker(enabled=True)
+    array = [0, 0, 1, 1]
+    tracker.vertex_pointer(2, gl.GL_FLOAT, array)
+    tracker.vertex_pointer(2, gl.GL_FLOAT, array)
+    tracker.vertex_pointer(2, gl.GL_FLOAT, list(array))
+    assert len(gl.calls) == 2
+    # Addresses are compared by value
+    tracker.vertex_pointer(2, gl.GL_FLOAT, 2 ** 40)
+    tracker.vertex_pointer(2, gl.GL_FLOAT, 2 ** 40)
+    tracker.vertex_pointer(2, gl.GL_FLOAT, 2 ** 40 + 8)
+    assert len(gl.calls) == 4
+
+
+def test_disabled_tracker(monkeypatch):
+    """A disabled tracker makes every call"""
+    gl = RecordingGl()
+    monkeypatch.setattr(glstate, 'gl', gl)
+    tracker = StateTracker()
+    assert not glstate.default_tracker.enabled
+    array = [0, 0, 1, 1]
+    for _ in range(2):
+        tracker.color(1, 0, 0)
+        tracker.vertex_pointer(2, gl.GL_FLOAT, array)
+        tracker.bind_texture(gl.GL_TEXTURE_2D, 1)
+        tracker.tex_parameter(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER,
+            gl.GL_NEAREST)
+    assert len(gl.calls) == 8
+    assert (tracker.calls_made, tracker.calls_saved) == (8, 0)
+
+
+def test_texture_parameters(monkeypatch):
+    """Texture parameters are remembered per texture"""
+    gl = RecordingGl()
+    monkeypatch.setattr(glstate, 'gl', gl)
+    tracker = StateTracker(enabled=True)
+    name = gl.GL_TEXTURE_MAG_FILTER
+    # Unknown bound texture: always call
+    tracker.tex_parameter(gl.GL_TEXTURE_2D, name, gl.GL_NEAREST)
+    tracker.tex_parameter(gl.GL_TEXTURE_2D, name, gl.GL_NEAREST)
+    assert len(gl.calls) == 2
+    tracker.bind_texture(gl.GL_TEXTURE_2D, 1)
+    tracker.tex_parameter(gl.GL_TEXTURE_2D, name, gl.GL_NEAREST)
+    tracker.bind_texture(gl.GL_TEXTURE_2D, 2)
+    tracker.tex_parameter(gl.GL_TEXTURE_2D, name, gl.GL_NEAREST)
+    tracker.bind_texture(gl.GL_TEXTURE_2D, 1)
+    tracker.tex_parameter(gl.GL_TEXTURE_2D, name, gl.GL_NEAREST)
+    assert len(gl.calls) == 7
+    # A deleted texture's name may be reused for a new texture
+    tracker.forget_texture(1)
+    tracker.bind_texture(gl.GL_TEXTURE_2D, 1)
+    tracker.tex_parameter(gl.GL_TEXTURE_2D, name, gl.GL_NEAREST)
+    assert len(gl.calls) == 9
+
+
+def test_window_counts_saved_calls():
+    """Drawing many rectangles skips redundant state changes"""
+    from gillcup_graphics.mainwindow import Window
+    layer = Layer()
+    for i in range(10):
+        Rectangle(layer, position=(i / 10, 0), size=(0.05, 0.05))
+    window = Window(layer, width=20, height=20, visible=False)
+    glstate.default_tracker.enabled = True
+    try:
+        window.manual_draw()
+    finally:
+        glstate.default_tracker.enabled = False
+        window.close()
+    assert window.gl_calls_saved >= 2 * 9
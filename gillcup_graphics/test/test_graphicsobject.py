@@ -0,0 +1,54 @@
+"""Tests for the GraphicsObject base class
+"""
+
+from __future__ import division
+
+from gillcup_graphics import GraphicsObject, Layer
+
+from gillcup_graphics.test.test_transformation import sequences_almost_equal
+
+
+def test_local_transformation_cached():
+    """The local transformation is reused until the object moves"""
+    obj = GraphicsObject(position=(1, 2))
+    transformation = obj.local_transformation
+    assert obj.local_transformation is transformation
+    assert sequences_almost_equal(transformation.matrix[12:15], (1, 2, 0))
+    obj.x = 5
+    assert obj.local_transformation is not transformation
+    assert sequences_almost_equal(
+        obj.local_transformation.matrix[12:15], (5, 2, 0))
+
+
+def test_world_transformation():
+    """The world transformation combines transformations of all parents"""
+    root = Layer(scale=(2, 2))
+    layer = Layer(root, position=(1, 1))
+    obj = GraphicsObject(layer, position=(1, 0))
+    world = obj.world_transformation
+    assert obj.world_transformation is world
+    assert sequences_almost_equal(world.matrix[12:15], (4, 2, 0))
+    layer.rotation = 90
+    assert obj.world_transformation is not world
+    assert sequences_almost_equal(
+        obj.world_transformation.matrix[12:15], (2, 4, 0))
+
+
+def test_world_transformation_reparent():
+    """The world transformation is updated when the object is reparented"""
+    first_layer = Layer(position=(1, 0))
+    second_layer = Layer(position=(0, 1))
+    obj = GraphicsObject(first_layer)
+    assert sequences_almost_equal(
+        obj.world_transformation.matrix[12:15], (1, 0, 0))
+    obj.reparent(second_layer)
+    assert sequences_almost_equal(
+        obj.world_transformation.matrix[12:15], (0, 1, 0))
+
+
+def test_layer_anchor_in_world_transformation():
+    """A Layer's children are shifted by the layer's anchor, as in drawing"""
+    layer = Layer(anchor=(1, 1), position=(3, 3))
+    obj = GraphicsObject(layer)
+    assert sequences_almost_equal(
+        obj.world_transformation.matrix[12:15], (3, 3, 0))
@@ -0,0 +1,148 @@
+"""Tests for per-frame instrumentation
+"""
+
+from __future__ import division
+
+from pyglet import gl
+from pytest import raises
+
+from gillcup_graphics import GraphicsObject, Layer, Rectangle, objects
+from gillcup_graphics.instrumentation import (FrameInstrumentation,
+    gl_call_category)
+from gillcup_graphics.test.test_layer import (FakeWindow, RecordingObject,
+    draw_without_gl)
+
+
+class InstrumentedFakeWindow(FakeWindow):
+    """FakeWindow that can have an instrumentation attached"""
+    instrumentation = None
+    effect_passes_saved = 0
+    gl_calls_saved = 0
+
+
+def test_gl_call_category():
+    """OpenGL functions are sorted into categories"""
+    assert gl_call_category('glDrawArrays') == 'draw'
+    assert gl_call_category('glBegin') == 'draw'
+    assert gl_call_category('glVertex2i') == 'vertex'
+    assert gl_call_category('glPushMatrix') == 'matrix'
+    assert gl_call_category('glLoadMatrixf') == 'matrix'
+    assert gl_call_category('glBindFramebufferEXT') == 'framebuffer'
+    assert gl_call_category('glReadPixels') == 'readback'
+    assert gl_call_category('glGenTextures') == 'resource'
+    assert gl_call_category('glGetProgramiv') == 'query'
+    assert gl_call_category('glColor4f') == 'state'
+    assert gl_call_category('glBlendFunc') == 'state'
+
+
+def test_counting(monkeypatch):
+    """GL calls and drawn objects are counted while attached"""
+    calls = []
+    monkeypatch.setattr(gl, 'glDrawArrays', lambda *args: calls.append(args))
+    window = InstrumentedFakeWindow(100, 100)
+    instrumentation = FrameInstrumentation(history_size=2)
+    instrumentation.attach(window)
+    try:
+        assert window.instrumentation is instrumentation
+        assert instrumentation.last is None
+        layer = Layer(scale=(100, 100))
+        drawn = []
+        RecordingObject(layer, drawn, name='shown')
+        RecordingObject(layer, drawn, name='outside', position=(5, 5))
+        RecordingObject(layer, drawn, name='hidden').hidden = True
+        for frame in range(3):
+            window.culled_count = 0
+            instrumentation.begin_frame()
+            draw_without_gl(layer, window)
+            for _ in range(frame):
+                gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
+            instrumentation.end_frame(window)
+    finally:
+        instrumentation.detach()
+    assert window.instrumentation is None
+    assert GraphicsObject.draw_hooks == ()
+    assert len(calls) == 3
+    assert instrumentation.frame_count == 3
+    assert len(instrumentation.history) == 2
+    stats = instrumentation.last
+    assert stats.gl_calls == {'glDrawArrays': 2}
+    assert stats.gl_calls_by_category == {'draw': 2}
+    assert stats.draw_calls == stats.gl_call_count == 2
+    assert stats.objects_drawn == 2
+    assert stats.objects_hidden == 1
+    assert stats.objects_culled == 1
+    assert instrumentation.average('draw_calls') == 1.5
+
+    # No counting when detached
+    gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
+    assert instrumentation.frame_count == 3
+
+
+def test_batched_counting(monkeypatch):
+    """Objects drawn by a batched layer are counted"""
+    monkeypatch.setattr(objects._RectangleBatch,  # pylint: disable=W0212
+        'flush', lambda self, transformation: None)
+    window = InstrumentedFakeWindow(100, 100)
+    instrumentation = FrameInstrumentation()
+    instrumentation.attach(window)
+    try:
+        layer = Layer()
+        layer.batched = True
+        Rectangle(layer)
+        Rectangle(layer).hidden = True
+        Rectangle(Layer(layer))
+        instrumentation.begin_frame()
+        draw_without_gl(layer, window)
+        instrumentation.end_frame(window)
+    finally:
+        instrumentation.detach()
+    assert instrumentation.last.objects_drawn == 4
+    assert instrumentation.last.objects_hidden == 1
+
+
+def test_failed_frame(monkeypatch):
+    """A frame that fails to draw still ends the instrumented frame"""
+    from gillcup_graphics.mainwindow import Window
+    monkeypatch.setattr(gl, 'glDrawArrays', lambda *args: None)
+
+    class _BrokenWindow(InstrumentedFakeWindow):
+        """Window stand-in whose drawing fails"""
+        on_draw = Window.on_draw.__func__
+
+        def _draw_frame(self):
+            """Fail to draw"""
+            gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
+            raise ValueError('draw failed')
+
+    window = _BrokenWindow(100, 100)
+    instrumentation = FrameInstrumentation()
+    instrumentation.attach(window)
+    try:
+        with raises(ValueError):
+            window.on_draw()
+        assert instrumentation.frame_count == 1
+        instrumentation.begin_frame()
+        instrumentation.end_frame(window)
+    finally:
+        instrumentation.detach()
+    assert instrumentation.last.gl_call_count == 0
+
+
+def test_window_instrumentation():
+    """A window counts the GL calls of each frame"""
+    from gillcup_graphics.mainwindow import Window
+    layer = Layer()
+    for i in range(5):
+        Rectangle(layer, position=(i / 5, 0), size=(0.1, 0.1))
+    window = Window(layer, width=20, height=20, visible=False)
+    instrumentation = FrameInstrumentation()
+    instrumentation.attach(window)
+    try:
+        window.manual_draw()
+    finally:
+        instrumentation.detach()
+        window.close()
+    stats = instrumentation.last
+    assert stats.draw_calls == 5
+    assert stats.objects_drawn == 6
+    assert stats.state_changes_saved > 0
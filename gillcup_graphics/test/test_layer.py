@@ -0,0 +1,360 @@
+"""Tests for the Layer class
+"""
+
+from __future__ import division
+
+import gillcup
+
+from gillcup_graphics import (GraphicsObject, Layer, Rectangle, TintLayer,
+    EffectLayer, framecache)
+from gillcup_graphics.effectlayer import RecordingLayer
+from gillcup_graphics.objects import tinted_color
+from gillcup_graphics.mainwindow import Window
+from gillcup_graphics.transformation import (MatrixTransformation,
+    PointTransformation, CpuGlTransformation)
+
+from gillcup_graphics.test.testlayer import get_data
+
+
+def render(layer, width=100, height=100):
+    """Render a layer (wrapped in a RecordingLayer) and return the pixels"""
+    recording_layer = RecordingLayer()
+    layer.reparent(recording_layer)
+    return get_data(recording_layer.get_image(width, height))
+
+
+def assert_similar(result, expected):
+    """Assert that two renderings differ in at most a few edge pixels
+
+    The batched and immediate draw paths may rasterize polygon edges slightly
+    differently.
+    """
+    differences = sum(abs(a - b) > 2
+        for result_channel, expected_channel in zip(result, expected)
+        for a, b in zip(result_channel, expected_channel))
+    assert differences < 0.005 * 4 * 100 * 100
+
+
+def build_scene(layer):
+    """Put an assortment of rectangles and layers into the given layer"""
+    Rectangle(layer, color=(0.2, 0.3, 0.4))
+    Rectangle(layer, position=(0.1, 0.1), size=(0.5, 0.3), opacity=0.5)
+    sublayer = Layer(layer, position=(0.5, 0.5), scale=(0.5, 0.5),
+        rotation=30)
+    Rectangle(sublayer, color=(1, 0, 0), size=(0.5, 0.5),
+        relative_anchor=(0.5, 0.5))
+    Rectangle(sublayer, color=(0, 1, 0), position=(0.2, 0.2), opacity=0.8)
+    hidden_rectangle = Rectangle(layer, color=(0, 0, 1), position=(0.7, 0.1),
+        size=(0.2, 0.8))
+    hidden_rectangle.hidden = True
+    Rectangle(layer, color=(1, 1, 0), position=(0.1, 0.7), scale=0)
+
+
+def test_batched_layer():
+    """A batched layer looks the same as a normal one"""
+    normal_layer = Layer()
+    build_scene(normal_layer)
+    batched_layer = Layer()
+    batched_layer.batched = True
+    build_scene(batched_layer)
+    assert_similar(render(batched_layer), render(normal_layer))
+
+
+class FakeWindow(object):
+    """Stand-in for a Window, for drawing without OpenGL"""
+    culled_count = 0
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+
+class RecordingObject(GraphicsObject):
+    """Remembers that it was drawn"""
+    def __init__(self, parent, drawn, **kwargs):
+        super(RecordingObject, self).__init__(parent, **kwargs)
+        self.drawn = drawn
+
+    def draw(self, **kwargs):
+        self.drawn.append(self.name)
+
+    def bounds(self):
+        return (0, 0) + self.size
+
+
+def draw_without_gl(layer, window):
+    """Draw a layer using a MatrixTransformation instead of the GL matrix"""
+    layer.do_draw(transformation=MatrixTransformation(), window=window)
+
+
+def test_culling():
+    """Children outside the window are not drawn"""
+    drawn = []
+    window = FakeWindow(100, 100)
+    layer = Layer(scale=(100, 100))
+    RecordingObject(layer, drawn, name='inside', position=(0.5, 0.5))
+    RecordingObject(layer, drawn, name='partial', position=(-0.5, -0.5))
+    RecordingObject(layer, drawn, name='left', position=(-2, 0))
+    RecordingObject(layer, drawn, name='rotated', position=(1.5, 0.5),
+        rotation=180)
+    sublayer = Layer(layer, position=(0, 3))
+    RecordingObject(sublayer, drawn, name='in sublayer')
+    unknown = GraphicsObject(layer, position=(5, 5))
+    unknown.draw = lambda **kwargs: drawn.append('unknown bounds')
+    draw_without_gl(layer, window)
+    assert drawn == ['inside', 'partial', 'rotated', 'unknown bounds']
+    assert window.culled_count == 2
+
+    sublayer.y = 0.5
+    del drawn[:]
+    window.culled_count = 0
+    draw_without_gl(layer, window)
+    assert drawn == ['inside', 'partial', 'rotated', 'in sublayer',
+        'unknown bounds']
+    assert window.culled_count == 1
+
+
+def test_layer_bounds():
+    """A layer's bounds include all of its visible children"""
+    layer = Layer()
+    assert layer.bounds() is None
+    Rectangle(layer, position=(1, 2), size=(3, 4))
+    assert layer.bounds() == (1, 2, 4, 6)
+    Rectangle(Layer(layer, position=(-1, 0)), position=(0, 10))
+    assert layer.bounds() == (-1, 2, 4, 11)
+    hidden = Rectangle(layer, position=(-20, -20))
+    hidden.hidden = True
+    assert layer.bounds() == (-1, 2, 4, 11)
+    GraphicsObject(layer)
+    assert layer.bounds() is None
+
+
+def test_layer_bounds_cache():
+    """Within a frame, layer bounds are cached until something changes"""
+    layer = Layer(anchor=(1, 1))
+    sublayer = Layer(layer)
+    rectangle = Rectangle(sublayer, size=(3, 4))
+    with framecache.frame():
+        assert layer.bounds() == (1, 1, 4, 5)
+        assert layer.bounds() is layer.bounds()
+        rectangle.x = 2
+        assert layer.bounds() == (3, 1, 6, 5)
+        Rectangle(sublayer, position=(-5, 0))
+        assert layer.bounds() == (-4, 1, 6, 5)
+        bounds = sublayer.world_bounds()
+        assert sublayer.world_bounds() is bounds
+
+
+class PointerRecordingRectangle(Rectangle):
+    """Remembers pointer events it gets; is not actually drawn"""
+    def __init__(self, parent, events, **kwargs):
+        super(PointerRecordingRectangle, self).__init__(parent, **kwargs)
+        self.events = events
+
+    def draw(self, **kwargs):
+        pass
+
+    def on_pointer_motion(self, pointer, x, y, z, **kwargs):
+        self.events.append(('motion', self.name))
+        return self.name.endswith('opaque')
+
+    def on_pointer_leave(self, pointer, x, y, z, **kwargs):
+        self.events.append(('leave', self.name))
+
+    def on_pointer_press(self, pointer, x, y, z, button, **kwargs):
+        self.events.append(('press', self.name))
+        return True
+
+
+def pointer_event(layer, kind, x, y, **kwargs):
+    """Send a pointer event to a layer, like a Window would"""
+    transformation = PointTransformation(x, y, 0)
+    with transformation.state:
+        layer.apply_transform(transformation)
+        layer.pointer_event(kind, 'main', x, y, 0,
+            transformation=transformation, **kwargs)
+
+
+def pointer_events_on_grid(use_spatial_index):
+    """Move a pointer around a grid of rectangles, return the events"""
+    events = []
+    layer = Layer(scale=(100, 100))
+    layer.use_spatial_index = use_spatial_index
+    n = 10
+    for x in range(n):
+        for y in range(n):
+            PointerRecordingRectangle(layer, events, scale=(1 / n, 1 / n),
+                position=(x / n, y / n), name='%s,%s' % (x, y))
+    PointerRecordingRectangle(layer, events, name='overlay',
+        position=(0.25, 0.25), size=(0.3, 0.3), rotation=10)
+    PointerRecordingRectangle(layer, events, name='small opaque',
+        position=(0.5, 0.5), size=(0.1, 0.1))
+    for x, y in ((5, 5), (33, 33), (55, 55), (99, 1), (150, 150), (1, 99)):
+        pointer_event(layer, 'motion', x, y)
+        pointer_event(layer, 'press', x, y, button=1)
+    return events
+
+
+def test_spatial_index():
+    """Pointer events with a spatial index are the same as without one"""
+    def _split(events):
+        # The order of "leave" events is not defined
+        return ([e for e in events if e[0] != 'leave'],
+            sorted(e for e in events if e[0] == 'leave'))
+    events = pointer_events_on_grid(True)
+    assert _split(events) == _split(pointer_events_on_grid(False))
+    assert ('motion', 'overlay') in events
+    assert ('motion', '5,5') not in events
+    assert ('leave', 'overlay') in events
+
+
+def test_spatial_index_refresh():
+    """The spatial index is refreshed when children move"""
+    events = []
+    layer = Layer()
+    layer.use_spatial_index = True
+    rectangle = PointerRecordingRectangle(layer, events, name='a')
+    pointer_event(layer, 'press', 0.5, 0.5, button=1)
+    assert events == [('press', 'a')]
+    rectangle.x = 3
+    pointer_event(layer, 'press', 0.5, 0.5, button=1)
+    pointer_event(layer, 'press', 3.5, 0.5, button=1)
+    assert events == [('press', 'a')] * 2
+    PointerRecordingRectangle(layer, events, name='b')
+    pointer_event(layer, 'press', 0.5, 0.5, button=1)
+    assert events == [('press', 'a')] * 2 + [('press', 'b')]
+
+
+class TransformCountingRectangle(PointerRecordingRectangle):
+    """Counts reads of its local_transformation"""
+    reads = 0
+
+    @property
+    def local_transformation(self):
+        TransformCountingRectangle.reads += 1
+        return super(TransformCountingRectangle, self).local_transformation
+
+
+def test_spatial_index_unchanged_children():
+    """Pointer events on an unchanged layer only look at the candidates"""
+    events = []
+    layer = Layer(scale=(100, 100))
+    layer.use_spatial_index = True
+    n = 10
+    for x in range(n):
+        for y in range(n):
+            TransformCountingRectangle(layer, events, scale=(1 / n, 1 / n),
+                position=(x / n, y / n), name='%s,%s' % (x, y))
+    pointer_event(layer, 'motion', 5, 5)
+    TransformCountingRectangle.reads = 0
+    pointer_event(layer, 'motion', 55, 55)
+    pointer_event(layer, 'motion', 56, 57)
+    assert 0 < TransformCountingRectangle.reads <= 4
+    assert ('motion', '5,5') in events
+
+
+def test_spatial_index_animation():
+    """Children are watched while their geometry is being animated"""
+    clock = gillcup.Clock()
+    events = []
+    layer = Layer()
+    layer.use_spatial_index = True
+    rectangle = PointerRecordingRectangle(layer, events, name='a')
+    clock.schedule(gillcup.Animation(rectangle, 'x', 2, time=1))
+    pointer_event(layer, 'press', 0.5, 0.5, button=1)
+    clock.advance(1)
+    pointer_event(layer, 'press', 0.5, 0.5, button=1)
+    pointer_event(layer, 'press', 2.5, 0.5, button=1)
+    assert events == [('press', 'a')] * 2
+    assert layer._spatial_index[2] == []  # pylint: disable=W0212
+
+
+class InfiniteBackground(PointerRecordingRectangle):
+    """Catches pointer events everywhere"""
+    def hit_test(self, _x, _y, _z):
+        return True
+
+    def hit_bounds(self):
+        inf = float('inf')
+        return -inf, -inf, inf, inf
+
+
+def test_spatial_index_infinite_child():
+    """Children with infinite hit bounds are hit-tested one by one"""
+    events = []
+    layer = Layer()
+    layer.use_spatial_index = True
+    InfiniteBackground(layer, events, name='background')
+    PointerRecordingRectangle(layer, events, name='a', position=(2, 2))
+    pointer_event(layer, 'press', 2.5, 2.5, button=1)
+    pointer_event(layer, 'press', 100, 100, button=1)
+    assert events == [('press', 'a'), ('press', 'background')]
+
+
+class TintRecordingObject(GraphicsObject):
+    """Remembers the tint it was drawn with"""
+    def __init__(self, parent, tints, **kwargs):
+        super(TintRecordingObject, self).__init__(parent, **kwargs)
+        self.tints = tints
+
+    def draw(self, tint=None, **kwargs):
+        self.tints.append(tint)
+
+
+def test_tint_accumulation():
+    """Nested TintLayers multiply their color and opacity together"""
+    tints = []
+    layer = Layer()
+    TintRecordingObject(layer, tints)
+    outer = TintLayer(layer, color=(0.5, 1, 1), opacity=0.5)
+    TintRecordingObject(outer, tints)
+    inner = TintLayer(outer, color=(1, 0.5, 0.25), opacity=0.5)
+    TintRecordingObject(inner, tints)
+    draw_without_gl(layer, FakeWindow(100, 100))
+    assert tints == [None, (0.5, 1, 1, 0.5), (0.5, 0.5, 0.25, 0.25)]
+    assert tinted_color((1, 0.5, 0.5), 0.5) == (1, 0.5, 0.5, 0.5)
+    assert tinted_color((1, 0.5, 0.5), 0.5, tints[2]) == (
+        0.5, 0.25, 0.125, 0.125)
+
+
+def build_tinted_scene(layer):
+    """Put non-overlapping rectangles into the given layer"""
+    Rectangle(layer, color=(0.2, 0.3, 0.4), size=(0.4, 0.4))
+    Rectangle(layer, position=(0.5, 0.1), size=(0.4, 0.3), opacity=0.5)
+    Rectangle(Layer(layer, position=(0.1, 0.6)), color=(1, 0.5, 0),
+        size=(0.3, 0.3))
+
+
+def test_tint_layer():
+    """A TintLayer with non-overlapping children looks like an EffectLayer
+    """
+    for batched in False, True:
+        tint_layer = TintLayer(color=(0.5, 1, 0.8), opacity=0.6)
+        tint_layer.batched = batched
+        build_tinted_scene(tint_layer)
+        effect_layer = EffectLayer(color=(0.5, 1, 0.8), opacity=0.6)
+        build_tinted_scene(effect_layer)
+        assert_similar(render(tint_layer), render(effect_layer))
+
+
+def test_cpu_matrix_stack(monkeypatch):
+    """Drawing with the matrix stack on the CPU gives the same picture"""
+    def _render():
+        """Render an assortment of layers"""
+        layer = Layer()
+        build_scene(layer)
+        batched_layer = Layer(layer, position=(0.5, 0), scale=(0.5, 0.5))
+        batched_layer.batched = True
+        build_scene(batched_layer)
+        effect_layer = EffectLayer(layer, position=(0, 0.5),
+            scale=(0.5, 0.5), opacity=0.5)
+        build_scene(effect_layer)
+        deep_layer = Layer(layer, position=(0.5, 0.5))
+        for _ in range(20):
+            deep_layer = Layer(deep_layer, scale=(0.99, 0.99))
+        Rectangle(deep_layer, size=(0.25, 0.25), color=(0, 1, 1))
+        return render(layer)
+
+    expected = _render()
+    monkeypatch.setattr(Window, 'transformation_class', CpuGlTransformation)
+    assert_similar(_render(), expected)
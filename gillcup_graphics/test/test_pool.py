@@ -0,0 +1,99 @@
+"""Tests for the pool of offscreen render targets
+"""
+
+from __future__ import division
+
+from gillcup_graphics.offscreen.pool import FBOPool
+from gillcup_graphics.offscreen.rendertargets import RenderTargetManager
+
+
+class FakeFBO(object):
+    """Stand-in for an FBO that does not need OpenGL"""
+    manager = None
+
+    def __init__(self, width, height, texture_width, texture_height):
+        self.width = width
+        self.height = height
+        self.texture_width = texture_width
+        self.texture_height = texture_height
+        self.nbytes = texture_width * texture_height * 8
+        self.destroyed = False
+        if self.manager:
+            self.manager.register(self)
+
+    def destroy(self):
+        """Mark as destroyed"""
+        if self.manager and not self.destroyed:
+            self.manager.unregister(self)
+        self.destroyed = True
+
+
+def test_bucket():
+    """Sizes are rounded up to the pool's granularity"""
+    pool = FBOPool(factory=FakeFBO, granularity=64)
+    assert pool.bucket(1, 1) == (64, 64)
+    assert pool.bucket(64, 65) == (64, 128)
+    assert pool.bucket(640, 480) == (640, 512)
+
+
+def test_reuse():
+    """Released render targets are reused for sizes in the same bucket"""
+    pool = FBOPool(factory=FakeFBO)
+    first = pool.acquire(100, 100)
+    assert (first.width, first.height) == (100, 100)
+    assert (first.texture_width, first.texture_height) == (128, 128)
+    second = pool.acquire(100, 100)
+    assert second is not first
+    pool.release(first)
+    third = pool.acquire(120, 90)
+    assert third is first
+    assert (third.width, third.height) == (120, 90)
+    pool.release(second)
+    pool.release(third)
+    assert pool.acquire(300, 300) not in (first, second)
+    assert pool.allocated_bytes == 128 * 128 * 8 * 2 + 320 * 320 * 8
+
+
+def test_eviction():
+    """Idle render targets are destroyed when over budget, oldest first"""
+    size = 64 * 64 * 8
+    pool = FBOPool(factory=FakeFBO, budget=size * 2)
+    first, second, third = [pool.acquire(64, 64) for _ in range(3)]
+    assert pool.allocated_bytes == size * 3
+    assert not any(f.destroyed for f in (first, second, third))
+    pool.release(first)
+    assert first.destroyed
+    pool.release(second)
+    pool.release(third)
+    assert not second.destroyed
+    assert pool.allocated_bytes == size * 2
+    pool.evict(0)
+    assert second.destroyed and third.destroyed
+    assert pool.allocated_bytes == 0
+
+
+def test_manager_evicts_idle():
+    """The render target manager can evict idle targets from pools"""
+    size = 64 * 64 * 8
+    manager = RenderTargetManager(limit=size * 2)
+
+    class ManagedFBO(FakeFBO):
+        """FakeFBO tracked by the manager"""
+        pass
+    ManagedFBO.manager = manager
+
+    pools = [FBOPool(factory=ManagedFBO) for _ in range(2)]
+    first = pools[0].acquire(64, 64)
+    second = pools[1].acquire(64, 64)
+    pools[0].release(first)
+    pools[1].release(second)
+    assert manager.allocated_bytes == size * 2
+    third = pools[1].acquire(64, 64)
+    assert third is second
+    fourth = pools[1].acquire(64, 64)
+    assert first.destroyed
+    assert pools[0].idle == []
+    assert pools[0].allocated_bytes == 0
+    assert not any(f.destroyed for f in (second, fourth))
+    assert manager.allocated_bytes == size * 2
+    assert manager.peak_bytes == size * 3
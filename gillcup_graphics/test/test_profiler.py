@@ -0,0 +1,99 @@
+"""Tests for the draw-time profiler
+"""
+
+from __future__ import division
+
+from pytest import raises
+
+from gillcup_graphics import GraphicsObject, Layer
+from gillcup_graphics.profiler import Histogram, Profiler, monotonic_clock
+from gillcup_graphics.test.test_layer import (FakeWindow, RecordingObject,
+    draw_without_gl)
+
+
+def test_monotonic_clock():
+    """The clock never goes backwards"""
+    times = [monotonic_clock() for dummy in range(1000)]
+    assert times == sorted(times)
+
+
+def test_histogram_percentiles():
+    """Percentiles are accurate to the histogram's resolution"""
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    assert histogram.mean is None
+    for i in range(1, 1001):
+        histogram.add(i / 1000)
+    assert histogram.count == 1000
+    assert abs(histogram.mean - 0.5005) < 1e-9
+    assert histogram.maximum == 1
+    for percent in 50, 95, 99:
+        assert abs(histogram.percentile(percent) / (percent / 100) - 1) < 0.05
+    assert histogram.percentile(100) == 1
+    histogram.add(0)
+    assert histogram.percentile(0) < 1e-6
+
+
+def make_fake_clock():
+    """Return a clock that advances by one second each time it's read"""
+    times = iter(range(1000))
+    return lambda: times.next()
+
+
+def test_profiler():
+    """Inclusive and exclusive times are recorded per object and class"""
+    window = FakeWindow(100, 100)
+    layer = Layer(scale=(100, 100))
+    first = RecordingObject(layer, [])
+    second = RecordingObject(layer, [])
+    profiler = Profiler(clock=make_fake_clock())
+    assert not profiler.enabled
+    profiler.enable()
+    try:
+        assert profiler.enabled
+        draw_without_gl(layer, window)
+    finally:
+        profiler.disable()
+    assert GraphicsObject.draw_hooks == ()
+    # layer enters at 0, first takes 1..2, second 3..4, layer exits at 5
+    layer_stats = profiler.stats_for(layer)
+    assert layer_stats.inclusive.total == 5
+    assert layer_stats.exclusive.total == 3
+    assert profiler.stats_for(first).inclusive.total == 1
+    assert profiler.stats_for(second).exclusive.total == 1
+    assert profiler.class_stats[RecordingObject].count == 2
+    assert profiler.class_stats[RecordingObject].exclusive.total == 2
+    assert profiler.class_stats[Layer].count == 1
+
+    report = profiler.report().splitlines()
+    assert len(report) == 3
+    assert report[0].split()[:3] == ['class', 'draws', 'excl.']
+    assert report[1].split()[:3] == ['Layer', '1', '3000.000']
+
+    # Nothing is recorded when disabled
+    draw_without_gl(layer, window)
+    assert profiler.stats_for(layer).count == 1
+    profiler.reset()
+    assert profiler.stats_for(layer) is None
+
+
+def test_profiler_exception():
+    """A failed draw does not leave the profiler in a bad state"""
+    window = FakeWindow(100, 100)
+    layer = Layer(scale=(100, 100))
+    broken = GraphicsObject(layer)
+
+    def _fail(**kwargs):
+        raise ValueError('draw failed')
+    broken.draw = _fail
+    profiler = Profiler(clock=make_fake_clock())
+    profiler.enable()
+    try:
+        with raises(ValueError):
+            draw_without_gl(layer, window)
+        broken.hidden = True
+        draw_without_gl(layer, window)
+    finally:
+        profiler.disable()
+    assert profiler.stats_for(layer).count == 2
+    assert profiler.stats_for(layer).inclusive.total == 3 + 1
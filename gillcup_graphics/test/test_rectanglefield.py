@@ -0,0 +1,102 @@
+"""Tests for the RectangleField class
+"""
+
+from __future__ import division
+
+from pytest import raises, skip
+
+try:
+    import numpy  # pylint: disable=F0401
+except ImportError:
+    raise skip('no numpy')
+
+import gillcup
+
+from gillcup_graphics import Layer, Rectangle, RectangleField
+
+from gillcup_graphics.test.test_layer import render, assert_similar
+
+
+def make_field(parent=None):
+    """Make a field with three rectangles"""
+    return RectangleField(parent, 3,
+        positions=[(0, 0), (1, 1), (0.5, 0)],
+        sizes=[(1, 1), (2, 1), (1, 2)],
+        rotations=[0, 0, 90],
+        colors=[(1, 0, 0), (0, 1, 0), (0, 0, 1)],
+        opacities=[1, 0.5, 0.8])
+
+
+def test_defaults():
+    """Arrays have the right shape and default values"""
+    field = RectangleField(None, 5)
+    assert field.count == 5
+    assert field.positions.shape == (5, 2)
+    assert (field.sizes == 1).all()
+    assert (field.rotations == 0).all()
+    assert field.colors.shape == (5, 3)
+    assert (field.opacities == 1).all()
+
+
+def test_shape_validation():
+    """Arrays that don't match the count are rejected"""
+    field = make_field()
+    with raises(ValueError):
+        field.positions = numpy.zeros((2, 2))
+    with raises(ValueError):
+        field.colors = numpy.ones((3, 4))
+    with raises(ValueError):
+        field.opacities = numpy.ones((3, 1))
+    with raises(ValueError):
+        RectangleField(None, 2, sizes=[(1, 1)] * 3)
+    clock = gillcup.Clock()
+    with raises(ValueError):
+        clock.schedule(gillcup.Animation(field, 'rotations', numpy.zeros(4)))
+        clock.advance(1)
+    field = RectangleField(None, 3, opacities=0.5, positions=[(0, 0)] * 3)
+    assert field.opacities.shape == (3, )
+    assert (field.opacities == 0.5).all()
+
+
+def test_hit_test_indices():
+    """Hit tests return indices of hit rectangles, topmost first"""
+    field = make_field()
+    assert list(field.hit_test_indices(0.7, 0.5)) == [0]
+    assert list(field.hit_test_indices(1.5, 1.5)) == [1]
+    assert list(field.hit_test_indices(-0.5, 0.5)) == [2]
+    assert list(field.hit_test_indices(0.2, 0.9)) == [2, 0]
+    assert list(field.hit_test_indices(5, 5)) == []
+    assert field.hit_test(0.7, 0.5, 0)
+    assert not field.hit_test(5, 5, 0)
+
+
+def test_bounds():
+    """The bounds cover all rectangles"""
+    field = make_field()
+    assert numpy.allclose(field.bounds(), (-1.5, 0, 3, 2))
+    assert RectangleField(None, 0).bounds() is None
+
+
+def test_column_animation():
+    """Whole columns can be animated"""
+    clock = gillcup.Clock()
+    field = make_field()
+    clock.schedule(gillcup.Animation(field, 'opacities', numpy.zeros(3),
+        time=2))
+    clock.advance(1)
+    assert numpy.allclose(field.opacities, [0.5, 0.25, 0.4])
+    clock.advance(1)
+    assert numpy.allclose(field.opacities, 0)
+
+
+def test_rendering():
+    """A field looks the same as the corresponding Rectangles"""
+    field_layer = Layer(scale=(0.25, 0.25))
+    make_field(field_layer)
+    rectangles_layer = Layer(scale=(0.25, 0.25))
+    field = make_field()
+    for i in range(field.count):
+        Rectangle(rectangles_layer, position=field.positions[i],
+            size=field.sizes[i], rotation=field.rotations[i],
+            color=field.colors[i], opacity=field.opacities[i])
+    assert_similar(render(field_layer), render(rectangles_layer))
@@ -0,0 +1,69 @@
+"""Tests for the offline renderer
+"""
+
+from __future__ import division
+
+import os
+
+import gillcup
+from pytest import raises
+
+from gillcup_graphics import Layer, Rectangle
+from gillcup_graphics import render
+from gillcup_graphics.render import (resolve, split_frames, render_frames,
+    worker_command)
+
+
+def make_scene(clock):
+    """A rectangle that moves across the picture in one second"""
+    layer = Layer()
+    rectangle = Rectangle(layer, size=(0.5, 1))
+    clock.schedule(gillcup.Animation(rectangle, 'x', 0.5, time=1))
+    return layer
+
+
+def test_resolve():
+    """Scene functions are found by name"""
+    assert resolve('gillcup_graphics.test.test_render:make_scene') is (
+        make_scene)
+    with raises(ValueError):
+        resolve('gillcup_graphics.test.test_render')
+
+
+def test_split_frames():
+    """Frames are split into contiguous chunks of nearly equal size"""
+    assert split_frames(0, 10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert split_frames(5, 7, 4) == [(5, 6), (6, 7)]
+    assert split_frames(5, 5, 4) == []
+    assert split_frames(0, 100, 1) == [(0, 100)]
+
+
+def test_worker_command(monkeypatch):
+    """Worker command lines are parsed back into the same render job"""
+    calls = []
+    monkeypatch.setattr(render, 'render',
+        lambda *args, **kwargs: calls.append((args, kwargs)))
+    command = worker_command('a:b', 10, 20, fps=25, width=30, height=40,
+        output='x{0}.png')
+    render.main(command[3:])
+    assert calls == [(('a:b', 10, 20), dict(processes=1, chunks=None,
+        fps=25, width=30, height=40, output='x{0}.png'))]
+
+
+def test_render_frames(tmpdir):
+    """Frames are rendered at the right times and saved"""
+    output = str(tmpdir.join('out', 'frame{0:02d}.png'))
+    render_frames(make_scene, 8, 12, fps=10, width=40, height=20,
+        output=output)
+    assert sorted(os.listdir(str(tmpdir.join('out')))) == [
+        'frame08.png', 'frame09.png', 'frame10.png', 'frame11.png']
+
+
+def test_video_format():
+    """Video output is chosen by the output name"""
+    assert render.video_format('-') == 'y4m'
+    assert render.video_format('out{0}.y4m') == 'y4m'
+    assert render.video_format('out.rgba') == 'rgba'
+    assert render.video_format('frame{0:05d}.png') is None
+    with raises(ValueError):
+        render.render('a:b', 0, 10, processes=2, output='out.y4m')
@@ -0,0 +1,64 @@
+"""Tests for render target memory accounting
+"""
+
+from __future__ import division
+
+from gillcup_graphics.offscreen.rendertargets import RenderTargetManager
+
+
+class Target(object):
+    """A render target stand-in"""
+    def __init__(self, manager, nbytes):
+        self.manager = manager
+        self.nbytes = nbytes
+        self.destroyed = False
+        manager.register(self)
+
+    def destroy(self):
+        """Unregister from the manager"""
+        self.manager.unregister(self)
+        self.destroyed = True
+
+
+def test_usage():
+    """Current and peak usage are tracked"""
+    manager = RenderTargetManager()
+    first = Target(manager, 100)
+    second = Target(manager, 50)
+    assert manager.allocated_bytes == 150
+    assert manager.target_count == 2
+    first.destroy()
+    assert manager.allocated_bytes == 50
+    assert manager.peak_bytes == 150
+    manager.reset_peak()
+    assert manager.peak_bytes == 50
+    second.destroy()
+    second.destroy()
+    assert manager.allocated_bytes == 0
+    assert manager.target_count == 0
+
+
+def test_lru_eviction():
+    """Least recently used evictable targets are evicted to meet the limit"""
+    manager = RenderTargetManager(limit=300)
+
+    def evict(target):
+        """Free the target"""
+        target.destroy()
+    first, second, third = [Target(manager, 100) for _ in range(3)]
+    in_use = Target(manager, 100)
+    assert manager.allocated_bytes == 400
+    for target in first, second, third:
+        manager.set_evictable(target, evict)
+    assert first.destroyed
+    assert manager.allocated_bytes == 300
+    manager.touch(second)
+    fifth = Target(manager, 100)
+    assert third.destroyed
+    assert not second.destroyed
+    manager.set_evictable(second, None)
+    Target(manager, 100)
+    assert not second.destroyed
+    assert not in_use.destroyed and not fifth.destroyed
+    assert manager.allocated_bytes == 400
+    assert manager.peak_bytes == 400
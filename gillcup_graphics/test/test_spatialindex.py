@@ -0,0 +1,50 @@
+"""Tests for the spatialindex module
+"""
+
+from __future__ import division
+
+from gillcup_graphics.spatialindex import GridIndex
+
+
+def test_empty_index():
+    """An empty index returns nothing"""
+    assert GridIndex([]).query(0, 0) == []
+
+
+def test_grid_index():
+    """Queries return boxes containing the point, topmost first"""
+    index = GridIndex([
+        (0, 0, 1, 1),
+        (1, 0, 2, 1),
+        (0, 1, 1, 2),
+        (0.5, 0.5, 1.5, 1.5),
+        (-10, -10, 10, 10),
+    ])
+    assert index.query(0.2, 0.2) == [4, 0]
+    assert index.query(0.7, 0.7) == [4, 3, 0]
+    assert index.query(1.7, 0.2) == [4, 1]
+    assert index.query(-5, -5) == [4]
+    assert index.query(20, 20) == []
+
+
+def test_unbounded_items():
+    """Items with unknown extent are always returned"""
+    index = GridIndex([None, (0, 0, 1, 1), None])
+    assert index.query(0.5, 0.5) == [2, 1, 0]
+    assert index.query(5, 5) == [2, 0]
+
+
+def test_degenerate_boxes():
+    """Zero-sized boxes are handled"""
+    index = GridIndex([(1, 1, 1, 1), (1, 1, 1, 1)])
+    assert index.query(1, 1) == [1, 0]
+    assert index.query(2, 1) == []
+
+
+def test_infinite_boxes():
+    """Boxes that are not finite are treated as having unknown extent"""
+    inf = float('inf')
+    nan = float('nan')
+    index = GridIndex([(0, 0, 1, 1), (-inf, 0, inf, 1), (nan, 0, 1, 1)])
+    assert index.query(0.5, 0.5) == [2, 1, 0]
+    assert index.query(5, 5) == [2, 1]
@@ -0,0 +1,144 @@
+"""Tests for timeline tracing
+"""
+
+from __future__ import division
+
+import json
+
+import pyglet
+
+from gillcup_graphics import GraphicsObject, Layer, RealtimeClock
+from gillcup_graphics import tracing
+from gillcup_graphics.profiler import Profiler
+from gillcup_graphics.tracing import Tracer
+from gillcup_graphics.test.test_layer import (FakeWindow, RecordingObject,
+    draw_without_gl)
+from gillcup_graphics.test.test_profiler import make_fake_clock
+
+
+def test_spans():
+    """Nested spans are recorded when they end"""
+    tracer = Tracer(clock=make_fake_clock())
+    with tracing.span('ignored', 'test'):
+        pass
+    tracer.enable()
+    try:
+        assert tracing.active_tracer is tracer
+        with tracing.span('outer', 'test', value=3):
+            with tracing.span('inner', 'test'):
+                pass
+    finally:
+        tracer.disable()
+    assert tracing.active_tracer is None
+    assert [event[:4] for event in tracer.events] == [
+        ('inner', 'test', 1, 1), ('outer', 'test', 0, 3)]
+    assert tracer.events[1][5] == {'value': 3}
+
+
+def test_ring_buffer():
+    """Only the latest spans are kept"""
+    tracer = Tracer(buffer_size=3, clock=make_fake_clock())
+    for i in range(5):
+        with tracer.span(str(i), 'test'):
+            pass
+    assert [event[0] for event in tracer.events] == ['2', '3', '4']
+    tracer.clear()
+    assert not tracer.events
+
+
+def test_draw_spans():
+    """Drawing objects is traced, and an enabled profiler keeps working"""
+    layer = Layer(scale=(100, 100), name='root')
+    RecordingObject(layer, [])
+    profiler = Profiler()
+    profiler.enable()
+    tracer = Tracer(clock=make_fake_clock())
+    tracer.enable()
+    try:
+        draw_without_gl(layer, FakeWindow(100, 100))
+    finally:
+        tracer.disable()
+        assert GraphicsObject.draw_hooks == (profiler, )
+        profiler.disable()
+    assert [event[:4] for event in tracer.events] == [
+        ('RecordingObject', 'draw', 1, 1), ('root', 'draw', 0, 3)]
+    assert profiler.stats_for(layer).count == 1
+
+
+def test_tracer_and_profiler_independent():
+    """Enabling and disabling a tracer and a profiler don't interfere"""
+    layer = Layer(scale=(100, 100))
+    profiler = Profiler()
+    tracer = Tracer()
+    try:
+        profiler.enable()
+        tracer.enable()
+        profiler.disable()
+        assert not profiler.enabled
+        assert tracer.enabled
+        draw_without_gl(layer, FakeWindow(100, 100))
+        assert profiler.stats_for(layer) is None
+        assert len(tracer.events) == 1
+        tracer.disable()
+        assert not profiler.enabled
+
+        tracer.enable()
+        profiler.enable()
+        draw_without_gl(layer, FakeWindow(100, 100))
+        assert profiler.stats_for(layer).count == 1
+        assert len(tracer.events) == 2
+    finally:
+        tracer.disable()
+        profiler.disable()
+    assert GraphicsObject.draw_hooks == ()
+
+
+def test_clock_spans():
+    """Advancing a RealtimeClock is traced"""
+    clock = RealtimeClock()
+    pyglet.clock.unschedule(clock.advance)
+    tracer = Tracer()
+    tracer.enable()
+    try:
+        clock.advance(0.5)
+    finally:
+        tracer.disable()
+    assert clock.time == 0.5
+    assert [event[:2] for event in tracer.events] == [
+        ('RealtimeClock.advance', 'clock')]
+
+
+def test_dump(tmpdir):
+    """Spans are written as Chrome trace JSON"""
+    tracer = Tracer(clock=make_fake_clock())
+    with tracer.span('frame', 'test', number=1):
+        pass
+    filename = str(tmpdir.join('trace.json'))
+    tracer.dump(filename)
+    with open(filename) as trace_file:
+        trace = json.load(trace_file)
+    events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert len(events) == 1
+    [event] = events
+    assert event['name'] == 'frame'
+    assert event['cat'] == 'test'
+    assert event['ts'] == 0
+    assert event['dur'] == 1e6
+    assert event['args'] == {'number': 1}
+    assert set(event) == set(['name', 'cat', 'ph', 'ts', 'dur', 'pid', 'tid',
+        'args'])
+
+
+def test_window_spans():
+    """Frames drawn by a window are traced"""
+    from gillcup_graphics.mainwindow import Window
+    window = Window(Layer(), width=20, height=20, visible=False)
+    tracer = Tracer()
+    tracer.enable()
+    try:
+        window.manual_draw()
+    finally:
+        tracer.disable()
+        window.close()
+    assert [event[:2] for event in tracer.events] == [
+        ('Layer', 'draw'), ('Window.on_draw', 'frame')]
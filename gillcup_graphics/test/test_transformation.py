@@ -5,8 +5,10 @@ from __future__ import division
 
 import math
 
+from pytest import raises, importorskip
+
 from gillcup_graphics.transformation import (MatrixTransformation,
-    PointTransformation)
+    PointTransformation, invert_matrix)
 
 
 def almost_equal(a, b):
@@ -402,3 +404,35 @@ def test_transform_point(matrix):
     assert sequences_almost_equal(matrix.transform_point(1, 0, 1), (2, 2, 4))
     assert sequences_almost_equal(matrix.transform_point(1, 1, 0), (2, 3, 3))
     assert sequences_almost_equal(matrix.transform_point(2, 3, 4), (3, 5, 7))
+
+
+def test_transform_points(matrix):
+    """Test transforming arrays of points"""
+    numpy = importorskip('numpy')
+    distort(matrix)
+    points = [(1, 1, 1), (0, 1, 1), (2, 3, 4), (-5, 80, 3.2)]
+    result = matrix.transform_points(points)
+    assert result.shape == (4, 3)
+    for point, transformed in zip(points, result):
+        assert sequences_almost_equal(transformed,
+            matrix.transform_point(*point))
+    assert numpy.allclose(matrix.forward_transform_points(result), points)
+    assert matrix.transform_points(numpy.empty((0, 3))).shape == (0, 3)
+    with raises(ValueError):
+        matrix.transform_points([1, 2, 3])
+
+
+def test_inverse_cache(matrix):
+    """The inverse is reused until the matrix changes, even across push/pop
+    """
+    distort(matrix)
+    inverse = matrix.inverse
+    assert matrix.inverse is inverse
+    with matrix.state:
+        matrix.translate(1, 2, 3)
+        assert matrix.inverse is not inverse
+        assert sequences_almost_equal(matrix.inverse,
+            invert_matrix(matrix.matrix))
+    assert matrix.inverse is inverse
+    matrix.reset()
+    assert matrix.inverse == MatrixTransformation.identity
@@ -0,0 +1,195 @@
+"""Timeline tracing, for viewing in the Chrome trace viewer
+
+When a frame takes too long, it helps to see what happened in it and in
+what order. An enabled :class:`Tracer` records *spans* -- named intervals
+of time -- for:
+
+* :meth:`Window.on_draw <gillcup_graphics.Window.on_draw>` (category
+  ``frame``)
+* :meth:`GraphicsObject.do_draw <gillcup_graphics.GraphicsObject.do_draw>`
+  (``draw``)
+* the offscreen rendering and blitting of an
+  :class:`~gillcup_graphics.EffectLayer` (``effect``)
+* :meth:`RealtimeClock.advance <gillcup_graphics.RealtimeClock.advance>`,
+  which runs the scheduled animations and actions (``clock``)
+* :meth:`Window.pointer_event <gillcup_graphics.Window.pointer_event>`
+  (``input``)
+
+Other code can add its own spans with :func:`span`.
+
+Spans are kept in a ring buffer, so a tracer can be left running, and
+only the latest spans are kept. :meth:`Tracer.dump` writes them in the
+Chrome trace event format, which can be loaded into ``chrome://tracing``,
+Perfetto (https://ui.perfetto.dev) and other trace viewers::
+
+    tracer = Tracer()
+    tracer.enable()
+    ...
+    tracer.dump('frames.json')
+
+Spans for ``do_draw`` are recorded by registering the tracer as a
+:class:`~gillcup_graphics.objects.DrawHook`, so it works alongside an
+enabled :class:`~gillcup_graphics.profiler.Profiler`.
+When no tracer is enabled, :func:`span` returns a shared do-nothing object.
+"""
+
+from __future__ import division
+
+import collections
+import json
+import os
+
+try:
+    from thread import get_ident
+except ImportError:  # pragma: no cover
+    from threading import get_ident  # pylint: disable=E0611
+
+from gillcup_graphics.objects import DrawHook, GraphicsObject
+from gillcup_graphics.profiler import monotonic_clock
+
+# The enabled Tracer, or None
+active_tracer = None
+
+
+class _NullSpan(object):
+    """Context manager that does nothing, used when tracing is off"""
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+_null_span = _NullSpan()
+
+
+class _Span(object):
+    """Context manager that records a span with the given tracer"""
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.tracer.begin(self.name, self.category, self.args)
+
+    def __exit__(self, *exc_info):
+        self.tracer.end()
+
+
+def span(name, category, **args):
+    """Return a context manager that records a span with the active tracer
+
+    :param name: The name of the span
+    :param category: The category of the span, for filtering in the viewer
+    :param args: Extra values shown in the viewer
+
+    If no tracer is enabled, nothing is recorded.
+    """
+    tracer = active_tracer
+    if tracer is None:
+        return _null_span
+    else:
+        return _Span(tracer, name, category, args)
+
+
+class Tracer(DrawHook):
+    """Records spans into a ring buffer
+
+    :param buffer_size: The maximum number of spans to keep; older spans are
+        dropped
+    :param clock: A function returning the current time in seconds; by
+        default, :func:`~gillcup_graphics.profiler.monotonic_clock`
+
+    .. attribute:: events
+
+        A deque of the recorded spans, as ``(name, category, start,
+        duration, thread_id, args)`` tuples, in the order they ended
+    """
+    def __init__(self, buffer_size=100000, clock=monotonic_clock):
+        self.events = collections.deque(maxlen=buffer_size)
+        self.clock = clock
+        self._stack = []
+
+    @property
+    def enabled(self):
+        """True if this tracer is recording"""
+        return active_tracer is self
+
+    def enable(self):
+        """Start recording (and stop any other enabled tracer)"""
+        global active_tracer  # pylint: disable=W0603
+        if active_tracer is self:
+            return
+        if active_tracer is not None:
+            active_tracer.disable()
+        self._stack = []
+        GraphicsObject.add_draw_hook(self)
+        active_tracer = self
+
+    def disable(self):
+        """Stop recording"""
+        global active_tracer  # pylint: disable=W0603
+        if self.enabled:
+            GraphicsObject.remove_draw_hook(self)
+            active_tracer = None
+
+    def clear(self):
+        """Forget all recorded spans"""
+        self.events.clear()
+
+    def begin(self, name, category, args=None):
+        """Start a span; it ends with the next call to :meth:`end`"""
+        self._stack.append((name, category, args, self.clock()))
+
+    def end(self):
+        """End the most recently started span"""
+        end = self.clock()
+        try:
+            name, category, args, start = self._stack.pop()
+        except IndexError:
+            # Enabled in the middle of a span
+            return
+        self.events.append(
+            (name, category, start, end - start, get_ident(), args))
+
+    def span(self, name, category, **args):
+        """Return a context manager that records a span (see :func:`span`)
+        """
+        return _Span(self, name, category, args)
+
+    def enter(self, obj):
+        """Start a span for drawing an object (called by do_draw)"""
+        self.begin(obj.name or type(obj).__name__, 'draw')
+
+    def exit(self, obj):
+        """End the span for drawing an object (called by do_draw)"""
+        self.end()
+
+    def trace_events(self):
+        """Return the recorded spans as a list of Chrome trace events"""
+        pid = os.getpid()
+        result = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+            'args': {'name': 'gillcup_graphics'}}]
+        for name, category, start, duration, thread_id, args in self.events:
+            event = {'name': name, 'cat': category, 'ph': 'X',
+                'ts': start * 1e6, 'dur': duration * 1e6,
+                'pid': pid, 'tid': thread_id}
+            if args:
+                event['args'] = args
+            result.append(event)
+        return result
+
+    def dump(self, destination):
+        """Write the recorded spans as Chrome trace JSON
+
+        :param destination: A file name, or a file-like object opened for
+            writing
+        """
+        trace = {'traceEvents': self.trace_events(),
+            'displayTimeUnit': 'ms'}
+        if hasattr(destination, 'write'):
+            json.dump(trace, destination)
+        else:
+            with open(destination, 'w') as trace_file:
+                json.dump(trace, trace_file)
@@ -11,8 +11,11 @@ While ``premultiply`` is the most general, the other methods are more
 straightforward to use and often much faster.
 
 For drawing, a GlTransformation object, which will update the OpenGL state
-directly, is passed to the method. For hit tests and mouse events, a
-PointTransformation is used.
+directly, is passed to the method. Alternatively, a CpuGlTransformation keeps
+the matrix stack in Python, and only sends the resulting matrix to OpenGL
+when something is drawn. Drawing code must call the transformation's
+``load`` method before issuing OpenGL drawing commands.
+For hit tests and mouse events, a PointTransformation is used.
 
 Each transformation object implements a stack modeled on the OpenGL matrix
 stack: any state can be saved with ``push``, and the last-pushed state
@@ -33,6 +36,11 @@ import contextlib
 
 from pyglet import gl
 
+try:
+    import numpy  # pylint: disable=F0401
+except ImportError:  # pragma: no cover
+    numpy = None
+
 tau = 2 * pi
 deg_to_rad = tau / 360
 
@@ -68,6 +76,15 @@ class BaseTransformation(object):
         """Restore matrix saved by the corresponding push() call"""
         raise NotImplementedError
 
+    def load(self):
+        """Make sure OpenGL uses the current matrix
+
+        Drawing code must call this before issuing OpenGL drawing commands.
+        It does nothing for transformations that are not backed by a CPU-side
+        matrix stack.
+        """
+        pass
+
     def premultiply(self, values):
         """Premultiply the given matrix to self, in situ
 
@@ -150,7 +167,7 @@ class GlTransformation(BaseTransformation):
             gl.glScalef(x, y, z)
 
     def premultiply(self, values):
-        gl.glMultMatrixf(*values)
+        gl.glMultMatrixf((gl.GLfloat * 16)(*values))
 
 
 class PointTransformation(BaseTransformation):
@@ -198,50 +215,37 @@ class PointTransformation(BaseTransformation):
             super(PointTransformation, self).rotate(angle, x, y, z)
 
     def premultiply(self, values):
-        (xx, yx, zx, dummy,
-         xy, yy, zy, dummy,
-         xz, yz, zz, dummy,
-         x1, y1, z1, dummy) = values
+        try:
+            if isinstance(values, MatrixTransformation):
+                # Use the (cached) inverse matrix directly
+                inverse = values.inverse
+            else:
+                # Plain sequences are usually made for a single call (as in
+                # rotate), so their inverse is not cached
+                inverse = invert_matrix(values)
+        except ValueError:
+            raise ZeroDivisionError('Matrix can not be inverted')
+        (m1_0, m1_1, m1_2, _m1_3,
+         m1_4, m1_5, m1_6, _m1_7,
+         m1_8, m1_9, m1_10, _m1_11,
+         m1_12, m1_13, m1_14, _m1_15,
+        ) = inverse
         x, y, z = self.point
-
-        # calculate the dot product, [x y z 1] · invert(matrix)
-        # Don't we all love matrices?
         self.point = (
-                (-xy * (yz * z1 - y1 * zz) + yy * (xz * z1 - x1 * zz) -
-                (xz * y1 - x1 * yz) * zy) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                (x * (yy * zz - yz * zy)) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                (y * (xz * zy - xy * zz)) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                ((xy * yz - xz * yy) * z) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx),
-
-                (xx * (yz * z1 - y1 * zz) - yx * (xz * z1 - x1 * zz) +
-                (xz * y1 - x1 * yz) * zx) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                (x * (yz * zx - yx * zz)) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                (y * (xx * zz - xz * zx)) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                ((xz * yx - xx * yz) * z) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx),
-
-                (-xx * (yy * z1 - y1 * zy) + yx * (xy * z1 - x1 * zy) -
-                (xy * y1 - x1 * yy) * zx) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                (x * (yx * zy - yy * zx)) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                (y * (xy * zx - xx * zy)) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx) +
-                ((xx * yy - xy * yx) * z) / (xx * (yy * zz - yz * zy) +
-                yx * (xz * zy - xy * zz) + (xy * yz - xz * yy) * zx),
+                x * m1_0 + y * m1_4 + z * m1_8 + m1_12,
+                x * m1_1 + y * m1_5 + z * m1_9 + m1_13,
+                x * m1_2 + y * m1_6 + z * m1_10 + m1_14,
             )
 
 
 class MatrixTransformation(BaseTransformation):
     """A Transformation with a full, queryable result matrix.
+
+    The :attr:`inverse` is computed when first needed, and reused until the
+    matrix changes (it is also saved and restored by push() and pop()).
     """
+    _inverse = None
+
     def __init__(self):
         super(MatrixTransformation, self).__init__()
         self.matrix = self.identity
@@ -275,12 +279,14 @@ class MatrixTransformation(BaseTransformation):
         self.matrix = self.identity
 
     def push(self):
-        self.stack.append(self.matrix)
+        self.stack.append((self.matrix, self._inverse))
 
     def pop(self):
-        self.matrix = self.stack.pop()
+        self.matrix, self._inverse = self.stack.pop()
 
     def premultiply(self, values):
+        if isinstance(values, MatrixTransformation):
+            values = values.matrix
         (m1_0, m1_1, m1_2, m1_3,
          m1_4, m1_5, m1_6, m1_7,
          m1_8, m1_9, m1_10, m1_11,
@@ -336,64 +342,143 @@ class MatrixTransformation(BaseTransformation):
                 x * m1_2 + y * m1_6 + z * m1_10 + m1_14,
             )
 
-    @property
-    def inverse(self):
-        """The inverse (matrix with the opposite effect) of this matrix.
+    def transform_points(self, points):
+        """Return the given vectors multiplied by this matrix
 
-        N.B. Only works with transformation martices (ones where the last
-        column is identity)
+        The batch version of :meth:`transform_point`: the matrix is inverted
+        only once, and all points are transformed by a single matrix
+        multiplication. Requires NumPy.
+
+        :param points: An array (or array-like) of shape (N, 3)
 
-        Returns a 16-element iterable
+        Returns a NumPy array of shape (N, 3)
         """
-        (i0, i1, i2, i3,
-         i4, i5, i6, i7,
-         i8, i9, i10, i11,
-         i12, i13, i14, i15,
-        ) = self.matrix
+        return _multiply_points(points, self.inverse)
+
+    def forward_transform_points(self, points):
+        """Return the given vectors transformed in the opposite direction
 
-        negpos = [0, 0]
-        temp = i0 * i5 * i10
-        negpos[temp > 0] += temp
+        This undoes :meth:`transform_points`: it maps points given in the
+        transformed coordinate system back into the original one, using the
+        matrix itself rather than its inverse. Requires NumPy.
 
-        temp = i1 * i6 * i8
-        negpos[temp > 0] += temp
+        :param points: An array (or array-like) of shape (N, 3)
 
-        temp = i2 * i4 * i9
-        negpos[temp > 0] += temp
+        Returns a NumPy array of shape (N, 3)
+        """
+        return _multiply_points(points, self.matrix)
+
+    @property
+    def inverse(self):
+        """The inverse (matrix with the opposite effect) of this matrix.
 
-        temp = -i2 * i5 * i8
-        negpos[temp > 0] += temp
+        N.B. Only works with transformation martices (ones where the last
+        column is identity)
 
-        temp = -i1 * i4 * i10
-        negpos[temp > 0] += temp
+        Returns a 16-element tuple
+        """
+        # The matrix is an immutable tuple that is replaced on every change,
+        # so the cache is valid as long as it was computed for the same one
+        matrix = self.matrix
+        cached = self._inverse
+        if cached is None or cached[0] is not matrix:
+            cached = self._inverse = matrix, invert_matrix(matrix)
+        return cached[1]
+
+
+class CpuGlTransformation(MatrixTransformation):
+    """OpenGL implementation with the matrix stack kept on the CPU
+
+    The transformations and the stack are handled like in
+    :class:`MatrixTransformation`, without any OpenGL calls. The current
+    matrix is uploaded with a single ``glLoadMatrixf`` call in :meth:`load`,
+    and only if it changed since the last upload.
+
+    Unlike :class:`GlTransformation`, this does not limit the depth of the
+    scene graph to the size of the OpenGL matrix stack.
+    The OpenGL matrix is assumed to be left alone by other code, and
+    :meth:`reset` does not load the identity right away; call :meth:`load`
+    after drawing to leave OpenGL with the reset matrix.
+    """
+    _loaded = None
 
-        temp = -i0 * i6 * i9
-        negpos[temp > 0] += temp
+    def load(self):
+        matrix = self.matrix
+        if matrix is not self._loaded:
+            gl.glLoadMatrixf((gl.GLfloat * 16)(*matrix))
+            self._loaded = matrix
 
-        det_1 = negpos[0] + negpos[1]
 
-        if (det_1 == 0) or (abs(det_1 / (negpos[1] - negpos[0])) <
-                (2 * 0.00000000000000001)):
-            raise ValueError("Matrix can not be inverted")
+def _multiply_points(points, matrix):
+    """Multiply an (N, 3) array of points by an affine 16-element matrix"""
+    if numpy is None:
+        raise RuntimeError('Transforming point arrays needs NumPy')
+    points = numpy.asarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[1] != 3:
+        raise ValueError('Expected an array of shape (N, 3), got {0}'.format(
+            points.shape))
+    matrix = numpy.array(matrix, dtype=float).reshape(4, 4)
+    return numpy.dot(points, matrix[:3, :3]) + matrix[3, :3]
 
-        det_1 = 1 / det_1
 
-        m = [(i5 * i10 - i6 * i9) * det_1,
-            -(i1 * i10 - i2 * i9) * det_1,
-             (i1 * i6 - i2 * i5) * det_1,
-            0,
-            -(i4 * i10 - i6 * i8) * det_1,
-             (i0 * i10 - i2 * i8) * det_1,
-            -(i0 * i6 - i2 * i4) * det_1,
-            0,
-             (i4 * i9 - i5 * i8) * det_1,
-            -(i0 * i9 - i1 * i8) * det_1,
-             (i0 * i5 - i1 * i4) * det_1,
-            0,
-            0, 0, 0, 1]
+def invert_matrix(values):
+    """Return the inverse of an affine transformation matrix
 
-        m[12] = - (i12 * m[0] + i13 * m[4] + i14 * m[8])
-        m[13] = - (i12 * m[1] + i13 * m[5] + i14 * m[9])
-        m[14] = - (i12 * m[2] + i13 * m[6] + i14 * m[10])
+    :param values: An iterable of 16 matrix elements in row-major (C) order;
+        the last column must be [0 0 0 1]
 
-        return m
+    Returns a 16-element tuple.
+    Raises ValueError if the matrix can not be inverted.
+    """
+    (i0, i1, i2, i3,
+     i4, i5, i6, i7,
+     i8, i9, i10, i11,
+     i12, i13, i14, i15,
+    ) = values
+
+    negpos = [0, 0]
+    temp = i0 * i5 * i10
+    negpos[temp > 0] += temp
+
+    temp = i1 * i6 * i8
+    negpos[temp > 0] += temp
+
+    temp = i2 * i4 * i9
+    negpos[temp > 0] += temp
+
+    temp = -i2 * i5 * i8
+    negpos[temp > 0] += temp
+
+    temp = -i1 * i4 * i10
+    negpos[temp > 0] += temp
+
+    temp = -i0 * i6 * i9
+    negpos[temp > 0] += temp
+
+    det_1 = negpos[0] + negpos[1]
+
+    if (det_1 == 0) or (abs(det_1 / (negpos[1] - negpos[0])) <
+            (2 * 0.00000000000000001)):
+        raise ValueError("Matrix can not be inverted")
+
+    det_1 = 1 / det_1
+
+    m = [(i5 * i10 - i6 * i9) * det_1,
+        -(i1 * i10 - i2 * i9) * det_1,
+         (i1 * i6 - i2 * i5) * det_1,
+        0,
+        -(i4 * i10 - i6 * i8) * det_1,
+         (i0 * i10 - i2 * i8) * det_1,
+        -(i0 * i6 - i2 * i4) * det_1,
+        0,
+         (i4 * i9 - i5 * i8) * det_1,
+        -(i0 * i9 - i1 * i8) * det_1,
+         (i0 * i5 - i1 * i4) * det_1,
+        0,
+        0, 0, 0, 1]
+
+    m[12] = - (i12 * m[0] + i13 * m[4] + i14 * m[8])
+    m[13] = - (i12 * m[1] + i13 * m[5] + i14 * m[9])
+    m[14] = - (i12 * m[2] + i13 * m[6] + i14 * m[10])
+
+    return tuple(m)